@@ -1,301 +1,201 @@
 """
 This module implements a Flask web application for managing movies and users.
 
-It provides routes for listing, adding, updating, and deleting users and their associated movies.
-The application uses SQLAlchemy for database interactions and handles various error conditions.
+`create_app` builds the application: it reads the configuration, sets up the
+database, the caches, the OMDB client and the background workers, and
+registers the routes of `core.routes` and the commands of `core.commands`.
+
+Importing this module is cheap. The database layer, the controllers and the
+OMDB client are only imported by `create_app`, and the OMDB connection pools,
+its event loop, its response cache, `requests`, aiohttp and Pillow are only
+set up by the first lookup or poster that needs them, so that a worker process
+boots quickly and every application reads its configuration when it is
+created.
 """
+import logging
+import os
 from os.path import join
 from pathlib import Path
-from flask import Flask, request, render_template, Response
-from models import db
-from core import Post, Get, RenderedPage
+from typing import Callable
+from flask import Flask
 
 basedir = Path(__file__).parent.resolve()
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{join(basedir, 'data', 'movies.sqlite')}"
-db.init_app(app)
 
-POST = Post()
-GET = Get()
 
-ResponseCode = int
-
-
-@app.route(
-    rule='/', methods=['GET']
-)
-def home() -> tuple[RenderedPage, ResponseCode]:
-    """
-    Renders the home page with a list of users.
-
-    Returns:
-        A tuple containing the rendered template and the HTTP status code.
-    """
-    return GET.user.list(), 200
-
-
-@app.route(
-    rule='/users/add_user', methods=['GET', 'POST']
-)
-def user_add() -> (
-        tuple[RenderedPage, ResponseCode] | Response
-):
-    """
-    Handles user creation.
-
-    GET: Renders the form to add a new user.
-    POST: Adds a new user to the database.
-
-    Returns:
-        A tuple containing the rendered template and the HTTP status code or a response object.
-    """
-    if request.method == 'POST':
-        return POST.user.add()
-
-    return GET.user.add(), 200
-
-
-@app.route(
-    rule='/users/<int:user_id>', methods=['GET']
-)
-def user_details(user_id: int) -> (
-        tuple[RenderedPage, ResponseCode]
-):
-    """
-    Renders the details of a specific user.
-
-    Args:
-        user_id: The ID of the user to display.
-
-    Returns:
-        A tuple containing the rendered template and the HTTP status code.
-    """
-    return GET.user.details(user_id), 200
-
-
-@app.route(
-    rule='/users/<int:user_id>/delete', methods=['GET']
-)
-def user_delete(user_id: int) -> (
-        Response
-):
-    """
-    Deletes a specific user.
-
-    Args:
-        user_id: The ID of the user to delete.
+def _flag(value: str) -> bool:
+    """Parses an on/off setting, where only '1' is on."""
+    return value == '1'
+
+
+# Every setting, how to parse it and its default. Each is read from the
+# environment variable of the same name.
+SETTINGS: dict[str, tuple[Callable[[str], object], str]] = {
+    'OMDB_API_KEY': (str, ''),
+    'OMDB_URL': (str, 'http://www.omdbapi.com/'),
+    'OMDB_CACHE_PATH': (str, join(basedir, 'data', 'omdb_cache.sqlite')),
+    'OMDB_CACHE_MEMORY_SIZE': (int, '1024'),
+    'OMDB_CACHE_DISK_SIZE': (int, '50000'),
+    'OMDB_CACHE_TTL': (float, str(7 * 24 * 3600)),
+    'OMDB_CACHE_NEGATIVE_TTL': (float, '3600'),
+    'OMDB_POOL_SIZE': (int, '10'),
+    'OMDB_MAX_CONCURRENCY': (int, '20'),
+    'OMDB_CONNECT_TIMEOUT': (float, '3.05'),
+    'OMDB_READ_TIMEOUT': (float, '10'),
+    'OMDB_RETRIES': (int, '2'),
+    'OMDB_BACKOFF': (float, '0.25'),
+    'OMDB_BACKOFF_MAX': (float, '4'),
+    'OMDB_BREAKER_THRESHOLD': (int, '5'),
+    'OMDB_BREAKER_RESET': (float, '30'),
+    'OMDB_RATE_LIMIT': (float, '10'),
+    'OMDB_RATE_BURST': (int, '10'),
+    'OMDB_RATE_LIMIT_WAIT': (float, '2'),
+    'OMDB_DAILY_QUOTA': (int, '1000'),
+    'ASYNC_MOVIE_ADD': (_flag, '0'),
+    'ENRICHMENT_WORKERS': (int, '16'),
+    'ENRICHMENT_QUEUE_SIZE': (int, '100'),
+    'ENRICHMENT_LEASE': (float, '300'),
+    'IMPORT_WORKERS': (int, '16'),
+    'IMPORT_BATCH_SIZE': (int, '100'),
+    'EXPORT_BATCH_SIZE': (int, '1000'),
+    'PAGE_SIZE': (int, '48'),
+    'MAX_PAGE_SIZE': (int, '200'),
+    'API_MAX_PAGE_SIZE': (int, '1000'),
+    'DB_POOL_SIZE': (int, '10'),
+    'DB_MAX_OVERFLOW': (int, '10'),
+    'DB_POOL_TIMEOUT': (float, '10'),
+    'DB_POOL_RECYCLE': (int, '3600'),
+    'PAGE_CACHE_BACKEND': (str, 'memory'),
+    'PAGE_CACHE_PATH': (str, join(basedir, 'data', 'page_cache.sqlite')),
+    'PAGE_CACHE_SIZE': (int, '1024'),
+    'PAGE_CACHE_TTL': (float, '300'),
+    'POSTER_PATH': (str, join(basedir, 'data', 'posters')),
+    'POSTER_WORKERS': (int, '2'),
+    'POSTER_PREFETCH': (_flag, '1'),
+    'QUERY_WARNING_THRESHOLD': (int, '20'),
+    'SERVER_TIMING': (_flag, '1'),
+    'REQUEST_LOG_LEVEL': (str, 'INFO'),
+    'UPGRADE_DATABASE': (_flag, '1'),
+}
+
+
+def load_config() -> dict:
+    """
+    Reads the configuration from the environment and a `.env` file.
 
     Returns:
-        A response object.
-    """
-    return GET.user.delete(user_id)
-
-
-@app.route(
-    rule='/users/<int:user_id>/update', methods=['GET', 'POST']
-)
-def user_update(user_id: int) -> (
-        tuple[RenderedPage, ResponseCode] | Response
-):
+        A dictionary of config keys to values, see `SETTINGS`.
     """
-    Handles user updates.
-
-    GET: Renders the form to update a user.
-    POST: Updates the user's information in the database.
-
-    Args:
-        user_id: The ID of the user to update.
-
-    Returns:
-        A tuple containing the rendered template or a response object, and the HTTP status code.
-    """
-    if request.method == 'POST':
-        return POST.user.update(user_id)
-
-    return GET.user.update(user_id), 200
-
-
-@app.route(
-    rule='/users/<int:user_id>/movies', methods=['GET']
-)
-def movie_list(user_id: int) -> (
-        tuple[RenderedPage, ResponseCode]
-):
-    """
-    Renders the list of movies for a specific user.
-
-    Args:
-        user_id: The ID of the user.
-
-    Returns:
-        A tuple containing the rendered template and the HTTP status code.
-    """
-    return GET.movie.list(user_id), 200
-
+    import dotenv
+    dotenv.load_dotenv()
 
-@app.route(
-    rule='/users/<int:user_id>/movies/<int:movie_id>', methods=['GET']
-)
-def movie_details(user_id: int, movie_id: int) -> (
-        tuple[RenderedPage, ResponseCode]
-):
-    """
-    Renders the details of a specific movie for a specific user.
-
-    Args:
-        user_id: The ID of the user.
-        movie_id: The ID of the movie.
-
-    Returns:
-        A tuple containing the rendered template and the HTTP status code.
-    """
-    return GET.movie.details(user_id, movie_id), 200
-
-
-@app.route(
-    rule='/users/<int:user_id>/movies/add_movie', methods=['GET', 'POST']
-)
-def movie_add(user_id: int) -> (
-        tuple[RenderedPage, ResponseCode] | Response
-):
-    """
-    Handles adding a new movie for a specific user.
-
-    GET: Renders the form to add a new movie.
-    POST: Adds a new movie to the user's collection.
-
-    Args:
-        user_id: The ID of the user.
-
-    Returns:
-        A tuple containing the rendered template or a response object, and the HTTP status code.
-    """
-    if request.method == 'POST':
-        return POST.movie.add(user_id)
-
-    return GET.movie.add(user_id), 200
-
-
-@app.route(
-    rule='/users/<int:user_id>/movies/<int:movie_id>/delete', methods=['POST']
-)
-def movie_delete(user_id: int, movie_id: int) -> (
-        Response
-):
-    """
-    Deletes a specific movie for a specific user.
-
-    Args:
-        user_id: The ID of the user.
-        movie_id: The ID of the movie to delete.
-
-    Returns:
-        A response object.
-    """
-    return POST.movie.delete(user_id, movie_id)
+    config = {key: parse(os.getenv(key, default)) for key, (parse, default) in SETTINGS.items()}
+    config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+        'DATABASE_URL', f"sqlite:///{join(basedir, 'data', 'movies.sqlite')}"
+    )
+    return config
 
 
-@app.route(
-    rule='/users/<int:user_id>/movies/<int:movie_id>/update',
-    methods=['GET', 'POST']
-)
-def movie_update(user_id: int, movie_id: int) -> (
-        tuple[RenderedPage, ResponseCode] | Response
-):
+def create_app(config: dict | None = None) -> Flask:
     """
-    Handles updating a movie for a specific user.
-
-    GET: Renders the form to update a movie.
-    POST: Updates the movie's information in the database.
+    Creates and configures an instance of the web application.
 
     Args:
-        user_id: The ID of the user.
-        movie_id: The ID of the movie to update.
+        config: Config keys that override the ones read from the environment,
+            see `load_config`.
 
     Returns:
-        A tuple containing the rendered template or a response object, and the HTTP status code.
-    """
-    if request.method == 'POST':
-        return POST.movie.update(user_id, movie_id)
-
-    return GET.movie.update(movie_id), 200
-
+        The Flask application.
+    """
+    from models import db, init_sqlite, upgrade
+    from core import PageCache, MemoryBackend, SQLiteBackend, Instrumentation, Metrics, TimedQueuePool
+    from core.routes import register_routes
+    from core.commands import register_commands
+    from data_manager import DataManager, EnrichmentPool, OmdbClient, PosterStore
+
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+        'pool_recycle': app.config['DB_POOL_RECYCLE'],
+        'poolclass': TimedQueuePool,
+    })
+    db.init_app(app)
+    init_sqlite(app)
+
+    if app.config['UPGRADE_DATABASE']:
+        with app.app_context():
+            upgrade()
+
+    page_cache_backends = {
+        'memory': lambda: MemoryBackend(size=app.config['PAGE_CACHE_SIZE']),
+        'sqlite': lambda: SQLiteBackend(
+            path=app.config['PAGE_CACHE_PATH'],
+            size=app.config['PAGE_CACHE_SIZE']
+        ),
+        'none': lambda: None,
+    }
+    PageCache(
+        app,
+        backend=page_cache_backends[app.config['PAGE_CACHE_BACKEND']](),
+        ttl=app.config['PAGE_CACHE_TTL']
+    )
 
-@app.errorhandler(404)
-def page_not_found(e) -> (
-        tuple[RenderedPage, ResponseCode]
-):
-    """
-    Renders the 404 error page.
+    app.extensions['data_manager'] = DataManager()
+    OmdbClient(app)
 
-    Args:
-        e: The error object.
-
-    Returns:
-        A tuple containing the rendered error template and the 404 status code.
-    """
-    temp = render_template(
-        template_name_or_list='error.html',
-        error_description=e.description
+    EnrichmentPool(
+        app,
+        workers=app.config['ENRICHMENT_WORKERS'],
+        maxsize=app.config['ENRICHMENT_QUEUE_SIZE'],
+        lease=app.config['ENRICHMENT_LEASE']
     )
-    return temp, 404
 
+    PosterStore(
+        app,
+        path=app.config['POSTER_PATH'],
+        workers=app.config['POSTER_WORKERS'],
+        prefetch=app.config['POSTER_PREFETCH']
+    )
 
-@app.errorhandler(400)
-def bad_request(e) -> (
-        tuple[RenderedPage, ResponseCode]
-):
-    """
-    Renders the 400 error page.
+    request_log = logging.getLogger('moviewebapp.requests')
+    request_log.setLevel(app.config['REQUEST_LOG_LEVEL'])
+    if not request_log.handlers:
+        request_log.addHandler(logging.StreamHandler())
+    Instrumentation(app)
+    Metrics(app)
 
-    Args:
-        e: The error object.
+    register_routes(app)
+    register_commands(app)
 
-    Returns:
-        A tuple containing the rendered error template and the 400 status code.
-    """
-    temp = render_template(
-        template_name_or_list='error.html',
-        error_description=e.description
-    )
-    return temp, 400
+    return app
 
 
-@app.errorhandler(500)
-def internal_server_error(e) -> (
-        tuple[RenderedPage, ResponseCode]
-):
+def upgrade_database(config: dict | None = None) -> None:
     """
-    Renders the 500 error page.
+    Upgrades the database schema without setting up the rest of the
+    application, e.g. once before the worker processes start.
 
     Args:
-        e: The error object.
-
-    Returns:
-        A tuple containing the rendered error template and the 500 status code.
+        config: Config keys that override the ones read from the environment,
+            see `load_config`.
     """
-    temp = render_template(
-        template_name_or_list='error.html',
-        error_description=e.description
-    )
-    return temp, 500
+    from models import db, init_sqlite, upgrade
 
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+    db.init_app(app)
+    init_sqlite(app)
 
-@app.errorhandler(Exception)
-def unhandled_exception(e) -> (
-        tuple[RenderedPage, ResponseCode]
-):
-    temp = render_template(
-        template_name_or_list='error.html',
-        error_description=e.args[0]
-    )
-    return temp, 500
+    with app.app_context():
+        upgrade()
+        db.engine.dispose()
 
 
 if __name__ == '__main__':
-    # run to reset the database - don't forget to remove after
-    # with app.app_context():
-    #     db.drop_all()
-    #     db.create_all()
+    from core.serving import serve
 
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    serve(obj={'create_app': create_app, 'upgrade_database': upgrade_database, 'config': load_config()})
@@ -0,0 +1,5 @@
+"""
+Benchmarks and stress tests for the MovieWebApp.
+
+Each module is runnable with `python -m benchmarks.<name>` from the project root.
+"""
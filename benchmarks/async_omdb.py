@@ -0,0 +1,223 @@
+"""
+This module measures how many OMDB lookups a worker keeps in flight with the
+blocking and the asynchronous OMDB client.
+
+It answers OMDB lookups from a local HTTP server with a fixed latency, 500 ms
+by default (see `benchmarks.fake_omdb`), and runs three scenarios:
+
+- lookups: `--rounds` rounds of lookups at every concurrency in
+  `--concurrency`, once with a thread per lookup in flight and the blocking
+  client, as bulk imports used to, and once from a single thread with the
+  asynchronous client;
+- import: a bulk import of `--movies` titles through the import route;
+- add: adding `--movies` movies with `ASYNC_MOVIE_ADD`, until all of them got
+  their details, next to the latency of a blocking movie add.
+
+It reports the throughput of every run and its speedup over a single blocking
+lookup at a time, and exits with status 1 if the asynchronous client at the
+highest concurrency is less than `--min-speedup` times faster than that.
+
+Usage:
+    python -m benchmarks.async_omdb [--latency 0.5] [--concurrency 1,8,32,128] [--output results.json]
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .fake_omdb import fake_omdb_server
+
+
+def lookups_with_threads(client, titles: list[str], concurrency: int) -> dict:
+    """Looks titles up with the blocking client and a thread per lookup in flight."""
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda title: client.fetch({'t': title}), titles))
+
+    return {'seconds': time.perf_counter() - start, 'threads': concurrency}
+
+
+def lookups_with_asyncio(client, titles: list[str], concurrency: int) -> dict:
+    """Looks titles up with the asynchronous client from a single thread."""
+    import asyncio
+
+    async def lookup_all() -> None:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def lookup(title: str) -> None:
+            async with slots:
+                await client.fetch_async({'t': title})
+
+        await asyncio.gather(*(lookup(title) for title in titles))
+
+    start = time.perf_counter()
+    client.run(lookup_all()).result()
+    return {'seconds': time.perf_counter() - start, 'threads': 1}
+
+
+def bulk_import(app, user_id: int, titles: list[str]) -> dict:
+    """Imports titles through the import route and waits for the last event."""
+    with app.test_client() as http:
+        start = time.perf_counter()
+        response = http.post(
+            f"/users/{user_id}/movies/import", data='\n'.join(titles), content_type='text/csv'
+        )
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        seconds = time.perf_counter() - start
+
+    return {'seconds': seconds, 'added': events[-1]['added'], 'errors': events[-1]['error']}
+
+
+def movie_adds(app, user_id: int, titles: list[str]) -> dict:
+    """Adds movies as pending rows and waits until all of them got their details."""
+    with app.test_client() as http:
+        start = time.perf_counter()
+        latencies = []
+
+        for title in titles:
+            began = time.perf_counter()
+            http.post(f"/users/{user_id}/movies/add_movie", data={'title': title})
+            latencies.append(time.perf_counter() - began)
+
+        drained = app.extensions['enrichment'].drain(timeout=600)
+        seconds = time.perf_counter() - start
+
+    return {'seconds': seconds, 'drained': drained, 'p50_add_ms': statistics.median(latencies) * 1000}
+
+
+def blocking_adds(app, user_id: int, titles: list[str]) -> dict:
+    """Adds movies one after the other with a blocking lookup each."""
+    with app.test_client() as http:
+        latencies = []
+
+        for title in titles:
+            began = time.perf_counter()
+            http.post(f"/users/{user_id}/movies/add_movie", data={'title': title})
+            latencies.append(time.perf_counter() - began)
+
+    return {'seconds': sum(latencies), 'p50_add_ms': statistics.median(latencies) * 1000}
+
+
+def main() -> None:
+    """Measures the OMDB lookup throughput of the blocking and the asynchronous client."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds every fake OMDB lookup takes.')
+    parser.add_argument('--concurrency', default='1,8,32,128', help='Comma-separated numbers of lookups in flight.')
+    parser.add_argument('--rounds', type=int, default=4, help='Lookups per concurrency slot.')
+    parser.add_argument('--movies', type=int, default=100, help='Movies to import and to add.')
+    parser.add_argument('--min-speedup', type=float, default=10)
+    parser.add_argument('--output', type=Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    from app import create_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{Path(tmp) / 'async_omdb.sqlite'}",
+            'OMDB_CACHE_PATH': str(Path(tmp) / 'omdb_cache.sqlite'),
+            'OMDB_API_KEY': 'benchmark',
+            'OMDB_POOL_SIZE': max(levels),
+            'OMDB_MAX_CONCURRENCY': max(levels),
+            'OMDB_RETRIES': 0,
+            'OMDB_RATE_LIMIT': 0,
+            'OMDB_DAILY_QUOTA': 0,
+            'IMPORT_WORKERS': max(levels),
+            'ENRICHMENT_WORKERS': max(levels),
+            'ENRICHMENT_QUEUE_SIZE': args.movies,
+            'PAGE_CACHE_BACKEND': 'none',
+            'POSTER_PATH': str(Path(tmp) / 'posters'),
+            'POSTER_PREFETCH': False,
+            'REQUEST_LOG_LEVEL': 'ERROR',
+        })
+        client = app.extensions['omdb']
+
+        with app.app_context():
+            dm = app.extensions['data_manager']
+            user_ids = [dm.user.add(f"benchmark{number}").id for number in range(3)]
+
+        runs = []
+
+        with fake_omdb_server(app, args.latency) as server:
+            for level in levels:
+                for model, measure in (('threads', lookups_with_threads), ('asyncio', lookups_with_asyncio)):
+                    titles = [f"{model} {level} {number}" for number in range(level * args.rounds)]
+                    server.max_in_flight = 0
+                    result = measure(client, titles, level)
+                    runs.append({
+                        'scenario': 'lookups',
+                        'model': model,
+                        'concurrency': level,
+                        'lookups': len(titles),
+                        'lookups_per_s': round(len(titles) / result['seconds'], 1),
+                        'max_in_flight': server.max_in_flight,
+                        'threads': result['threads'],
+                        'seconds': round(result['seconds'], 2),
+                    })
+
+            titles = [f"import {number}" for number in range(args.movies)]
+            result = bulk_import(app, user_ids[0], titles)
+            runs.append({
+                'scenario': 'import',
+                'model': 'asyncio',
+                'concurrency': app.config['IMPORT_WORKERS'],
+                'lookups': args.movies,
+                'lookups_per_s': round(args.movies / result['seconds'], 1),
+                'added': result['added'],
+                'errors': result['errors'],
+                'seconds': round(result['seconds'], 2),
+            })
+
+            sample = [f"blocking add {number}" for number in range(min(args.movies, 10))]
+            result = blocking_adds(app, user_ids[1], sample)
+            runs.append({
+                'scenario': 'add',
+                'model': 'threads',
+                'concurrency': 1,
+                'lookups': len(sample),
+                'lookups_per_s': round(len(sample) / result['seconds'], 1),
+                'p50_add_ms': round(result['p50_add_ms'], 1),
+                'seconds': round(result['seconds'], 2),
+            })
+
+            app.config['ASYNC_MOVIE_ADD'] = True
+            titles = [f"async add {number}" for number in range(args.movies)]
+            result = movie_adds(app, user_ids[2], titles)
+            runs.append({
+                'scenario': 'add',
+                'model': 'asyncio',
+                'concurrency': app.config['ENRICHMENT_WORKERS'],
+                'lookups': args.movies,
+                'lookups_per_s': round(args.movies / result['seconds'], 1),
+                'p50_add_ms': round(result['p50_add_ms'], 1),
+                'drained': result['drained'],
+                'seconds': round(result['seconds'], 2),
+            })
+
+        client.close()
+
+    baseline = next(run for run in runs if run['model'] == 'threads' and run['concurrency'] == 1)
+    for run in runs:
+        run['speedup'] = round(run['lookups_per_s'] / baseline['lookups_per_s'], 1)
+
+    results = {'latency_s': args.latency, 'runs': runs}
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    best = max(
+        (run for run in runs if run['scenario'] == 'lookups' and run['model'] == 'asyncio'),
+        key=lambda run: run['concurrency']
+    )
+    if best['speedup'] < args.min_speedup:
+        print(f"asyncio at concurrency {best['concurrency']} is only {best['speedup']}x faster than one lookup at a time")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,513 @@
+"""
+This module stands in for the OMDB API in benchmarks and tests.
+
+`FakeOmdb` answers lookups from a fixture corpus of recorded responses
+(`fixtures/omdb.jsonl` by default) and makes up deterministic movies for the
+titles the corpus doesn't have: the same title always yields the same movie
+with plausibly sized texts. Its latency follows a configurable distribution
+and a share of the lookups can fail with a 5xx status or be answered with
+"Movie not found!", so that load tests run against an upstream that behaves
+the same on every run, without an API key or network access.
+
+It is served in-process by `FakeOmdbAdapter`, a requests transport adapter,
+or over local HTTP by `FakeOmdbServer`, which the asynchronous lookups and
+other processes can reach as well. Run this module to start the server, then
+point the app at it with `OMDB_URL`:
+
+    python -m benchmarks.fake_omdb [--port 8765] [--latency lognormal:0.2,0.5]
+        [--error-rate 0.01] [--not-found-rate 0.05] [--mode synthetic|replay|record]
+        [--fixtures omdb.jsonl] [--upstream http://www.omdbapi.com/]
+
+In record mode, lookups the corpus doesn't have are forwarded to the real OMDB,
+with the API key the app sends, and their responses are appended to the
+fixture file; in replay mode, the server answers from that file only, so a
+recorded session can be replayed offline.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from flask import Flask
+from requests.adapters import BaseAdapter
+
+from data_manager.cache import OmdbCache, TRANSIENT_ERRORS
+from data_manager.omdb import URL as OMDB_URL
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'omdb.jsonl'
+MODES = ('synthetic', 'replay', 'record')
+NOT_FOUND = {'Response': 'False', 'Error': 'Movie not found!'}
+UNAVAILABLE = {'Response': 'False', 'Error': 'Service unavailable'}
+
+Latency = Callable[[random.Random], float]
+
+WORDS = (
+    'night city lost last love war road house dark star return secret river king '
+    'blood summer dream shadow iron heart stone fire winter garden empire storm '
+    'silent golden broken wild ghost journey island hunter edge moon glass'
+).split()
+NAMES = (
+    'Ava Ben Carla Dev Elena Farid Grace Hugo Ines Jonas Kira Liam Maya Noah '
+    'Olga Pavel Quinn Rosa Sami Tara Umar Vera Wes Xena Yuri Zoe'
+).split()
+SURNAMES = (
+    'Adams Brooks Chen Diaz Evans Fischer Garcia Hart Ito Jensen Kowalski Lopez '
+    'Moreau Novak Okafor Petrov Rossi Silva Tanaka Urban Vargas Weber Young Zhang'
+).split()
+SYLLABLES = (
+    'ka ren to mi sa lo ve dra an el is or un ber ta no fi gal mor thi ce pra '
+    'dun ly sel wor qua bel tor ix nu ha'
+).split()
+# Made-up words whose frequencies follow Zipf's law, as in natural language,
+# where the most frequent words are also the shortest.
+VOCABULARY = sorted({
+    ''.join(random.Random(index).choices(SYLLABLES, k=random.Random(-index).randint(1, 4)))
+    for index in range(20_000)
+})
+random.Random(0).shuffle(VOCABULARY)
+VOCABULARY.sort(key=len)
+ZIPF_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+GENRES = ('Action', 'Comedy', 'Drama', 'Crime', 'Horror', 'Romance', 'Sci-Fi', 'Thriller')
+RATED = ('G', 'PG', 'PG-13', 'R', 'NC-17', 'Not Rated')
+
+
+def fake_words(rng: random.Random, count: int) -> list[str]:
+    """Draws words from `VOCABULARY` with natural frequencies."""
+    return rng.choices(VOCABULARY, cum_weights=ZIPF_WEIGHTS, k=count)
+
+
+def fake_title(rng: random.Random) -> str:
+    """Makes up a movie title of one to six words."""
+    words = [rng.choice(WORDS) for _ in range(rng.randint(1, 3))] + fake_words(rng, rng.randint(0, 3))
+    rng.shuffle(words)
+    return ' '.join(words).title()
+
+
+def fake_movie(title: str, imdb_id: str | None = None) -> dict:
+    """
+    Makes up the OMDB response for a movie.
+
+    Args:
+        title: The movie title.
+        imdb_id: The IMDb ID, derived from the title if not given.
+
+    Returns:
+        A response in the format of the OMDB API.
+    """
+    seed = zlib.crc32((imdb_id or title.casefold()).encode())
+    rng = random.Random(seed)
+    person = lambda: f"{rng.choice(NAMES)} {rng.choice(SURNAMES)}"
+    year = rng.randint(1920, 2025)
+
+    return {
+        'Title': title or fake_title(rng),
+        'Year': str(year),
+        'Rated': rng.choice(RATED),
+        'Released': f"{rng.randint(1, 28):02d} Jan {year}",
+        'Runtime': f"{rng.randint(70, 200)} min",
+        'Genre': ', '.join(rng.sample(GENRES, rng.randint(1, 3))),
+        'Director': person(),
+        'Actors': ', '.join(person() for _ in range(rng.randint(2, 4))),
+        'Plot': ' '.join(fake_words(rng, rng.randint(25, 90))).capitalize() + '.',
+        'Poster': f"https://m.media-amazon.com/images/M/{seed:x}._V1_SX300.jpg",
+        'imdbRating': f"{rng.uniform(1, 10):.1f}",
+        'imdbID': imdb_id or f"tt{seed % 10_000_000:07d}",
+        'Response': 'True',
+    }
+
+
+def latency_distribution(spec: float | str) -> Latency:
+    """
+    Parses a latency distribution.
+
+    Args:
+        spec: A fixed latency in seconds, or one of 'fixed:SECONDS',
+            'uniform:LOW,HIGH', 'normal:MEAN,STDDEV' and
+            'lognormal:MEDIAN,SIGMA', with all times in seconds.
+
+    Returns:
+        A function that draws a latency in seconds with a random generator.
+
+    Raises:
+        ValueError: If the distribution can't be parsed.
+    """
+    if isinstance(spec, (int, float)) or ':' not in spec:
+        seconds = float(spec)
+        return lambda rng: seconds
+
+    name, _, args = spec.partition(':')
+    values = [float(value) for value in args.split(',')]
+    distributions = {
+        'fixed': (1, lambda rng: values[0]),
+        'uniform': (2, lambda rng: rng.uniform(values[0], values[1])),
+        'normal': (2, lambda rng: max(0.0, rng.gauss(values[0], values[1]))),
+        'lognormal': (2, lambda rng: values[0] * math.exp(rng.gauss(0, values[1]))),
+    }
+
+    if name not in distributions or len(values) != distributions[name][0]:
+        raise ValueError(f"Invalid latency distribution {spec!r}")
+
+    return distributions[name][1]
+
+
+class FakeOmdb:
+    """Answers OMDB lookups from a fixture corpus, made-up movies or the real OMDB."""
+
+    def __init__(
+            self,
+            latency: float | str = 0.05,
+            error_rate: float = 0.0,
+            not_found_rate: float = 0.0,
+            mode: str = 'synthetic',
+            fixtures: Path | None = FIXTURES,
+            upstream: str = OMDB_URL,
+            seed: int = 0
+    ):
+        """
+        Initializes the fake and loads the fixture corpus.
+
+        Args:
+            latency: The latency distribution, see `latency_distribution`.
+            error_rate: The share of lookups that fail with status 503.
+            not_found_rate: The share of titles missing from the corpus that
+                are answered with "Movie not found!". The same titles are
+                missing on every run with the same seed.
+            mode: 'synthetic' to make up the movies missing from the corpus,
+                'replay' to answer them with "Movie not found!" or 'record'
+                to fetch them from `upstream` and add them to the corpus.
+            fixtures: The JSON Lines file of recorded responses, if any.
+            upstream: The URL of the real OMDB, for the record mode.
+            seed: The seed of the latencies, errors and missing titles.
+
+        Raises:
+            ValueError: If the mode or the latency distribution is invalid.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Invalid mode {mode!r}, expected one of {', '.join(MODES)}")
+
+        self.latency = latency_distribution(latency)
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.mode = mode
+        self.fixtures = fixtures
+        self.upstream = upstream
+        self.seed = seed
+        self.requests = 0
+        self.errors = 0
+        self.recorded = 0
+
+        self.__corpus: dict[str, dict] = {}
+        self.__rng = random.Random(seed)
+        self.__lock = threading.Lock()
+
+        if fixtures and fixtures.exists():
+            with fixtures.open(encoding='utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.__add(entry['key'], entry['response'])
+
+    @staticmethod
+    def key(params: dict) -> str:
+        """The corpus key of a lookup, the same as its `OmdbCache` key."""
+        return OmdbCache.key(title=params.get('t'), imdb_id=params.get('i'))
+
+    def draw(self) -> tuple[float, bool]:
+        """
+        Counts a request and draws its latency and whether it fails.
+
+        Returns:
+            The latency in seconds and True if the request must fail.
+        """
+        with self.__lock:
+            self.requests += 1
+            delay = self.latency(self.__rng)
+            failed = self.__rng.random() < self.error_rate
+            self.errors += failed
+
+        return delay, failed
+
+    def answer(self, params: dict) -> dict | None:
+        """
+        Answers a lookup.
+
+        Args:
+            params: The query parameters of the lookup.
+
+        Returns:
+            The OMDB response, or None in record mode if it must be fetched
+            from the real OMDB, see `record`.
+        """
+        key = self.key(params)
+
+        if key in self.__corpus:
+            return self.__corpus[key]
+
+        if self.not_found_rate and zlib.crc32(f"{self.seed}:{key}".encode()) / 2 ** 32 < self.not_found_rate:
+            return NOT_FOUND
+
+        if self.mode == 'replay':
+            return NOT_FOUND
+
+        if self.mode == 'record':
+            return None
+
+        return fake_movie(params.get('t', ''), params.get('i'))
+
+    def record(self, params: dict, response: dict) -> None:
+        """
+        Adds a response of the real OMDB to the corpus and the fixture file.
+        Errors that don't describe the movie, such as an exhausted quota, are
+        not recorded.
+
+        Args:
+            params: The query parameters of the lookup.
+            response: The response of the real OMDB.
+        """
+        if response.get('Error') in TRANSIENT_ERRORS:
+            return
+
+        key = self.key(params)
+
+        with self.__lock:
+            self.__add(key, response)
+            self.recorded += 1
+
+            if self.fixtures:
+                with self.fixtures.open('a', encoding='utf-8') as file:
+                    file.write(json.dumps({'key': key, 'response': response}, ensure_ascii=False) + '\n')
+
+    def __add(self, key: str, response: dict) -> None:
+        """Indexes a response by its key, its IMDb ID and its title."""
+        self.__corpus[key] = response
+
+        if response.get('Response') == 'True':
+            if response.get('imdbID'):
+                self.__corpus.setdefault(OmdbCache.key(imdb_id=response['imdbID']), response)
+            if response.get('Title'):
+                self.__corpus.setdefault(OmdbCache.key(title=response['Title']), response)
+
+
+class FakeOmdbAdapter(BaseAdapter):
+    """Serves a `FakeOmdb` in-process to a requests session."""
+
+    def __init__(self, omdb: FakeOmdb):
+        """
+        Initializes the adapter.
+
+        Args:
+            omdb: The fake to answer with.
+        """
+        super().__init__()
+        self.omdb = omdb
+        self.__upstream = None
+
+    @property
+    def requests(self) -> int:
+        """The number of requests answered."""
+        return self.omdb.requests
+
+    def send(self, request: 'requests.PreparedRequest', **kwargs) -> 'requests.Response':
+        params = {key: values[-1] for key, values in parse_qs(urlsplit(request.url).query).items()}
+        delay, failed = self.omdb.draw()
+        payload = None if failed else self.omdb.answer(params)
+
+        if payload is None and not failed:
+            self.__upstream = self.__upstream or requests.Session()
+            payload = self.__upstream.get(self.omdb.upstream, params=params, timeout=10).json()
+            self.omdb.record(params, payload)
+        else:
+            time.sleep(delay)
+
+        response = requests.Response()
+        response.status_code = 503 if failed else 200
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(UNAVAILABLE if failed else payload).encode()
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+@contextmanager
+def fake_omdb(app: Flask, latency: float | str = 0.05, **options) -> Iterator[FakeOmdbAdapter]:
+    """
+    Routes the blocking lookups of an application to a `FakeOmdbAdapter`
+    while the context is active.
+
+    Args:
+        app: The Flask application.
+        latency: The latency distribution, see `latency_distribution`.
+        **options: The other options of `FakeOmdb`.
+
+    Yields:
+        The adapter, which counts the requests it answered.
+    """
+    adapter = FakeOmdbAdapter(FakeOmdb(latency, **options))
+    client = app.extensions['omdb']
+    session = client.session
+    previous = session.adapters.get(client.url)
+    session.mount(client.url, adapter)
+
+    try:
+        yield adapter
+    finally:
+        if previous is None:
+            del session.adapters[client.url]
+        else:
+            session.mount(client.url, previous)
+
+
+class FakeOmdbServer:
+    """Serves a `FakeOmdb` over local HTTP."""
+
+    def __init__(self, omdb: FakeOmdb, host: str = '127.0.0.1', port: int = 0):
+        """
+        Initializes the server. It listens once started.
+
+        Args:
+            omdb: The fake to answer with.
+            host: The address to listen on.
+            port: The port to listen on, a free one by default.
+        """
+        self.omdb = omdb
+        self.host = host
+        self.port = port
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url = None
+        self.__loop = asyncio.new_event_loop()
+        self.__runner = None
+        self.__upstream = None
+
+    @property
+    def requests(self) -> int:
+        """The number of requests answered."""
+        return self.omdb.requests
+
+    async def __answer(self, request):
+        from aiohttp import ClientSession, web
+
+        params = dict(request.query)
+        delay, failed = self.omdb.draw()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            if failed:
+                await asyncio.sleep(delay)
+                return web.json_response(UNAVAILABLE, status=503)
+
+            payload = self.omdb.answer(params)
+
+            if payload is None:
+                self.__upstream = self.__upstream or ClientSession()
+                async with self.__upstream.get(self.omdb.upstream, params=params) as resp:
+                    payload = await resp.json(content_type=None)
+                self.omdb.record(params, payload)
+            else:
+                await asyncio.sleep(delay)
+
+            return web.json_response(payload)
+        finally:
+            self.in_flight -= 1
+
+    async def __start(self) -> str:
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get('/', self.__answer)
+        self.__runner = web.AppRunner(app, access_log=None)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, self.host, self.port, backlog=1024)
+        await site.start()
+        host, port = self.__runner.addresses[0][:2]
+        return f"http://{host}:{port}/"
+
+    async def __stop(self) -> None:
+        await self.__runner.cleanup()
+
+        if self.__upstream is not None:
+            await self.__upstream.close()
+
+    def start(self) -> None:
+        """Starts listening, in a daemon thread."""
+        threading.Thread(target=self.__loop.run_forever, name='fake-omdb', daemon=True).start()
+        self.url = asyncio.run_coroutine_threadsafe(self.__start(), self.__loop).result()
+
+    def stop(self) -> None:
+        """Stops the server."""
+        asyncio.run_coroutine_threadsafe(self.__stop(), self.__loop).result()
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+
+
+@contextmanager
+def fake_omdb_server(app: Flask, latency: float | str = 0.05, **options) -> Iterator[FakeOmdbServer]:
+    """
+    Routes all lookups of an application to a `FakeOmdbServer` while the
+    context is active.
+
+    Args:
+        app: The Flask application.
+        latency: The latency distribution, see `latency_distribution`.
+        **options: The other options of `FakeOmdb`.
+
+    Yields:
+        The server, which counts the requests it answered.
+    """
+    server = FakeOmdbServer(FakeOmdb(latency, **options))
+    server.start()
+    client = app.extensions['omdb']
+    previous, client.url = client.url, server.url
+
+    try:
+        yield server
+    finally:
+        client.url = previous
+        server.stop()
+
+
+def main() -> None:
+    """Serves a fake OMDB until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='0.05', help='Seconds, or e.g. uniform:0.02,0.2 or lognormal:0.2,0.5.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of lookups that fail with 503.')
+    parser.add_argument('--not-found-rate', type=float, default=0.0,
+                        help='Share of titles missing from the corpus answered with "Movie not found!".')
+    parser.add_argument('--mode', choices=MODES, default='synthetic')
+    parser.add_argument('--fixtures', type=Path, default=FIXTURES, help='JSON Lines file of recorded responses.')
+    parser.add_argument('--upstream', default=OMDB_URL, help='The real OMDB, for the record mode.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeOmdbServer(
+        FakeOmdb(args.latency, args.error_rate, args.not_found_rate, args.mode, args.fixtures, args.upstream, args.seed),
+        host=args.host,
+        port=args.port
+    )
+    server.start()
+    print(f"Serving a fake OMDB ({args.mode}) at {server.url}, set OMDB_URL={server.url}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+        print(f"Answered {server.omdb.requests} requests, recorded {server.omdb.recorded}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+This module compares full-text search against a LIKE-based search.
+
+It seeds a database with synthetic libraries (see `benchmarks.seed`), then runs
+the same random one- and two-word searches, mixing title words, names and plot
+words, of random users' libraries through
+`MovieManager.search`, through the same full-text search ranked by FTS5's
+bm25 instead and through a LIKE query over the same columns, and
+reports the latency of all three. It exits with status 1 if the p95 latency of
+full-text search exceeds `--max-p95-ms`.
+
+Usage:
+    python -m benchmarks.search [--users 400] [--max-movies 5000] [--queries 200]
+"""
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from flask import Flask
+from sqlalchemy import or_, func, literal_column, table, column
+from sqlalchemy.orm import contains_eager
+
+from models import db, init_sqlite, upgrade, Movie, CatalogMovie
+from models.search import match_expression
+from data_manager.data_manager import MovieManager
+from .fake_omdb import WORDS, NAMES, fake_words
+from .seed import seed
+
+
+def like_search(user_id: int, query: str, size: int) -> list[Movie]:
+    """
+    Searches a library the way it would be done without an index.
+
+    Args:
+        user_id: The ID of the user.
+        query: The search terms, all of which must occur in one of the fields.
+        size: The maximum number of results.
+
+    Returns:
+        The matching movies.
+    """
+    columns = [Movie.title, CatalogMovie.plot, CatalogMovie.actors, CatalogMovie.director, CatalogMovie.genre]
+    statement = (
+        db.select(Movie)
+        .outerjoin(Movie.catalog)
+        .options(contains_eager(Movie.catalog))
+        .filter(Movie.user_id == user_id)
+    )
+
+    for word in query.split():
+        statement = statement.filter(or_(*[column.like(f"%{word}%") for column in columns]))
+
+    return list(db.session.execute(statement.order_by(Movie.id).limit(size)).scalars())
+
+
+def bm25_search(user_id: int, query: str, size: int) -> list[Movie]:
+    """
+    Searches a library like `MovieManager.search`, but ranks the results
+    with FTS5's bm25, weighting matches in the title ten times.
+
+    Args:
+        user_id: The ID of the user.
+        query: The search terms.
+        size: The maximum number of results.
+
+    Returns:
+        The matching movies, best first.
+    """
+    search = table('movie_search', column('rowid'))
+    rank = func.bm25(literal_column('movie_search'), 0.0, 10.0, 1.0, 1.0, 1.0, 1.0)
+    statement = (
+        db.select(Movie)
+        .join(search, search.c.rowid == Movie.id)
+        .outerjoin(Movie.catalog)
+        .options(contains_eager(Movie.catalog))
+        .where(literal_column('movie_search').op('MATCH')(match_expression(user_id, query)))
+    )
+
+    return list(db.session.execute(statement.order_by(rank, Movie.id).limit(size)).scalars())
+
+
+def measure(search: Callable[[int, str, int], list], queries: list[tuple[int, str]]) -> dict:
+    """
+    Runs searches and sums up their latency.
+
+    Args:
+        search: The search function.
+        queries: The user IDs and search terms to search for.
+
+    Returns:
+        The latency percentiles in milliseconds and the mean number of results.
+    """
+    latencies, results = [], []
+
+    for user_id, query in queries:
+        start = time.perf_counter()
+        results.append(len(search(user_id, query, 48)))
+        latencies.append(time.perf_counter() - start)
+        db.session.rollback()
+
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+
+    return {
+        'p50_ms': round(percentiles[49] * 1000, 2),
+        'p95_ms': round(percentiles[94] * 1000, 2),
+        'p99_ms': round(percentiles[98] * 1000, 2),
+        'results_mean': round(statistics.fmean(results), 1),
+    }
+
+
+def main() -> None:
+    """Seeds a database and compares both searches on it."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database', type=Path,
+                        help='Reuse or create this seeded database instead of a temporary one.')
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--max-movies', type=int, default=5000,
+                        help='The defaults yield about a million movies.')
+    parser.add_argument('--catalog', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-p95-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database or Path(tmp) / 'search.sqlite'
+        results = {'seeded': None}
+
+        if not database.exists():
+            results['seeded'] = seed(database, args.users, args.max_movies, args.catalog, args.seed)
+
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{database}"
+        db.init_app(app)
+        init_sqlite(app)
+
+        with app.app_context():
+            upgrade()
+            users = db.session.execute(db.select(Movie.user_id).distinct()).scalars().all()
+            rng = random.Random(args.seed)
+            terms = lambda: fake_words(rng, 1) + [rng.choice(WORDS), rng.choice(NAMES)]
+            queries = [
+                (rng.choice(users), ' '.join(rng.sample(terms(), rng.randint(1, 2))))
+                for _ in range(args.queries)
+            ]
+
+            results['movies'] = db.session.execute(db.select(db.func.count(Movie.id))).scalar()
+            results['fts'] = measure(MovieManager.search, queries)
+            results['fts_bm25'] = measure(bm25_search, queries)
+            results['like'] = measure(like_search, queries)
+            db.engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+    if results['fts']['p95_ms'] > args.max_p95_ms:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+This module seeds a SQLite database with synthetic users and movies.
+
+Every user gets a random number of movies between zero and `--max-movies`,
+picked from a shared catalog of made-up movies with realistically sized
+plots, cast lists and titles. The same `--seed` always yields the same data.
+
+Usage:
+    python -m benchmarks.seed PATH [--users 1000] [--max-movies 500] [--catalog 5000] [--seed 1]
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+from flask import Flask
+
+from models import db, init_sqlite, upgrade, User, Movie, CatalogMovie
+from data_manager.omdb import parse_year, parse_rating, parse_runtime
+from .fake_omdb import fake_movie, fake_title
+
+INSERT_BATCH = 10_000
+
+
+def seed(path: Path, users: int, max_movies: int, catalog: int, seed: int = 1) -> dict:
+    """
+    Creates a database file and fills it with synthetic data.
+
+    Args:
+        path: The SQLite file to create, must not exist yet.
+        users: The number of users.
+        max_movies: The maximum number of movies per user.
+        catalog: The number of distinct movies in the catalog.
+        seed: The random seed.
+
+    Returns:
+        The number of rows inserted per table and the time it took.
+
+    Raises:
+        FileExistsError: If the file exists already.
+    """
+    if path.exists():
+        raise FileExistsError(path)
+
+    start = time.perf_counter()
+    rng = random.Random(seed)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    init_sqlite(app)
+
+    with app.app_context():
+        upgrade()
+
+        entries = []
+        for index in range(catalog):
+            payload = fake_movie(fake_title(rng), imdb_id=f"tt{index + 1:07d}")
+            entries.append({
+                'imdb_id': payload['imdbID'],
+                'title': payload['Title'],
+                'release_year': parse_year(payload),
+                'rated': payload['Rated'],
+                'rating': parse_rating(payload['imdbRating']),
+                'runtime': parse_runtime(payload['Runtime']),
+                'genre': payload['Genre'],
+                'director': payload['Director'],
+                'actors': payload['Actors'],
+                'plot': payload['Plot'],
+                'poster': payload['Poster'],
+            })
+        db.session.execute(db.insert(CatalogMovie), entries)
+
+        db.session.execute(
+            db.insert(User),
+            [{'name': f"{rng.choice(('Ava', 'Ben', 'Kira', 'Noah', 'Zoe'))} {index}"} for index in range(users)]
+        )
+
+        titles = [entry['title'] for entry in entries]
+        rows = []
+        movies = 0
+        for user_id in range(1, users + 1):
+            for catalog_id in rng.sample(range(1, catalog + 1), min(rng.randint(0, max_movies), catalog)):
+                rows.append({
+                    'title': titles[catalog_id - 1],
+                    'user_rating': round(rng.uniform(1, 10), 1) if rng.random() < 0.3 else None,
+                    'user_id': user_id,
+                    'catalog_id': catalog_id,
+                })
+
+            if len(rows) >= INSERT_BATCH:
+                db.session.execute(db.insert(Movie), rows)
+                movies += len(rows)
+                rows = []
+
+        if rows:
+            db.session.execute(db.insert(Movie), rows)
+            movies += len(rows)
+
+        db.session.commit()
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+        db.engine.dispose()
+
+    return {
+        'users': users,
+        'movies': movies,
+        'catalog': catalog,
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+
+
+def main() -> None:
+    """Seeds a database file from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('path', type=Path)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--max-movies', type=int, default=500)
+    parser.add_argument('--catalog', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(json.dumps(seed(args.path, args.users, args.max_movies, args.catalog, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+This module measures how the throughput of the production server scales with
+the number of worker processes.
+
+It seeds a database with synthetic data (see `benchmarks.seed`), then starts
+`python app.py` (see `core.serving`) once for every worker count in
+`--workers` and drives the read-only routes of `benchmarks.web` over HTTP from
+several client processes, so that the load generator doesn't become the
+bottleneck. For every worker count it reports throughput, p50/p95 latency and
+the speedup over a single worker, and writes the results as JSON. The page
+cache is off by default, so that every request renders its page.
+
+Usage:
+    python -m benchmarks.serving [--workers 1,2,4] [--threads 1] [--requests 2000]
+        [--clients 4] [--concurrency 8] [--output results.json]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from .web import SCENARIOS, Request, summarize
+from .seed import seed
+
+ROOT = Path(__file__).parent.parent.resolve()
+ROUTES = ('user_details', 'movie_list', 'movie_list_filtered', 'movie_details', 'api_movies')
+
+
+def free_port() -> int:
+    """Finds a free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(base: str, timeout: float = 60) -> None:
+    """
+    Waits for a server to answer.
+
+    Args:
+        base: The base URL of the server.
+        timeout: Seconds to wait at most.
+
+    Raises:
+        TimeoutError: If the server doesn't answer in time.
+    """
+    import requests
+
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base + '/', timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+
+    raise TimeoutError(f"{base} didn't start within {timeout} seconds")
+
+
+def drive(base: str, batch: list[Request], concurrency: int) -> list[tuple[float, int, None]]:
+    """
+    Sends requests from one client process with concurrent threads.
+
+    Args:
+        base: The base URL of the server.
+        batch: The requests to send.
+        concurrency: The number of concurrent threads.
+
+    Returns:
+        The latency in seconds and status code of every request.
+    """
+    import requests
+
+    local = threading.local()
+
+    def send(request: Request) -> tuple[float, int, None]:
+        session = getattr(local, 'session', None) or requests.Session()
+        local.session = session
+        method, url, form = request
+        began = time.perf_counter()
+        response = session.request(method, base + url, data=form, allow_redirects=False)
+        return time.perf_counter() - began, response.status_code, None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(send, batch))
+
+
+def run(
+        env: dict,
+        workers: int,
+        threads: int,
+        batch: list[Request],
+        clients: int,
+        concurrency: int
+) -> dict:
+    """
+    Starts the server with a number of workers and measures its throughput.
+
+    Args:
+        env: The environment of the server.
+        workers: The number of worker processes.
+        threads: The number of threads per worker.
+        batch: The requests to send.
+        clients: The number of client processes.
+        concurrency: The number of concurrent threads per client.
+
+    Returns:
+        The statistics of the run.
+    """
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, 'app.py', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--threads', str(threads), '--max-requests', '0'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        wait_until_up(base)
+        # Warm up every worker before measuring.
+        drive(base, batch[:workers * 20], concurrency)
+
+        with ProcessPoolExecutor(max_workers=clients) as executor:
+            start = time.perf_counter()
+            parts = executor.map(
+                drive, [base] * clients, [batch[i::clients] for i in range(clients)], [concurrency] * clients
+            )
+            results = [result for part in parts for result in part]
+            seconds = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    stats = summarize(f"{workers}x{threads}", results, seconds)
+    return {
+        'workers': workers,
+        'threads': threads,
+        **{key: stats[key] for key in ('requests', 'server_errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')},
+    }
+
+
+def main() -> None:
+    """Seeds a database and measures the throughput for every worker count."""
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database', type=Path,
+                        help='Reuse or create this seeded database instead of a temporary one.')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--max-movies', type=int, default=200)
+    parser.add_argument('--catalog', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', default=','.join(str(n) for n in sorted({1, 2, cpus, 2 * cpus})),
+                        help='Comma-separated worker counts, by default 1, 2, the CPU count and twice that.')
+    parser.add_argument('--threads', type=int, default=1, help='Threads per worker.')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per worker count.')
+    parser.add_argument('--clients', type=int, default=max(2, cpus), help='Client processes.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent requests per client process.')
+    parser.add_argument('--page-cache', choices=['memory', 'sqlite', 'none'], default='none')
+    parser.add_argument('--output', type=Path, help='Write the results as JSON to this file.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database or Path(tmp) / 'serving.sqlite'
+        seeded = seed(database, args.users, args.max_movies, args.catalog, args.seed) if not database.exists() else None
+
+        with sqlite3.connect(database) as conn:
+            sample = {
+                'users': [row[0] for row in conn.execute("SELECT id FROM users ORDER BY random() LIMIT 1000")],
+                'movies': conn.execute("SELECT user_id, id FROM movies ORDER BY random() LIMIT 1000").fetchall(),
+            }
+
+        rng = random.Random(args.seed)
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in ROUTES]
+        batch = [rng.choice(scenarios).build(rng, sample) for _ in range(args.requests)]
+        env = {
+            **os.environ,
+            'DATABASE_URL': f"sqlite:///{database.resolve()}",
+            'OMDB_CACHE_PATH': str(Path(tmp) / 'omdb_cache.sqlite'),
+            'PAGE_CACHE_BACKEND': args.page_cache,
+            'PAGE_CACHE_PATH': str(Path(tmp) / 'page_cache.sqlite'),
+            'POSTER_PATH': str(Path(tmp) / 'posters'),
+            'POSTER_PREFETCH': '0',
+            'REQUEST_LOG_LEVEL': 'ERROR',
+        }
+
+        runs = [
+            run(env, int(workers), args.threads, batch, args.clients, args.concurrency)
+            for workers in args.workers.split(',')
+        ]
+
+    for result in runs:
+        result['speedup'] = round(result['throughput_rps'] / runs[0]['throughput_rps'], 2)
+
+    results = {
+        'cpus': cpus,
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'database')},
+        'seeded': seeded,
+        'runs': runs,
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if any(result['server_errors'] for result in runs):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+This module stress-tests SQLite under concurrent readers and writers.
+
+Writer threads keep inserting movies while reader threads page through a
+library, once with the tuned connection settings from `models.db` and once
+with SQLite's defaults. It reports read latencies and "database is locked"
+errors for both and exits with status 1 if writers block the readers in the
+tuned configuration.
+
+Usage:
+    python -m benchmarks.sqlite_concurrency [--seconds 5] [--readers 8] [--writers 2]
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from models import db, init_sqlite, upgrade, Movie, User
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 0,
+}
+
+
+def make_app(path: Path, pragmas: dict | None) -> Flask:
+    """
+    Creates a bare application on its own database file.
+
+    Args:
+        path: The SQLite database file.
+        pragmas: Overrides for the tuned pragmas, None to keep them.
+
+    Returns:
+        The Flask application.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 32, 'max_overflow': 0}
+    app.config['SQLITE_PRAGMAS'] = pragmas or {}
+    db.init_app(app)
+    init_sqlite(app)
+
+    with app.app_context():
+        upgrade()
+        user = User(name='stress')
+        db.session.add(user)
+        db.session.add_all([Movie(title=f"Movie {i}", user=user) for i in range(2000)])
+        db.session.commit()
+
+    return app
+
+
+def run(app: Flask, seconds: float, readers: int, writers: int) -> dict:
+    """
+    Runs readers and writers against an application's database.
+
+    Args:
+        app: The application to stress.
+        seconds: How long to run.
+        readers: The number of reader threads.
+        writers: The number of writer threads.
+
+    Returns:
+        A dictionary of read and write statistics.
+    """
+    deadline = time.monotonic() + seconds
+    latencies: list[float] = []
+    errors = {'read': 0, 'write': 0}
+    writes = [0]
+    lock = threading.Lock()
+
+    def read() -> None:
+        with app.app_context():
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    db.session.execute(
+                        db.select(Movie).filter_by(user_id=1).order_by(Movie.id.desc()).limit(48)
+                    ).scalars().all()
+                    db.session.commit()
+                except OperationalError:
+                    db.session.rollback()
+                    with lock:
+                        errors['read'] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+    def write() -> None:
+        with app.app_context():
+            while time.monotonic() < deadline:
+                try:
+                    db.session.add(Movie(title='New movie', user_id=1))
+                    db.session.flush()
+                    time.sleep(0.005)
+                    db.session.commit()
+                except OperationalError:
+                    db.session.rollback()
+                    with lock:
+                        errors['write'] += 1
+                    continue
+                with lock:
+                    writes[0] += 1
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    threads += [threading.Thread(target=write) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    percentile = lambda p: round(latencies[int(p * (len(latencies) - 1))] * 1000, 2) if latencies else None
+
+    return {
+        'reads': len(latencies),
+        'read_errors': errors['read'],
+        'writes': writes[0],
+        'write_errors': errors['write'],
+        'read_ms_p50': percentile(0.5),
+        'read_ms_p99': percentile(0.99),
+        'read_ms_mean': round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+def main() -> None:
+    """Runs the stress test with the tuned and the default settings."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--max-p99-ms', type=float, default=250,
+                        help='Fail if the tuned p99 read latency exceeds this.')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, pragmas in (('tuned', None), ('default', DEFAULT_PRAGMAS)):
+            app = make_app(Path(tmp) / f"{name}.sqlite", pragmas)
+            results[name] = run(app, args.seconds, args.readers, args.writers)
+            with app.app_context():
+                db.engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+    tuned = results['tuned']
+    if tuned['read_errors'] or tuned['write_errors'] or (tuned['read_ms_p99'] or 0) > args.max_p99_ms:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+This module measures how long a worker process takes to boot.
+
+It starts fresh Python processes that import `app`, call `create_app` and
+serve a first request, and reports the median time of every step and of the
+whole process. One more process runs with `python -X importtime`, whose report
+is summed up per top-level package to show where the import time goes.
+
+Given the JSON of an earlier run with `--baseline`, it exits with status 1 if
+a step got slower by more than `--max-regression`; it also exits with status 1
+if booting takes longer than `--max-boot-ms`, so CI catches imports that creep
+back into the startup path.
+
+Usage:
+    python -m benchmarks.startup [--runs 10] [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent.resolve()
+STEPS = ('import_ms', 'create_ms', 'first_request_ms', 'process_ms')
+
+# Runs in the child process and prints the duration of every step.
+CHILD = """
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+}))
+"""
+
+
+def boot(env: dict, importtime: bool = False) -> tuple[dict, str]:
+    """
+    Boots the app in a fresh process.
+
+    Args:
+        env: The environment of the process.
+        importtime: Whether to run it with `-X importtime`.
+
+    Returns:
+        The duration of every step in milliseconds and what the process wrote
+        to stderr.
+    """
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', CHILD]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    steps = json.loads(result.stdout.strip().splitlines()[-1])
+    steps['process_ms'] = (time.perf_counter() - start) * 1000
+    return steps, result.stderr
+
+
+def import_times(report: str, top: int) -> dict[str, float]:
+    """
+    Sums up a `-X importtime` report per top-level package.
+
+    Args:
+        report: What the process wrote to stderr.
+        top: The number of packages to return.
+
+    Returns:
+        The packages with the most import time and their time in milliseconds,
+        slowest first.
+    """
+    totals = Counter()
+
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        own, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(own) / 1000
+
+    return {name: round(ms, 1) for name, ms in totals.most_common(top)}
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """
+    Compares the boot times with those of an earlier run.
+
+    Args:
+        results: The results of this run.
+        baseline: The results of the earlier run.
+        max_regression: The allowed relative slowdown, e.g. 0.25 for 25%.
+
+    Returns:
+        A description of every regression.
+    """
+    return [
+        f"{step}: {baseline['median'][step]} ms -> {results['median'][step]} ms"
+        for step in STEPS
+        if step in baseline.get('median', {})
+        and results['median'][step] > baseline['median'][step] * (1 + max_regression)
+    ]
+
+
+def main() -> None:
+    """Boots the app repeatedly and checks the boot time."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15, help='Packages to list in the import time breakdown.')
+    parser.add_argument('--max-boot-ms', type=float, default=3000,
+                        help='The allowed median time from process start to the first response.')
+    parser.add_argument('--output', type=Path, help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', type=Path, help='Fail on regressions against these results.')
+    parser.add_argument('--max-regression', type=float, default=0.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            'DATABASE_URL': f"sqlite:///{Path(tmp) / 'startup.sqlite'}",
+            'OMDB_CACHE_PATH': str(Path(tmp) / 'omdb_cache.sqlite'),
+            'PAGE_CACHE_BACKEND': 'memory',
+            'POSTER_PATH': str(Path(tmp) / 'posters'),
+            'REQUEST_LOG_LEVEL': 'ERROR',
+        }
+        # The first boot creates the database, like a deploy would.
+        boot(env)
+        runs = [boot(env)[0] for _ in range(args.runs)]
+        _, report = boot(env, importtime=True)
+
+    results = {
+        'runs': args.runs,
+        'median': {step: round(statistics.median(run[step] for run in runs), 1) for step in STEPS},
+        'max': {step: round(max(run[step] for run in runs), 1) for step in STEPS},
+        'import_time_ms': import_times(report, args.top),
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    failures = []
+    if results['median']['process_ms'] > args.max_boot_ms:
+        failures.append(f"booting took {results['median']['process_ms']} ms, more than {args.max_boot_ms} ms")
+    if args.baseline:
+        failures += compare(results, json.loads(args.baseline.read_text()), args.max_regression)
+
+    for failure in failures:
+        print(failure)
+
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+This module load-tests the routes of the web app.
+
+It seeds a database with synthetic data (see `benchmarks.seed`), answers OMDB
+lookups with an in-process fake (see `benchmarks.fake_omdb`) and drives every
+route of `app.py`, first one request at a time through the Flask test client
+and then with concurrent clients over real HTTP. For every route it reports
+throughput, p50/p95/p99 latency and SQL queries per request (read from the
+`Server-Timing` header) and writes the results as JSON.
+
+Given the JSON of an earlier run with `--baseline`, it exits with status 1 if a
+route got slower by more than `--max-regression` at p95 or may issue more
+queries per request than before. It also fails on any 5xx response.
+
+Usage:
+    python -m benchmarks.web [--users 1000] [--max-movies 500] [--requests 200]
+        [--concurrency 8] [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+Sample = dict
+Request = tuple[str, str, dict | None]
+
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class Scenario:
+    """A route and how to build requests for it."""
+
+    def __init__(self, name: str, build: Callable[[random.Random, Sample], Request]):
+        """
+        Initializes the scenario.
+
+        Args:
+            name: The name of the scenario, usually the endpoint.
+            build: Returns the method, URL and form data of a request.
+        """
+        self.name = name
+        self.build = build
+
+
+def _movie_update(rng: random.Random, sample: Sample) -> Request:
+    user_id, movie_id = rng.choice(sample['movies'])
+    form = {'new_title': f"Renamed {rng.randint(1, 10 ** 6)}", 'user_rating': f"{rng.uniform(1, 10):.1f}"}
+    return 'POST', f"/users/{user_id}/movies/{movie_id}/update", form
+
+
+def _movie_delete(rng: random.Random, sample: Sample) -> Request:
+    with sample['lock']:
+        user_id, movie_id = sample['deletable'].pop() if sample['deletable'] else rng.choice(sample['movies'])
+    return 'POST', f"/users/{user_id}/movies/{movie_id}/delete", None
+
+
+SCENARIOS = [
+    Scenario('home', lambda rng, sample: ('GET', '/', None)),
+    Scenario('user_details', lambda rng, sample: (
+        'GET', f"/users/{rng.choice(sample['users'])}", None
+    )),
+    Scenario('movie_list', lambda rng, sample: (
+        'GET', f"/users/{rng.choice(sample['users'])}/movies", None
+    )),
+    Scenario('movie_list_sorted', lambda rng, sample: (
+        'GET', f"/users/{rng.choice(sample['users'])}/movies?sort=rating&order=desc", None
+    )),
+    Scenario('movie_list_filtered', lambda rng, sample: (
+        'GET', f"/users/{rng.choice(sample['users'])}/movies?sort=year&min_rating=7&max_runtime=120", None
+    )),
+    Scenario('movie_details', lambda rng, sample: (
+        'GET', '/users/{}/movies/{}'.format(*rng.choice(sample['movies'])), None
+    )),
+    Scenario('user_add_form', lambda rng, sample: ('GET', '/users/add_user', None)),
+    Scenario('user_add', lambda rng, sample: (
+        'POST', '/users/add_user', {'username': f"Bench {rng.randint(1, 10 ** 9)}"}
+    )),
+    Scenario('user_update', lambda rng, sample: (
+        'POST', f"/users/{rng.choice(sample['users'])}/update", {'username': f"Renamed {rng.randint(1, 10 ** 6)}"}
+    )),
+    Scenario('movie_add_form', lambda rng, sample: (
+        'GET', f"/users/{rng.choice(sample['users'])}/movies/add_movie", None
+    )),
+    Scenario('movie_add', lambda rng, sample: (
+        'POST', f"/users/{rng.choice(sample['users'])}/movies/add_movie", {'title': f"Bench {rng.randint(1, 10 ** 9)}"}
+    )),
+    Scenario('movie_update', _movie_update),
+    Scenario('movie_delete', _movie_delete),
+    Scenario('api_users', lambda rng, sample: ('GET', '/api/v1/users?size=100', None)),
+    Scenario('api_movies', lambda rng, sample: (
+        'GET', f"/api/v1/users/{rng.choice(sample['users'])}/movies?fields=title,year,rating&sort=rating", None
+    )),
+    Scenario('api_movie', lambda rng, sample: (
+        'GET', f"/api/v1/movies/{rng.choice(sample['movies'])[1]}", None
+    )),
+    Scenario('metrics', lambda rng, sample: ('GET', '/metrics', None)),
+]
+
+
+def summarize(name: str, results: list[tuple[float, int, int | None]], seconds: float) -> dict:
+    """
+    Sums up the requests of one scenario.
+
+    Args:
+        name: The scenario name.
+        results: The latency in seconds, status code and query count of every request.
+        seconds: The wall-clock time the requests took.
+
+    Returns:
+        The statistics of the scenario.
+    """
+    latencies = sorted(latency for latency, _, _ in results)
+    queries = [count for _, _, count in results if count is not None]
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+
+    return {
+        'route': name,
+        'requests': len(results),
+        'server_errors': sum(1 for _, status, _ in results if status >= 500),
+        'throughput_rps': round(len(results) / seconds, 1) if seconds else None,
+        'p50_ms': round(percentiles[49] * 1000, 2),
+        'p95_ms': round(percentiles[94] * 1000, 2),
+        'p99_ms': round(percentiles[98] * 1000, 2),
+        'queries_mean': round(statistics.fmean(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def run_client(app, sample: Sample, requests_per_route: int, seed: int) -> list[dict]:
+    """
+    Sends requests to every route one at a time through the Flask test client.
+
+    Args:
+        app: The Flask application.
+        sample: IDs of existing users and movies to request.
+        requests_per_route: The number of requests per scenario.
+        seed: The random seed.
+
+    Returns:
+        The statistics of every scenario.
+    """
+    client = app.test_client()
+    rng = random.Random(seed)
+    report = []
+
+    for scenario in SCENARIOS:
+        results = []
+        start = time.perf_counter()
+
+        for _ in range(requests_per_route):
+            method, url, form = scenario.build(rng, sample)
+            began = time.perf_counter()
+            response = client.open(url, method=method, data=form)
+            response.close()
+            match = QUERIES.search(response.headers.get('Server-Timing', ''))
+            results.append((
+                time.perf_counter() - began, response.status_code, int(match.group(1)) if match else None
+            ))
+
+        report.append(summarize(scenario.name, results, time.perf_counter() - start))
+
+    return report
+
+
+def run_http(app, sample: Sample, requests_per_route: int, concurrency: int, seed: int) -> list[dict]:
+    """
+    Sends concurrent requests to every route over HTTP.
+
+    The application is served by a threaded development server on a free
+    local port for the duration of the run.
+
+    Args:
+        app: The Flask application.
+        sample: IDs of existing users and movies to request.
+        requests_per_route: The number of requests per scenario.
+        concurrency: The number of concurrent clients.
+        seed: The random seed.
+
+    Returns:
+        The statistics of every scenario.
+    """
+    import requests
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    local = threading.local()
+    report = []
+
+    def send(request: Request) -> tuple[float, int, int | None]:
+        session = getattr(local, 'session', None) or requests.Session()
+        local.session = session
+        method, url, form = request
+        began = time.perf_counter()
+        response = session.request(method, base + url, data=form, allow_redirects=False)
+        match = QUERIES.search(response.headers.get('Server-Timing', ''))
+        return time.perf_counter() - began, response.status_code, int(match.group(1)) if match else None
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            rng = random.Random(seed)
+            for scenario in SCENARIOS:
+                batch = [scenario.build(rng, sample) for _ in range(requests_per_route)]
+                start = time.perf_counter()
+                results = list(executor.map(send, batch))
+                report.append(summarize(scenario.name, results, time.perf_counter() - start))
+    finally:
+        server.shutdown()
+
+    return report
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """
+    Compares a run with an earlier one.
+
+    Args:
+        results: The results of this run.
+        baseline: The results of the earlier run.
+        max_regression: The allowed relative p95 slowdown, e.g. 0.25 for 25%.
+
+    Returns:
+        A description of every regression.
+    """
+    failures = []
+
+    for mode in ('client', 'http'):
+        before = {route['route']: route for route in baseline.get(mode, [])}
+
+        for route in results.get(mode, []):
+            old = before.get(route['route'])
+
+            if old is None:
+                continue
+
+            if route['p95_ms'] > old['p95_ms'] * (1 + max_regression):
+                failures.append(f"{mode} {route['route']}: p95 {old['p95_ms']} ms -> {route['p95_ms']} ms")
+
+            # The mean depends on how many requests hit the page cache, the
+            # maximum is the cost of rendering the page.
+            if (route['queries_max'] or 0) > (old['queries_max'] or 0):
+                failures.append(
+                    f"{mode} {route['route']}: queries per request {old['queries_max']} -> {route['queries_max']}"
+                )
+
+    return failures
+
+
+def main() -> None:
+    """Seeds a database, runs the benchmark and checks for regressions."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database', type=Path,
+                        help='Reuse or create this seeded database instead of a temporary one.')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--max-movies', type=int, default=500)
+    parser.add_argument('--catalog', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per route and mode.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--omdb-latency', type=float, default=50, help='Latency of the fake OMDB in ms.')
+    parser.add_argument('--page-cache', choices=['memory', 'sqlite', 'none'], default='memory')
+    parser.add_argument('--mode', choices=['client', 'http', 'both'], default='both')
+    parser.add_argument('--output', type=Path, help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', type=Path, help='Fail on regressions against these results.')
+    parser.add_argument('--max-regression', type=float, default=0.25)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    database = args.database or Path(tmp.name) / 'bench.sqlite'
+
+    # The app reads its configuration from the environment when it is created.
+    os.environ['DATABASE_URL'] = f"sqlite:///{database.resolve()}"
+    os.environ['OMDB_CACHE_PATH'] = str(Path(tmp.name) / 'omdb_cache.sqlite')
+    os.environ['PAGE_CACHE_BACKEND'] = args.page_cache
+    os.environ['PAGE_CACHE_PATH'] = str(Path(tmp.name) / 'page_cache.sqlite')
+    os.environ['POSTER_PATH'] = str(Path(tmp.name) / 'posters')
+    os.environ['POSTER_PREFETCH'] = '0'
+    os.environ['REQUEST_LOG_LEVEL'] = 'ERROR'
+    os.environ['SERVER_TIMING'] = '1'
+    os.environ.setdefault('OMDB_API_KEY', 'benchmark')
+    # The fake OMDB has no quota to protect.
+    os.environ['OMDB_RATE_LIMIT'] = '0'
+    os.environ['OMDB_DAILY_QUOTA'] = '0'
+
+    from .seed import seed
+    from .fake_omdb import fake_omdb
+
+    seeded = None
+    if not database.exists():
+        seeded = seed(database, args.users, args.max_movies, args.catalog, args.seed)
+
+    from app import create_app
+    from models import db
+
+    app = create_app()
+
+    with app.app_context():
+        users = db.session.execute(db.text(
+            "SELECT id FROM users ORDER BY random() LIMIT 1000"
+        )).scalars().all()
+        movies = [tuple(row) for row in db.session.execute(db.text(
+            "SELECT user_id, id FROM movies ORDER BY random() LIMIT 2000"
+        ))]
+
+    sample = {
+        'users': users,
+        'movies': movies[:1000],
+        'deletable': movies[1000:],
+        'lock': threading.Lock(),
+    }
+    results = {
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline', 'database')},
+        'seeded': seeded,
+    }
+
+    with fake_omdb(app, args.omdb_latency / 1000) as omdb:
+        if args.mode in ('client', 'both'):
+            results['client'] = run_client(app, sample, args.requests, args.seed)
+        if args.mode in ('http', 'both'):
+            results['http'] = run_http(app, sample, args.requests, args.concurrency, args.seed + 1)
+        results['omdb_requests'] = omdb.requests
+
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    failures = [
+        f"{mode} {route['route']}: {route['server_errors']} server errors"
+        for mode in ('client', 'http') for route in results.get(mode, []) if route['server_errors']
+    ]
+    if args.baseline:
+        failures += compare(results, json.loads(args.baseline.read_text()), args.max_regression)
+
+    for failure in failures:
+        print(failure)
+
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
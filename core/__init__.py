@@ -1 +1,5 @@
-from .controllers import Post, Get, RenderedPage
\ No newline at end of file
+from .controllers import Post, Get, RenderedPage
+from .page_cache import PageCache, MemoryBackend, SQLiteBackend
+from .instrumentation import Instrumentation
+from .metrics import Metrics, TimedQueuePool
+from .export import InvalidExportFormat
@@ -0,0 +1,126 @@
+"""
+This module defines the command line interface of the web application.
+
+The commands are registered with every application `create_app` creates and
+run with `flask --app app <command>`.
+"""
+import json
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+
+from models import db, unindexed_queries, Movie
+from data_manager import BulkImporter, parse_items
+from data_manager.fields import select_fields
+from .export import FORMATS, encode, gzipped
+from .query_budget import over_budget
+
+
+@click.command('import-movies')
+@with_appcontext
+@click.argument('user_id', type=int)
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']),
+              help='The file format, guessed from the file name by default.')
+def import_movies(user_id: int, file, fmt: str | None) -> None:
+    """
+    Imports a CSV or JSON list of titles or IMDb IDs for a user.
+
+    Prints the progress as newline-delimited JSON.
+    """
+    fmt = fmt or ('json' if file.name.lower().endswith('.json') else 'csv')
+    importer = BulkImporter(
+        workers=current_app.config['IMPORT_WORKERS'],
+        batch_size=current_app.config['IMPORT_BATCH_SIZE']
+    )
+
+    for event in importer.run(user_id, parse_items(file.read(), fmt)):
+        click.echo(json.dumps(event))
+
+
+@click.command('export-movies')
+@with_appcontext
+@click.argument('user_id', type=int)
+@click.argument('output', type=click.File('wb'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='csv', show_default=True)
+@click.option('--fields', help='Comma-separated fields to export, all by default.')
+@click.option('--gzip', 'compress', is_flag=True, help='Compress the output with gzip.')
+def export_movies(user_id: int, output, fmt: str, fields: str | None, compress: bool) -> None:
+    """
+    Exports all movies of a user as CSV or JSON Lines to OUTPUT or stdout.
+    """
+    dm = current_app.extensions['data_manager']
+    dm.user.get(user_id)
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    chunks = encode(
+        dm.movie.export(user_id, fields, batch_size),
+        fmt,
+        list(select_fields(dm.movie.FIELDS, fields)),
+        batch_size
+    )
+
+    for chunk in gzipped(chunks) if compress else chunks:
+        output.write(chunk)
+
+
+@click.command('check-indexes')
+@with_appcontext
+def check_indexes() -> None:
+    """
+    Checks that the hot queries are answered from indexes.
+
+    Exits with status 1 and prints the query plans of queries that scan a
+    table without an index.
+    """
+    failures = unindexed_queries()
+
+    for name, plan in failures.items():
+        click.echo(f"{name}: {'; '.join(plan)}", err=True)
+
+    if failures:
+        raise SystemExit(1)
+
+    click.echo("All hot queries use an index.")
+
+
+@click.command('check-query-budgets')
+@with_appcontext
+@click.option('--movie', 'movie_id', type=int, help='The movie to render the pages for, the first one by default.')
+def check_query_budgets(movie_id: int | None) -> None:
+    """
+    Checks that the pages keep to their budget of SQL statements.
+
+    Exits with status 1 and prints the pages that issue more statements than
+    their budget.
+    """
+    statement = db.select(Movie.user_id, Movie.id).order_by(Movie.id).limit(1)
+
+    if movie_id is not None:
+        statement = statement.filter(Movie.id == movie_id)
+
+    sample = db.session.execute(statement).one_or_none()
+    db.session.remove()
+
+    if sample is None:
+        raise click.ClickException("There is no movie to render the pages for.")
+
+    failures = over_budget(current_app._get_current_object(), sample.user_id, sample.id)
+
+    for endpoint, (statements, budget) in failures.items():
+        click.echo(f"{endpoint}: {statements} statements, budget {budget}", err=True)
+
+    if failures:
+        raise SystemExit(1)
+
+    click.echo("All pages keep to their query budget.")
+
+
+def register_commands(app: Flask) -> None:
+    """
+    Registers all commands with an application.
+
+    Args:
+        app: The Flask application.
+    """
+    for command in (import_movies, export_movies, check_indexes, check_query_budgets):
+        app.cli.add_command(command)
@@ -0,0 +1,94 @@
+"""
+This module implements conditional GET support for rendered pages.
+
+Controllers describe a page by cheap validators, an ETag and a Last-Modified
+time derived from version counters, and pass a function that renders it. A
+request whose `If-None-Match` or `If-Modified-Since` header matches gets a 304
+before any ORM loading or template rendering happens.
+"""
+import hashlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable
+
+from flask import Response, request
+
+RenderedPage = str
+
+# Part of every ETag, so that deploying changed templates invalidates the
+# pages browsers have cached.
+TEMPLATES_VERSION = str(max(
+    (path.stat().st_mtime_ns for path in (Path(__file__).parent.parent / 'templates').iterdir()),
+    default=0
+))
+
+
+class Validators:
+    """The ETag and Last-Modified time of a page."""
+
+    def __init__(self, *parts: object, last_modified: datetime | None = None):
+        """
+        Derives the validators of a page.
+
+        Args:
+            *parts: Everything the page content depends on, such as the route,
+                version counters and the query string.
+            last_modified: When the data shown on the page last changed, in UTC.
+        """
+        digest = hashlib.blake2b(
+            repr((TEMPLATES_VERSION, *parts)).encode(), digest_size=12
+        ).hexdigest()
+        self.etag = digest
+        self.last_modified = (
+            last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+            if last_modified else None
+        )
+
+    def matches(self) -> bool:
+        """
+        Checks whether the client's cached copy of the page is still valid.
+
+        `If-None-Match` takes precedence over `If-Modified-Since`.
+
+        Returns:
+            True if the client may reuse its copy.
+        """
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(self.etag)
+
+        if request.if_modified_since and self.last_modified:
+            return self.last_modified <= request.if_modified_since
+
+        return False
+
+
+def conditional(
+        validators: Validators,
+        render: Callable[[], RenderedPage | Iterable[bytes]],
+        mimetype: str = 'text/html'
+) -> Response:
+    """
+    Answers a GET with 304 Not Modified or with the freshly rendered page.
+
+    Both responses carry the validators and ask browsers and shared caches to
+    revalidate before reusing the page.
+
+    Args:
+        validators: The validators of the page.
+        render: Renders the page, only called if the client's copy is stale.
+        mimetype: The MIME type of the page.
+
+    Returns:
+        A Flask response.
+    """
+    if validators.matches():
+        resp = Response(status=304)
+    else:
+        resp = Response(render(), status=200, mimetype=mimetype)
+
+    resp.set_etag(validators.etag)
+    if validators.last_modified:
+        resp.last_modified = validators.last_modified
+    resp.cache_control.no_cache = True
+
+    return resp
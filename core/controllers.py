@@ -1,13 +1,95 @@
 """
 This module defines controller classes for handling HTTP GET and POST requests
 related to users and movies. It separates the logic for processing requests
-from the routing definitions in the main Flask application.
+from the routing definitions in `core.routes`.
 """
-from flask import render_template, request, redirect, url_for, Response
-from data_manager import DataManager
-
-DM = DataManager()
+import json
+from functools import wraps
+from typing import Callable
+from werkzeug.local import LocalProxy
+from flask import (
+    render_template, request, redirect, url_for, Response, current_app, stream_with_context, send_file, abort
+)
+from models import Movie
+from data_manager import (
+    DataManager, EnrichmentQueueFull, BulkImporter, PosterStore, parse_items,
+    UserNotFoundError, MovieNotFoundError, InvalidPageRequest, InvalidFields
+)
+from data_manager.posters import SIZES, ORIGINAL
+from data_manager.fields import select_fields
+from .page_cache import PageCache, page_cache
+from .conditional import Validators, conditional
+from .serialization import dumps, stream_page
+from .export import FORMATS, encode, gzipped
+
+# The DataManager of the current application, see `create_app`.
+DM: DataManager = LocalProxy(lambda: current_app.extensions['data_manager'])
 RenderedPage = str
+ONE_YEAR = 365 * 24 * 3600
+
+
+def filter_args() -> dict:
+    """
+    Reads the movie filter parameters of the current request.
+
+    Parameters that are missing or not numbers are left out.
+
+    Returns:
+        A dictionary with the `year_from`, `year_to`, `min_rating` and
+        `max_runtime` filters that are set.
+    """
+    args = {
+        'year_from': request.args.get('year_from', type=int),
+        'year_to': request.args.get('year_to', type=int),
+        'min_rating': request.args.get('min_rating', type=float),
+        'max_runtime': request.args.get('max_runtime', type=int),
+    }
+    return {name: value for name, value in args.items() if value is not None}
+
+
+def page_args(max_size: str = 'MAX_PAGE_SIZE') -> dict:
+    """
+    Reads the keyset pagination parameters of the current request.
+
+    The page size defaults to `PAGE_SIZE` and is capped at `MAX_PAGE_SIZE`.
+
+    Args:
+        max_size: The config key of the maximum page size.
+
+    Returns:
+        A dictionary with the page size and the `after`/`before` cursors.
+    """
+    size = request.args.get('size', type=int) or current_app.config['PAGE_SIZE']
+    args = {
+        'size': max(1, min(size, current_app.config[max_size])),
+        'after': request.args.get('after'),
+        'before': request.args.get('before'),
+    }
+    return args
+
+
+def cached_page(validators: Validators, render: Callable[[], tuple[RenderedPage, bool]], *parts: object) -> Response:
+    """
+    Answers a GET with 304 Not Modified or with the page, served from the
+    page cache when possible.
+
+    The page is cached under a key built from the route and IDs in `parts`
+    and the ETag of the validators, so a cached body is only ever sent with
+    the validators it was rendered for.
+
+    Args:
+        validators: The validators of the page.
+        render: Renders the page and says whether it may be cached.
+        *parts: The route name followed by its IDs, see `PageCache.key`.
+
+    Returns:
+        A Flask response.
+    """
+    resp = conditional(
+        validators,
+        lambda: page_cache().get_or_render(PageCache.key(*parts, validators.etag, query=False), render)
+    )
+    return resp
 
 
 class UserPost:
@@ -24,6 +106,7 @@ class UserPost:
         user = DM.user.add(
             name=request.form.get('username')
         )
+        page_cache().invalidate(PageCache.key('home', query=False))
         resp = redirect(url_for(
             endpoint='user_details', user_id=user.id
         ))
@@ -44,6 +127,10 @@ class UserPost:
         DM.user.update(
             user_id=user_id, new_name=request.form.get('username')
         )
+        page_cache().invalidate(
+            PageCache.key('home', query=False),
+            PageCache.key('movies', user_id, query=False)
+        )
         resp = redirect(url_for(
             endpoint='user_details', user_id=user_id
         ))
@@ -59,15 +146,36 @@ class MoviePost:
         Adds a new movie for a user based on form data and redirects to the
         new movie's detail page.
 
+        With `ASYNC_MOVIE_ADD` enabled only a pending placeholder is inserted
+        and the OMDB details are fetched in the background.
+
         Args:
             user_id: The ID of the user adding the movie.
 
         Returns:
             A Flask redirect response.
+
+        Raises:
+            EnrichmentQueueFull: If the background queue has no room left.
         """
-        movie = DM.movie.add(
-            title=request.form.get('title'),
-            user_id=user_id
+        if current_app.config.get('ASYNC_MOVIE_ADD'):
+            movie = DM.movie.add_pending(
+                title=request.form.get('title'),
+                user_id=user_id
+            )
+            try:
+                current_app.extensions['enrichment'].submit(movie.id)
+            except EnrichmentQueueFull:
+                DM.movie.delete(movie.id)
+                raise
+        else:
+            movie = DM.movie.add(
+                title=request.form.get('title'),
+                user_id=user_id
+            )
+        page_cache().invalidate(
+            PageCache.key('home', query=False),
+            PageCache.key('movies', user_id, query=False)
         )
         resp = redirect(url_for(
             endpoint='movie_details',
@@ -76,6 +184,58 @@ class MoviePost:
         ))
         return resp
 
+    @staticmethod
+    def bulk_import(user_id: int) -> Response:
+        """
+        Imports a list of titles or IMDb IDs for a user and streams the
+        progress back as newline-delimited JSON.
+
+        The list is read from an uploaded `file` or from the request body. It
+        is parsed as JSON for `.json` uploads and JSON requests and as CSV
+        otherwise, unless a `format` query parameter says which.
+
+        Args:
+            user_id: The ID of the user importing the movies.
+
+        Returns:
+            A streamed Flask response with one JSON object per line.
+
+        Raises:
+            UserNotFoundError: If no user is found with the given ID.
+            InvalidImportFile: If the list can't be parsed.
+        """
+        DM.user.get(user_id)
+        upload = request.files.get('file')
+
+        if upload:
+            data = upload.read()
+            fmt = 'json' if (upload.filename or '').lower().endswith('.json') else 'csv'
+        else:
+            data = request.get_data()
+            fmt = 'json' if request.is_json else 'csv'
+
+        items = parse_items(data, request.args.get('format', fmt))
+        importer = BulkImporter(
+            workers=current_app.config['IMPORT_WORKERS'],
+            batch_size=current_app.config['IMPORT_BATCH_SIZE']
+        )
+
+        def lines():
+            try:
+                for event in importer.run(user_id, items):
+                    yield json.dumps(event) + '\n'
+            finally:
+                # Also after a failed or aborted import, whose earlier batches were committed.
+                page_cache().invalidate(
+                    PageCache.key('home', query=False),
+                    PageCache.key('movies', user_id, query=False)
+                )
+
+        resp = Response(
+            stream_with_context(lines()), mimetype='application/x-ndjson'
+        )
+        return resp
+
     @staticmethod
     def delete(user_id: int, movie_id: int) -> Response:
         """
@@ -88,7 +248,12 @@ class MoviePost:
         Returns:
             A Flask redirect response.
         """
-        DM.movie.delete(movie_id)
+        DM.movie.delete(movie_id, user_id=user_id)
+        page_cache().invalidate(
+            PageCache.key('home', query=False),
+            PageCache.key('movies', user_id, query=False),
+            PageCache.key('movie', user_id, movie_id, query=False)
+        )
         resp = redirect(url_for(
             endpoint='movie_list',
             user_id=user_id
@@ -98,8 +263,8 @@ class MoviePost:
     @staticmethod
     def update(user_id: int, movie_id: int) -> Response:
         """
-        Updates a movie's title based on form data and redirects to the
-        movie's detail page.
+        Updates a movie's title and the user's rating based on form data and
+        redirects to the movie's detail page.
 
         Args:
             user_id: The ID of the user who owns the movie.
@@ -110,7 +275,13 @@ class MoviePost:
         """
         DM.movie.update(
             movie_id=movie_id,
-            new_title=request.form.get('new_title')
+            new_title=request.form.get('new_title'),
+            new_rating=request.form.get('user_rating', type=float),
+            user_id=user_id
+        )
+        page_cache().invalidate(
+            PageCache.key('movies', user_id, query=False),
+            PageCache.key('movie', user_id, movie_id, query=False)
         )
         resp = redirect(url_for(
             endpoint='movie_details',
@@ -130,17 +301,31 @@ class UserGet:
     """Handles GET requests for user-related pages."""
 
     @staticmethod
-    def list() -> RenderedPage:
+    def list() -> Response:
         """
-        Renders the home page with a list of all users.
+        Renders the home page with one page of users and their movie counts.
+
+        Answers with 304 Not Modified if no user or library changed since the
+        client fetched the page, otherwise serves it from the page cache when
+        possible.
 
         Returns:
-            The rendered HTML page as a string.
+            A Flask response.
         """
-        temp = render_template(
-            template_name_or_list='home.html', users=DM.user.get_all()
-        )
-        return temp
+        def render() -> tuple[RenderedPage, bool]:
+            args = page_args()
+            users = DM.user.page(**args)
+            page = render_template(
+                template_name_or_list='home.html',
+                users=users,
+                size=args['size'],
+                movies_counts=DM.movie.count_many(user.id for user in users)
+            )
+            return page, True
+
+        validators = Validators('home', request.query_string, *DM.user.versions())
+        resp = cached_page(validators, render, 'home')
+        return resp
 
     @staticmethod
     def add() -> RenderedPage:
@@ -156,23 +341,32 @@ class UserGet:
         return temp
 
     @staticmethod
-    def details(user_id: int) -> RenderedPage:
+    def details(user_id: int) -> Response:
         """
         Renders the detail page for a specific user, including their movie count.
 
+        The user, whose library version the validators are made of, and their
+        movie count are loaded in one query. Answers with 304 Not Modified if
+        the user's library didn't change since the client fetched the page.
+
         Args:
             user_id: The ID of the user.
 
         Returns:
-            The rendered HTML page as a string.
+            A Flask response.
         """
-        user = DM.user.get(user_id)
-        temp = render_template(
-            template_name_or_list='user.html',
-            user=user,
-            movies_count=DM.movie.count(user_id)
-        )
-        return temp
+        user, movies_count = DM.user.get_with_count(user_id)
+
+        def render() -> RenderedPage:
+            return render_template(
+                template_name_or_list='user.html',
+                user=user,
+                movies_count=movies_count
+            )
+
+        validators = Validators('user', user_id, user.version, last_modified=user.updated_at)
+        resp = conditional(validators, render)
+        return resp
 
     @staticmethod
     def delete(user_id: int) -> Response:
@@ -186,6 +380,11 @@ class UserGet:
             A Flask redirect response.
         """
         DM.user.delete(user_id)
+        page_cache().invalidate(
+            PageCache.key('home', query=False),
+            PageCache.key('movies', user_id, query=False),
+            PageCache.key('movie', user_id, query=False)
+        )
         resp = redirect(url_for(
             endpoint='home')
         )
@@ -213,44 +412,170 @@ class MovieGet:
     """Handles GET requests for movie-related pages."""
 
     @staticmethod
-    def list(user_id: int) -> RenderedPage:
+    def list(user_id: int) -> Response:
         """
-        Renders the list of movies for a specific user.
+        Renders one page of the movies of a specific user.
+
+        The page, its size and the sort order are taken from the `after`,
+        `before`, `size`, `sort` and `order` query parameters, the filters
+        from `year_from`, `year_to`, `min_rating` and `max_runtime`. Answers with
+        304 Not Modified if the user's library didn't change since the client
+        fetched the page, otherwise serves it from the page cache when
+        possible, unless it shows pending movies.
 
         Args:
             user_id: The ID of the user.
 
         Returns:
-            The rendered HTML page as a string.
+            A Flask response.
+
+        Raises:
+            InvalidPageRequest: If the sort order or a cursor is not valid.
         """
-        user = DM.user.get(user_id)
-        temp = render_template(
-            template_name_or_list='movies.html',
-            movies=DM.movie.get_all(user_id),
-            user=user
+        def render() -> tuple[RenderedPage, bool]:
+            user = DM.user.get(user_id)
+            args = page_args()
+            sort = request.args.get('sort', 'added')
+            order = request.args.get('order', 'asc')
+            filters = filter_args()
+            movies = DM.movie.page(
+                user_id, sort=sort, descending=order == 'desc', **args, **filters
+            )
+            page = render_template(
+                template_name_or_list='movies.html',
+                movies=movies,
+                user=user,
+                sort=sort,
+                order=order,
+                size=args['size'],
+                filters=filters
+            )
+            return page, all(movie.status != Movie.PENDING for movie in movies)
+
+        version, updated_at = DM.user.version(user_id)
+        validators = Validators(
+            'movies', user_id, version, request.query_string, last_modified=updated_at
         )
-        return temp
+        resp = cached_page(validators, render, 'movies', user_id)
+        return resp
+
+    @staticmethod
+    def export(user_id: int) -> Response:
+        """
+        Streams all movies of a user as a CSV or JSON Lines download.
+
+        The format is taken from the `format` query parameter, `csv` by
+        default, the columns from `fields`. The response is compressed with
+        gzip if the client accepts it.
+
+        Args:
+            user_id: The ID of the user.
+
+        Returns:
+            A streamed Flask response.
+
+        Raises:
+            UserNotFoundError: If no user is found with the given ID.
+            InvalidFields: If a field is not valid.
+            InvalidExportFormat: If the format is not valid.
+        """
+        DM.user.get(user_id)
+        fmt = request.args.get('format', 'csv')
+        fields = request.args.get('fields')
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+        chunks = encode(
+            DM.movie.export(user_id, fields, batch_size),
+            fmt,
+            list(select_fields(DM.movie.FIELDS, fields)),
+            batch_size
+        )
+        headers = {
+            'Content-Disposition': f'attachment; filename="movies-{user_id}.{fmt}"',
+            'Vary': 'Accept-Encoding',
+        }
+
+        if request.accept_encodings['gzip']:
+            chunks = gzipped(chunks)
+            headers['Content-Encoding'] = 'gzip'
+
+        resp = Response(
+            stream_with_context(chunks), mimetype=FORMATS[fmt], headers=headers
+        )
+        return resp
 
     @staticmethod
-    def details(user_id: int, movie_id: int) -> RenderedPage:
+    def details(user_id: int, movie_id: int) -> Response:
         """
         Renders the detail page for a specific movie.
 
+        The movie, its catalog entry and its owner, whose library version the
+        validators are made of, are loaded in one query. Answers with 304 Not
+        Modified if the user's library didn't change since the client fetched
+        the page, otherwise serves it from the page cache when possible,
+        unless the movie is still pending.
+
         Args:
             user_id: The ID of the user who owns the movie.
             movie_id: The ID of the movie.
 
         Returns:
-            The rendered HTML page as a string.
+            A Flask response.
+
+        Raises:
+            MovieNotFoundError: If the user has no movie with the given ID.
         """
-        user = DM.user.get(user_id)
-        movie = DM.movie.get(movie_id)
-        temp = render_template(
-            template_name_or_list='movie.html',
-            movie=movie,
-            user=user
+        movie = DM.movie.get_owned(user_id, movie_id)
+
+        def render() -> tuple[RenderedPage, bool]:
+            page = render_template(
+                template_name_or_list='movie.html',
+                movie=movie,
+                user=movie.user
+            )
+            return page, movie.status != Movie.PENDING
+
+        user = movie.user
+        validators = Validators('movie', user_id, movie_id, user.version, last_modified=user.updated_at)
+        resp = cached_page(validators, render, 'movie', user_id, movie_id)
+        return resp
+
+    @staticmethod
+    def search(user_id: int) -> Response:
+        """
+        Renders one page of the movies of a user that match a search.
+
+        The search terms are taken from the `q` query parameter, the page and
+        its size from `after`, `before` and `size`. Answers with 304 Not
+        Modified if the user's library didn't change since the client fetched
+        the results.
+
+        Args:
+            user_id: The ID of the user.
+
+        Returns:
+            A Flask response.
+
+        Raises:
+            InvalidPageRequest: If a cursor is not valid.
+        """
+        def render() -> RenderedPage:
+            query = request.args.get('q', '')
+            args = page_args()
+            page = render_template(
+                template_name_or_list='search.html',
+                movies=DM.movie.search(user_id, query, **args),
+                user=DM.user.get(user_id),
+                query=query,
+                size=args['size']
+            )
+            return page
+
+        version, updated_at = DM.user.version(user_id)
+        validators = Validators(
+            'search', user_id, version, request.query_string, last_modified=updated_at
         )
-        return temp
+        resp = conditional(validators, render)
+        return resp
 
     @staticmethod
     def add(user_id: int) -> RenderedPage:
@@ -270,24 +595,204 @@ class MovieGet:
         return temp
 
     @staticmethod
-    def update(movie_id: int) -> RenderedPage:
+    def update(user_id: int, movie_id: int) -> RenderedPage:
         """
         Renders the page for updating a movie's information.
 
         Args:
+            user_id: The ID of the user who owns the movie.
             movie_id: The ID of the movie to update.
 
         Returns:
             The rendered HTML page as a string.
+
+        Raises:
+            MovieNotFoundError: If the user has no movie with the given ID.
         """
         temp = render_template(
             template_name_or_list='update_movie.html',
-            movie=DM.movie.get(movie_id)
+            movie=DM.movie.get_owned(user_id, movie_id)
         )
         return temp
 
 
+def posters() -> PosterStore:
+    """
+    Returns the poster store of the current application.
+
+    Returns:
+        The PosterStore registered with the application.
+    """
+    return current_app.extensions['posters']
+
+
+class PosterGet:
+    """Handles GET requests for poster images."""
+
+    @staticmethod
+    def serve(digest: str, size: str) -> Response:
+        """
+        Serves a stored poster or thumbnail.
+
+        Stored posters never change, so they are served with immutable cache
+        headers. Range requests are supported.
+
+        Args:
+            digest: The SHA-256 of the original poster.
+            size: `original` or one of the thumbnail sizes.
+
+        Returns:
+            A Flask response with the image.
+        """
+        found = posters().open(digest, size)
+
+        if found is None:
+            abort(404)
+
+        path, mimetype = found
+        resp = send_file(
+            path, mimetype=mimetype, conditional=True, etag=f"{digest}-{size}", max_age=ONE_YEAR
+        )
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
+
+    @staticmethod
+    def lookup(catalog_id: int, size: str) -> Response:
+        """
+        Redirects to the stored poster of a catalog entry, or to the
+        poster's original URL while the poster workers download it.
+
+        Args:
+            catalog_id: The ID of the catalog entry.
+            size: `original` or one of the thumbnail sizes.
+
+        Returns:
+            A Flask redirect response.
+        """
+        entry = DM.catalog.get(catalog_id)
+
+        if entry is None or not entry.poster or (size != ORIGINAL and size not in SIZES):
+            abort(404)
+
+        digest = posters().lookup(entry)
+
+        if digest is None:
+            return redirect(entry.poster)
+
+        resp = redirect(url_for(
+            endpoint='poster', digest=digest, size=size
+        ))
+        return resp
+
+
+def json_errors(view: Callable[..., Response]) -> Callable[..., Response]:
+    """
+    Answers the errors of an API view as JSON instead of an HTML page.
+
+    Args:
+        view: The view function.
+
+    Returns:
+        The wrapped view function.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs) -> Response:
+        try:
+            return view(*args, **kwargs)
+        except (UserNotFoundError, MovieNotFoundError) as e:
+            status, error = 404, e
+        except (InvalidPageRequest, InvalidFields) as e:
+            status, error = 400, e
+
+        resp = Response(
+            dumps({'error': error.args[0]}), status=status, mimetype='application/json'
+        )
+        return resp
+
+    return wrapper
+
+
+class ApiGet:
+    """Handles GET requests of the read-only JSON API."""
+
+    @staticmethod
+    @json_errors
+    def users() -> Response:
+        """
+        Lists one page of users as JSON.
+
+        The fields are taken from the comma-separated `fields` query
+        parameter, the page and its size from `after`, `before` and `size`.
+        Answers with 304 Not Modified if no user changed since the client
+        fetched the page.
+
+        Returns:
+            A Flask response.
+        """
+        validators = Validators('api-users', request.query_string, *DM.user.versions())
+        resp = conditional(
+            validators,
+            lambda: stream_page(DM.user.rows(request.args.get('fields'), **page_args('API_MAX_PAGE_SIZE'))),
+            mimetype='application/json'
+        )
+        return resp
+
+    @staticmethod
+    @json_errors
+    def movies(user_id: int) -> Response:
+        """
+        Lists one page of the movies of a user as JSON.
+
+        Takes the `fields` query parameter, the pagination, sort and filter
+        parameters of the movie list page. Answers with 304 Not Modified if
+        the user's library didn't change since the client fetched the page.
+
+        Args:
+            user_id: The ID of the user.
+
+        Returns:
+            A Flask response.
+        """
+        version, updated_at = DM.user.version(user_id)
+        validators = Validators(
+            'api-movies', user_id, version, request.query_string, last_modified=updated_at
+        )
+
+        def render():
+            movies = DM.movie.rows(
+                user_id,
+                request.args.get('fields'),
+                sort=request.args.get('sort', 'added'),
+                descending=request.args.get('order', 'asc') == 'desc',
+                **page_args('API_MAX_PAGE_SIZE'),
+                **filter_args()
+            )
+            return stream_page(movies)
+
+        resp = conditional(validators, render, mimetype='application/json')
+        return resp
+
+    @staticmethod
+    @json_errors
+    def movie(movie_id: int) -> Response:
+        """
+        Returns the fields of a movie selected by `fields` as JSON.
+
+        Args:
+            movie_id: The ID of the movie.
+
+        Returns:
+            A Flask response.
+        """
+        movie = DM.movie.row(movie_id, request.args.get('fields'))
+        resp = Response(dumps(movie), mimetype='application/json')
+        return resp
+
+
 class Get:
     """Aggregates all GET request controller classes."""
     user = UserGet()
     movie = MovieGet()
+    poster = PosterGet()
+    api = ApiGet()
@@ -0,0 +1,119 @@
+"""
+This module encodes exported movie rows as CSV or JSON Lines.
+
+Rows are encoded one batch at a time and every batch is yielded as soon as it
+is ready, so an export of any size is sent with constant memory. The output
+can be compressed with gzip on the fly.
+"""
+import csv
+import io
+import zlib
+from typing import Iterable, Iterator
+
+from data_manager.fields import Row
+from .serialization import dumps
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+BATCH_SIZE = 1000
+
+
+class InvalidExportFormat(Exception):
+    """Raised when an export is requested in an unknown format."""
+    pass
+
+
+def _batches(rows: Iterable[Row], size: int) -> Iterator[list[Row]]:
+    """Groups rows into lists of at most `size` rows."""
+    batch = []
+
+    for row in rows:
+        batch.append(row)
+
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _csv(rows: Iterable[Row], fields: list[str] | None, batch_size: int) -> Iterator[bytes]:
+    """Encodes rows as CSV with a header line."""
+    buffer = io.StringIO()
+    writer = None
+
+    for batch in _batches(rows, batch_size):
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=fields or list(batch[0]), lineterminator='\n')
+            writer.writeheader()
+
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if writer is None and fields:
+        yield (','.join(fields) + '\n').encode()
+
+
+def _jsonl(rows: Iterable[Row], batch_size: int) -> Iterator[bytes]:
+    """Encodes rows as one JSON object per line."""
+    for batch in _batches(rows, batch_size):
+        yield b''.join(dumps(row) + b'\n' for row in batch)
+
+
+def encode(
+        rows: Iterable[Row],
+        fmt: str,
+        fields: list[str] | None = None,
+        batch_size: int = BATCH_SIZE
+) -> Iterator[bytes]:
+    """
+    Encodes rows in an export format.
+
+    Args:
+        rows: The rows to export.
+        fmt: One of `FORMATS`.
+        fields: The CSV columns, taken from the first row if not given.
+        batch_size: The number of rows encoded into one chunk.
+
+    Returns:
+        An iterator of encoded chunks.
+
+    Raises:
+        InvalidExportFormat: If the format is not one of `FORMATS`.
+    """
+    if fmt not in FORMATS:
+        raise InvalidExportFormat(
+            f"Unknown export format {fmt!r}, use one of {', '.join(FORMATS)}"
+        )
+
+    if fmt == 'csv':
+        return _csv(rows, fields, batch_size)
+
+    return _jsonl(rows, batch_size)
+
+
+def gzipped(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Compresses a stream of chunks into a gzip stream.
+
+    Args:
+        chunks: The uncompressed chunks.
+        level: The compression level from 1 to 9.
+
+    Yields:
+        Compressed chunks, skipping empty ones.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+
+        if data:
+            yield data
+
+    yield compressor.flush()
@@ -0,0 +1,181 @@
+"""
+This module implements per-request instrumentation.
+
+It hooks into Flask's request cycle, the SQLAlchemy engine, template rendering
+and the OMDB client, and records for every request the number of SQL queries,
+the time spent in the database, in OMDB lookups and in rendering templates,
+and the response size. The numbers are sent back in a `Server-Timing` header
+and written as one structured log line per request; requests that issue more
+queries than `QUERY_WARNING_THRESHOLD` are logged as warnings to catch N+1
+regressions.
+"""
+import json
+import logging
+import time
+
+from flask import (
+    Flask, Response, current_app, g, has_request_context, request,
+    before_render_template, template_rendered
+)
+from sqlalchemy import event
+
+from models import db
+from data_manager import omdb_request
+
+logger = logging.getLogger('moviewebapp.requests')
+
+
+class RequestStats:
+    """The measurements of a single request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.omdb_calls = 0
+        self.omdb_time = 0.0
+        self.render_time = 0.0
+        self.render_started: list[float] = []
+
+    @property
+    def duration(self) -> float:
+        """Seconds since the request started."""
+        return time.perf_counter() - self.started
+
+
+def current_stats() -> RequestStats | None:
+    """
+    Returns the measurements of the current request.
+
+    Returns:
+        The RequestStats, or None outside of an instrumented request.
+    """
+    if not has_request_context():
+        return None
+
+    return g.get('request_stats')
+
+
+class Instrumentation:
+    """Collects per-request timings and reports them in headers and logs."""
+
+    def __init__(self, app: Flask | None = None):
+        """
+        Initializes the instrumentation.
+
+        Args:
+            app: The Flask application to instrument.
+        """
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Hooks the instrumentation into an application and its database engine.
+
+        Reads `QUERY_WARNING_THRESHOLD` (default 20) and `SERVER_TIMING`
+        (default True) from the application config.
+
+        Args:
+            app: The Flask application.
+        """
+        app.config.setdefault('QUERY_WARNING_THRESHOLD', 20)
+        app.config.setdefault('SERVER_TIMING', True)
+        app.extensions['instrumentation'] = self
+
+        with app.app_context():
+            engine = db.engine
+
+        event.listen(engine, 'before_cursor_execute', self.__before_query)
+        event.listen(engine, 'after_cursor_execute', self.__after_query)
+        before_render_template.connect(self.__before_render, app, weak=False)
+        template_rendered.connect(self.__after_render, app, weak=False)
+        omdb_request.connect(self.__omdb_request, app, weak=False)
+        app.before_request(self.__start)
+        app.after_request(self.__finish)
+
+    @staticmethod
+    def __start() -> None:
+        """Starts measuring the current request."""
+        g.request_stats = RequestStats()
+
+    @staticmethod
+    def __finish(response: Response) -> Response:
+        """Reports the measurements of the current request."""
+        stats = current_stats()
+
+        if stats is None:
+            return response
+
+        duration = stats.duration
+        # Measuring a streamed response would read it into memory.
+        size = None if response.is_streamed else response.calculate_content_length()
+
+        if current_app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = ', '.join([
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+                f'omdb;dur={stats.omdb_time * 1000:.1f};desc="{stats.omdb_calls} lookups"',
+                f'render;dur={stats.render_time * 1000:.1f}',
+                f'total;dur={duration * 1000:.1f}',
+            ])
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': stats.queries,
+            'db_ms': round(stats.db_time * 1000, 2),
+            'omdb_calls': stats.omdb_calls,
+            'omdb_ms': round(stats.omdb_time * 1000, 2),
+            'render_ms': round(stats.render_time * 1000, 2),
+            'bytes': size,
+        }
+
+        if stats.queries > current_app.config['QUERY_WARNING_THRESHOLD']:
+            logger.warning(json.dumps({**record, 'warning': 'too many queries'}))
+        else:
+            logger.info(json.dumps(record))
+
+        return response
+
+    @staticmethod
+    def __before_query(conn, cursor, statement, parameters, context, executemany) -> None:
+        """Remembers when a query started."""
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @staticmethod
+    def __after_query(conn, cursor, statement, parameters, context, executemany) -> None:
+        """Counts a finished query towards the current request."""
+        started = conn.info['query_started'].pop()
+        stats = current_stats()
+
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += time.perf_counter() - started
+
+    @staticmethod
+    def __before_render(app: Flask, template, context) -> None:
+        """Remembers when rendering a template started."""
+        stats = current_stats()
+
+        if stats is not None:
+            stats.render_started.append(time.perf_counter())
+
+    @staticmethod
+    def __after_render(app: Flask, template, context) -> None:
+        """Counts a rendered template towards the current request."""
+        stats = current_stats()
+
+        if stats is not None and stats.render_started:
+            stats.render_time += time.perf_counter() - stats.render_started.pop()
+
+    @staticmethod
+    def __omdb_request(sender, duration: float, outcome: str) -> None:
+        """Counts an OMDB lookup towards the current request."""
+        stats = current_stats()
+
+        if stats is not None:
+            stats.omdb_calls += 1
+            stats.omdb_time += duration
@@ -0,0 +1,415 @@
+"""
+This module collects operational metrics and exposes them in the Prometheus
+text exposition format.
+
+Request latency is recorded per endpoint and status codes are counted, and so
+are OMDB lookups, their latency and the daily quota they use, the time requests
+wait for a database connection and the number of requests in flight. Every
+thread updates its own shard of a metric without taking a lock; the shards are
+only summed up when `/metrics` is scraped, so recording stays cheap on the hot
+path.
+"""
+import threading
+import time
+from typing import Callable, Iterable
+
+from flask import Flask, Response, current_app, g, has_app_context, request
+from sqlalchemy.pool import QueuePool
+
+from data_manager import omdb_request
+from data_manager.omdb import current_omdb
+
+Labels = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names: Labels, values: Labels, **extra: str) -> str:
+    """Formats label names and values as `{name="value",...}`."""
+    pairs = list(zip(names, values)) + list(extra.items())
+
+    if not pairs:
+        return ''
+
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value: float) -> str:
+    """Formats a sample value, dropping the fraction of whole numbers."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """A named metric whose values are sharded per thread."""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Labels = ()):
+        """
+        Initializes the metric.
+
+        Args:
+            name: The metric name.
+            documentation: The help text.
+            labels: The names of the labels.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.__local = threading.local()
+        self.__shards: list[dict] = []
+        self.__lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        """Returns the shard of the calling thread, creating it on first use."""
+        shard = getattr(self.__local, 'shard', None)
+
+        if shard is None:
+            shard = self.__local.shard = {}
+            with self.__lock:
+                self.__shards.append(shard)
+
+        return shard
+
+    def _shards(self) -> list[dict]:
+        """Returns a snapshot of every thread's shard."""
+        with self.__lock:
+            return [dict(shard) for shard in self.__shards]
+
+    def samples(self) -> Iterable[str]:
+        """Yields the sample lines of the metric."""
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        """
+        Formats the metric in the text exposition format.
+
+        Returns:
+            The HELP and TYPE lines followed by the samples.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    type = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """
+        Increments the counter.
+
+        Args:
+            *labels: The label values.
+            amount: The amount to add.
+        """
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> dict[Labels, float]:
+        """
+        Sums up the shards.
+
+        Returns:
+            The value for every combination of label values.
+        """
+        totals: dict[Labels, float] = {}
+
+        for shard in self._shards():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+
+        return totals
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self.values().items()):
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """A value that goes up and down, such as the number of requests in flight."""
+
+    type = 'gauge'
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        """
+        Decrements the gauge.
+
+        Args:
+            *labels: The label values.
+            amount: The amount to subtract.
+        """
+        self.inc(*labels, amount=-amount)
+
+
+class CallbackGauge(Metric):
+    """A gauge whose values are read from a function when scraped."""
+
+    type = 'gauge'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            function: Callable[[], dict[Labels, float]],
+            labels: Labels = (),
+            type: str = 'gauge'
+    ):
+        """
+        Initializes the gauge.
+
+        Args:
+            name: The metric name.
+            documentation: The help text.
+            function: Returns the value for every combination of label values.
+            labels: The names of the labels.
+            type: The metric type to report, e.g. 'counter' for totals kept elsewhere.
+        """
+        super().__init__(name, documentation, labels)
+        self.function = function
+        self.type = type
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self.function().items()):
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    """Counts observations in cumulative buckets, for latency percentiles."""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Labels = (), buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Initializes the histogram.
+
+        Args:
+            name: The metric name.
+            documentation: The help text.
+            labels: The names of the labels.
+            buckets: The upper bounds of the buckets in ascending order.
+        """
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Records an observation.
+
+        Args:
+            value: The observed value, usually seconds.
+            *labels: The label values.
+        """
+        shard = self._shard()
+        counts = shard.get(labels)
+
+        if counts is None:
+            # One slot per bucket, then +Inf, then the sum.
+            counts = shard[labels] = [0] * (len(self.buckets) + 2)
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[len(self.buckets)] += 1
+
+        counts[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        totals: dict[Labels, list[float]] = {}
+
+        for shard in self._shards():
+            for labels, counts in shard.items():
+                total = totals.setdefault(labels, [0] * len(counts))
+                for index, count in enumerate(list(counts)):
+                    total[index] += count
+
+        for labels, counts in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_value(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labels, labels, le=le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}"
+
+
+class Registry:
+    """A collection of metrics exposed together."""
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Adds a metric to the registry.
+
+        Args:
+            metric: The metric.
+
+        Returns:
+            The metric, so registration can be chained with its creation.
+
+        Raises:
+            ValueError: If a metric with the same name is registered already.
+        """
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+
+        self.metrics[metric.name] = metric
+        return metric
+
+    def expose(self) -> str:
+        """
+        Formats every metric in the text exposition format.
+
+        Returns:
+            The metrics page.
+        """
+        return '\n'.join(metric.expose() for metric in self.metrics.values()) + '\n'
+
+
+class TimedQueuePool(QueuePool):
+    """
+    A QueuePool that records how long checkouts wait for a connection in the
+    metrics of the current application.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+
+        try:
+            return super()._do_get()
+        finally:
+            metrics = current_app.extensions.get('metrics') if has_app_context() else None
+
+            if metrics is not None:
+                metrics.pool_wait.observe(time.perf_counter() - start)
+
+
+class Metrics:
+    """Records request and OMDB metrics for an application."""
+
+    def __init__(self, app: Flask | None = None, registry: Registry | None = None):
+        """
+        Initializes the metrics.
+
+        Args:
+            app: The Flask application to record metrics for.
+            registry: The registry the metrics are exposed from, a new one by
+                default, so that every application counts on its own.
+        """
+        self.registry = registry if registry is not None else Registry()
+        self.request_latency = self.registry.register(Histogram(
+            'http_request_duration_seconds', 'Time spent handling requests.', ('endpoint', 'method')
+        ))
+        self.requests = self.registry.register(Counter(
+            'http_requests_total', 'Requests handled by endpoint and status code.', ('endpoint', 'method', 'status')
+        ))
+        self.in_flight = self.registry.register(Gauge(
+            'http_requests_in_flight', 'Requests currently being handled.'
+        ))
+        self.omdb_latency = self.registry.register(Histogram(
+            'omdb_request_duration_seconds', 'Time spent in OMDB lookups including retries.', ('outcome',)
+        ))
+        self.omdb_errors = self.registry.register(Counter(
+            'omdb_request_errors_total', 'OMDB lookups that failed after all retries.'
+        ))
+        self.pool_wait = self.registry.register(Histogram(
+            'db_pool_checkout_wait_seconds', 'Time spent waiting for a database connection.',
+            buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+        ))
+        self.registry.register(CallbackGauge(
+            'omdb_cache_lookups_total', 'OMDB cache lookups by result.',
+            lambda: {
+                ('memory_hit',): current_omdb().cache.stats.memory_hits,
+                ('disk_hit',): current_omdb().cache.stats.disk_hits,
+                ('miss',): current_omdb().cache.stats.misses,
+            },
+            labels=('result',), type='counter'
+        ))
+        self.registry.register(CallbackGauge(
+            'omdb_quota_used', 'OMDB requests sent today by all processes.',
+            lambda: {(): current_omdb().limiter.used()}
+        ))
+        self.registry.register(CallbackGauge(
+            'omdb_quota_limit', 'OMDB requests allowed per day, 0 for no limit.',
+            lambda: {(): current_omdb().limiter.daily_quota}
+        ))
+        self.registry.register(CallbackGauge(
+            'omdb_rate_limited_total', 'OMDB lookups rejected by the rate limiter.',
+            lambda: {(): current_omdb().limiter.rejected},
+            type='counter'
+        ))
+        self.registry.register(CallbackGauge(
+            'omdb_coalesced_lookups_total', 'OMDB lookups that shared the request of a concurrent lookup.',
+            lambda: {(): current_omdb().flights.coalesced},
+            type='counter'
+        ))
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Hooks the metrics into an application.
+
+        Register `TimedQueuePool` as the `poolclass` engine option to record
+        the connection checkout wait.
+
+        Args:
+            app: The Flask application.
+        """
+        app.extensions['metrics'] = self
+        omdb_request.connect(self.__omdb_request, app, weak=False)
+        app.before_request(self.__start)
+        app.after_request(self.__finish)
+        app.teardown_request(self.__teardown)
+
+    def expose(self) -> Response:
+        """
+        Renders the metrics page.
+
+        Returns:
+            The metrics in the text exposition format.
+        """
+        return Response(self.registry.expose(), mimetype='text/plain; version=0.0.4')
+
+    def __start(self) -> None:
+        """Starts timing the current request."""
+        g.metrics_started = time.perf_counter()
+        self.in_flight.inc()
+
+    def __finish(self, response: Response) -> Response:
+        """Records the latency and status code of the current request."""
+        started = g.pop('metrics_started', None)
+
+        if started is not None:
+            endpoint = request.endpoint or 'none'
+            self.request_latency.observe(time.perf_counter() - started, endpoint, request.method)
+            self.requests.inc(endpoint, request.method, str(response.status_code))
+            self.in_flight.dec()
+
+        return response
+
+    def __teardown(self, error: BaseException | None) -> None:
+        """Takes a request that failed without a response out of flight."""
+        if g.pop('metrics_started', None) is not None:
+            self.in_flight.dec()
+
+    def __omdb_request(self, sender: Flask, duration: float, outcome: str) -> None:
+        """Records an OMDB lookup."""
+        self.omdb_latency.observe(duration, outcome)
+
+        if outcome != 'ok':
+            self.omdb_errors.inc()
@@ -0,0 +1,257 @@
+"""
+This module implements a cache for rendered pages.
+
+Pages are cached under keys built from the route, its IDs and the version
+of the data they show, and the write paths invalidate exactly the keys they
+affect by prefix. A change made by another worker process bumps the version,
+so the pages cached before it are no longer found even where the prefix
+invalidation of that process didn't reach. The storage is
+pluggable: `MemoryBackend` keeps pages in the process, `SQLiteBackend` in a
+local file shared by all worker processes. Both evict by TTL and LRU.
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Protocol
+from urllib.parse import urlencode
+
+from flask import Flask, current_app, request
+
+RenderedPage = str
+
+
+class PageCacheBackend(Protocol):
+    """The interface page cache backends implement."""
+
+    def get(self, key: str) -> RenderedPage | None: ...
+
+    def set(self, key: str, page: RenderedPage, ttl: float) -> None: ...
+
+    def delete_prefix(self, prefix: str) -> None: ...
+
+
+class MemoryBackend:
+    """Keeps pages in an in-process LRU dictionary."""
+
+    def __init__(self, size: int = 1024):
+        """
+        Initializes the backend.
+
+        Args:
+            size: The maximum number of cached pages.
+        """
+        self.size = size
+        self.__pages: OrderedDict[str, tuple[float, RenderedPage]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: str) -> RenderedPage | None:
+        """Returns a cached page, or None if it is missing or expired."""
+        with self.__lock:
+            entry = self.__pages.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] <= time.monotonic():
+                del self.__pages[key]
+                return None
+
+            self.__pages.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, page: RenderedPage, ttl: float) -> None:
+        """Caches a page for `ttl` seconds, evicting the oldest if full."""
+        with self.__lock:
+            self.__pages[key] = (time.monotonic() + ttl, page)
+            self.__pages.move_to_end(key)
+
+            while len(self.__pages) > self.size:
+                self.__pages.popitem(last=False)
+
+    def delete_prefix(self, prefix: str) -> None:
+        """Removes every page whose key starts with `prefix`."""
+        with self.__lock:
+            for key in [key for key in self.__pages if key.startswith(prefix)]:
+                del self.__pages[key]
+
+
+class SQLiteBackend:
+    """Keeps pages in a SQLite file shared by all worker processes."""
+
+    def __init__(self, path: str, size: int = 10_000):
+        """
+        Initializes the backend and creates its table if needed.
+
+        Args:
+            path: The path of the SQLite file.
+            size: The maximum number of cached pages.
+        """
+        self.size = size
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.__conn.execute("PRAGMA journal_mode = WAL")
+        self.__conn.execute("PRAGMA synchronous = NORMAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "key TEXT PRIMARY KEY, page TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.__conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_pages_accessed_at ON pages (accessed_at)"
+        )
+        self.__conn.commit()
+
+    def get(self, key: str) -> RenderedPage | None:
+        """Returns a cached page, or None if it is missing or expired."""
+        now = time.time()
+
+        with self.__lock:
+            row = self.__conn.execute(
+                "SELECT page FROM pages WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            self.__conn.execute(
+                "UPDATE pages SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.__conn.commit()
+            return row[0]
+
+    def set(self, key: str, page: RenderedPage, ttl: float) -> None:
+        """Caches a page for `ttl` seconds, evicting the oldest if full."""
+        now = time.time()
+
+        with self.__lock:
+            self.__conn.execute(
+                "INSERT OR REPLACE INTO pages (key, page, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, page, now + ttl, now)
+            )
+            self.__conn.execute("DELETE FROM pages WHERE expires_at <= ?", (now,))
+            self.__conn.execute(
+                "DELETE FROM pages WHERE key IN ("
+                "SELECT key FROM pages ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.size,)
+            )
+            self.__conn.commit()
+
+    def delete_prefix(self, prefix: str) -> None:
+        """Removes every page whose key starts with `prefix`."""
+        with self.__lock:
+            self.__conn.execute(
+                "DELETE FROM pages WHERE key >= ? AND key < ?",
+                (prefix, prefix + '\uffff')
+            )
+            self.__conn.commit()
+
+
+class PageCache:
+    """Caches rendered pages by key and invalidates them by key prefix."""
+
+    def __init__(self, app: Flask | None = None, backend: PageCacheBackend | None = None, ttl: float = 300):
+        """
+        Initializes the cache.
+
+        Args:
+            app: The Flask application to register the cache with.
+            backend: Where pages are stored, None disables caching.
+            ttl: Seconds a page stays cached at most.
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.__generation = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Registers the cache as the `page_cache` extension of an application.
+
+        Args:
+            app: The Flask application.
+        """
+        app.extensions['page_cache'] = self
+
+    def get_or_render(self, key: str, render: Callable[[], tuple[RenderedPage, bool]]) -> RenderedPage:
+        """
+        Returns a cached page or renders and caches it.
+
+        A page rendered while its key was being invalidated is not cached, so
+        a slow render can't put stale data back into the cache.
+
+        Args:
+            key: The cache key, see `key`.
+            render: Renders the page and says whether it may be cached.
+
+        Returns:
+            The rendered page.
+        """
+        if self.backend is None:
+            return render()[0]
+
+        page = self.backend.get(key)
+
+        if page is not None:
+            return page
+
+        generation = self.__generation
+        page, cacheable = render()
+
+        if cacheable and generation == self.__generation:
+            self.backend.set(key, page, self.ttl)
+
+        return page
+
+    def invalidate(self, *prefixes: str) -> None:
+        """
+        Removes every cached page whose key starts with one of the prefixes.
+
+        Args:
+            *prefixes: Key prefixes, see `key`.
+        """
+        if self.backend is None:
+            return
+
+        self.__generation += 1
+
+        for prefix in prefixes:
+            self.backend.delete_prefix(prefix)
+
+    @staticmethod
+    def key(*parts: object, query: bool = True) -> str:
+        """
+        Builds a cache key from a route name, IDs and versions.
+
+        Every part is followed by a colon, so that the key of user 1 is not a
+        prefix of the key of user 12. With `query` set, the normalized query
+        string of the current request is appended.
+
+        Args:
+            *parts: The route name followed by its IDs and, for a page, the
+                versions of the data it shows; the route name and IDs alone
+                give the prefix to invalidate.
+            query: Whether the page depends on the query string.
+
+        Returns:
+            The cache key, or a prefix of it if `query` is False.
+        """
+        key = ''.join(f"{part}:" for part in parts)
+
+        if query:
+            key += '?' + urlencode(sorted(request.args.items(multi=True)))
+
+        return key
+
+
+def page_cache() -> PageCache:
+    """
+    Returns the page cache of the current application.
+
+    Returns:
+        The PageCache registered with the application.
+    """
+    return current_app.extensions['page_cache']
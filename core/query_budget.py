@@ -0,0 +1,77 @@
+"""
+This module checks how many SQL statements the pages of the app issue.
+
+Every page in `QUERY_BUDGETS` has a fixed number of statements it may issue
+when rendered from scratch. The detail pages load what they show together
+with the user whose library version their validators are made of, so a 304
+Not Modified, a page served from the page cache and a fresh render each cost
+a single query. The lists first load the user for their validators and then
+the page of movies in one more. The form pages load what they show in one
+query. `over_budget` requests every page for a sample movie with the page
+cache cleared and reports the pages that issue more statements, which catches
+N+1 queries and duplicate lookups before they ship.
+"""
+from flask import Flask, url_for
+from sqlalchemy import event
+
+from models import db
+from .page_cache import page_cache
+
+# The maximum number of SQL statements of every page, by endpoint.
+QUERY_BUDGETS = {
+    'user_details': 1,
+    'user_update': 1,
+    'movie_list': 2,
+    'movie_search': 2,
+    'movie_details': 1,
+    'movie_update': 1,
+    'movie_add': 1,
+}
+
+
+def over_budget(app: Flask, user_id: int, movie_id: int) -> dict[str, tuple[int, int]]:
+    """
+    Renders every page in `QUERY_BUDGETS` and counts its SQL statements.
+
+    Args:
+        app: The Flask application.
+        user_id: The ID of the user whose pages to render.
+        movie_id: The ID of a movie of that user.
+
+    Returns:
+        A dictionary of endpoints to the number of statements they issued and
+        their budget, empty if every page kept to its budget.
+    """
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    failures = {}
+
+    with app.app_context():
+        engine = db.engine
+
+    with app.test_request_context():
+        urls = {
+            endpoint: url_for(endpoint, user_id=user_id, movie_id=movie_id, q='a')
+            for endpoint in QUERY_BUDGETS
+        }
+
+    event.listen(engine, 'before_cursor_execute', listener)
+
+    try:
+        with app.test_client() as client:
+            for endpoint, url in urls.items():
+                with app.app_context():
+                    page_cache().invalidate('')
+
+                statements.clear()
+                response = client.get(url)
+
+                if response.status_code != 200:
+                    raise RuntimeError(f"{url} answered with {response.status_code}")
+
+                if len(statements) > QUERY_BUDGETS[endpoint]:
+                    failures[endpoint] = (len(statements), QUERY_BUDGETS[endpoint])
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+    return failures
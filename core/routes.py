@@ -0,0 +1,566 @@
+"""
+This module defines the routes of the web application.
+
+The views and error handlers are collected when this module is imported and
+registered with an application by `register_routes`, which `create_app` calls
+for every application it creates. They keep their plain endpoint names, such
+as `movie_list`, which templates, logs and metrics refer to.
+"""
+from typing import Callable
+from flask import Flask, Response, current_app, render_template, request
+
+from data_manager import (
+    EnrichmentQueueFull, InvalidImportFile, InvalidPageRequest, InvalidFields, UserNotFoundError, MovieNotFoundError
+)
+from .controllers import Post, Get, RenderedPage
+from .export import InvalidExportFormat
+
+POST = Post()
+GET = Get()
+
+ResponseCode = int
+View = Callable[..., Response]
+
+_routes: list[tuple[str, View, dict]] = []
+_error_handlers: list[tuple[type[Exception] | int, View]] = []
+
+
+def route(rule: str, **options) -> Callable[[View], View]:
+    """
+    Collects a view to be registered under a URL rule, like `Flask.route`.
+
+    Args:
+        rule: The URL rule.
+        **options: The options of `Flask.add_url_rule`, such as `methods`.
+
+    Returns:
+        A decorator that returns the view unchanged.
+    """
+    def decorator(view: View) -> View:
+        _routes.append((rule, view, options))
+        return view
+
+    return decorator
+
+
+def errorhandler(code_or_exception: type[Exception] | int) -> Callable[[View], View]:
+    """
+    Collects an error handler, like `Flask.errorhandler`.
+
+    Args:
+        code_or_exception: The HTTP status code or the exception class to handle.
+
+    Returns:
+        A decorator that returns the handler unchanged.
+    """
+    def decorator(handler: View) -> View:
+        _error_handlers.append((code_or_exception, handler))
+        return handler
+
+    return decorator
+
+
+def register_routes(app: Flask) -> None:
+    """
+    Registers all views and error handlers with an application.
+
+    Args:
+        app: The Flask application.
+    """
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+
+    for code_or_exception, handler in _error_handlers:
+        app.register_error_handler(code_or_exception, handler)
+
+
+@route(
+    rule='/', methods=['GET']
+)
+def home() -> Response:
+    """
+    Renders the home page with a page of users.
+
+    Returns:
+        A response object, 304 Not Modified if the client's copy is current.
+    """
+    return GET.user.list()
+
+
+@route(
+    rule='/users/add_user', methods=['GET', 'POST']
+)
+def user_add() -> (
+        tuple[RenderedPage, ResponseCode] | Response
+):
+    """
+    Handles user creation.
+
+    GET: Renders the form to add a new user.
+    POST: Adds a new user to the database.
+
+    Returns:
+        A tuple containing the rendered template and the HTTP status code or a response object.
+    """
+    if request.method == 'POST':
+        return POST.user.add()
+
+    return GET.user.add(), 200
+
+
+@route(
+    rule='/users/<int:user_id>', methods=['GET']
+)
+def user_details(user_id: int) -> (
+        Response
+):
+    """
+    Renders the details of a specific user.
+
+    Args:
+        user_id: The ID of the user to display.
+
+    Returns:
+        A response object, 304 Not Modified if the client's copy is current.
+    """
+    return GET.user.details(user_id)
+
+
+@route(
+    rule='/users/<int:user_id>/delete', methods=['GET']
+)
+def user_delete(user_id: int) -> (
+        Response
+):
+    """
+    Deletes a specific user.
+
+    Args:
+        user_id: The ID of the user to delete.
+
+    Returns:
+        A response object.
+    """
+    return GET.user.delete(user_id)
+
+
+@route(
+    rule='/users/<int:user_id>/update', methods=['GET', 'POST']
+)
+def user_update(user_id: int) -> (
+        tuple[RenderedPage, ResponseCode] | Response
+):
+    """
+    Handles user updates.
+
+    GET: Renders the form to update a user.
+    POST: Updates the user's information in the database.
+
+    Args:
+        user_id: The ID of the user to update.
+
+    Returns:
+        A tuple containing the rendered template or a response object, and the HTTP status code.
+    """
+    if request.method == 'POST':
+        return POST.user.update(user_id)
+
+    return GET.user.update(user_id), 200
+
+
+@route(
+    rule='/users/<int:user_id>/movies', methods=['GET']
+)
+def movie_list(user_id: int) -> (
+        Response
+):
+    """
+    Renders a page of the movies of a specific user.
+
+    Args:
+        user_id: The ID of the user.
+
+    Returns:
+        A response object, 304 Not Modified if the client's copy is current.
+    """
+    return GET.movie.list(user_id)
+
+
+@route(
+    rule='/users/<int:user_id>/movies/search', methods=['GET']
+)
+def movie_search(user_id: int) -> (
+        Response
+):
+    """
+    Renders a page of the movies of a specific user that match the search terms in `q`.
+
+    Args:
+        user_id: The ID of the user.
+
+    Returns:
+        A response object, 304 Not Modified if the client's copy is current.
+    """
+    return GET.movie.search(user_id)
+
+
+@route(
+    rule='/users/<int:user_id>/movies/<int:movie_id>', methods=['GET']
+)
+def movie_details(user_id: int, movie_id: int) -> (
+        Response
+):
+    """
+    Renders the details of a specific movie for a specific user.
+
+    Args:
+        user_id: The ID of the user.
+        movie_id: The ID of the movie.
+
+    Returns:
+        A response object, 304 Not Modified if the client's copy is current.
+    """
+    return GET.movie.details(user_id, movie_id)
+
+
+@route(
+    rule='/users/<int:user_id>/movies/add_movie', methods=['GET', 'POST']
+)
+def movie_add(user_id: int) -> (
+        tuple[RenderedPage, ResponseCode] | Response
+):
+    """
+    Handles adding a new movie for a specific user.
+
+    GET: Renders the form to add a new movie.
+    POST: Adds a new movie to the user's collection.
+
+    Args:
+        user_id: The ID of the user.
+
+    Returns:
+        A tuple containing the rendered template or a response object, and the HTTP status code.
+    """
+    if request.method == 'POST':
+        return POST.movie.add(user_id)
+
+    return GET.movie.add(user_id), 200
+
+
+@route(
+    rule='/users/<int:user_id>/movies/import', methods=['POST']
+)
+def movie_import(user_id: int) -> (
+        Response
+):
+    """
+    Imports a CSV or JSON list of titles or IMDb IDs for a specific user.
+
+    Args:
+        user_id: The ID of the user.
+
+    Returns:
+        A streamed response reporting the progress as newline-delimited JSON.
+    """
+    return POST.movie.bulk_import(user_id)
+
+
+@route(
+    rule='/users/<int:user_id>/movies/export', methods=['GET']
+)
+def movie_export(user_id: int) -> (
+        Response
+):
+    """
+    Exports all movies of a specific user as CSV or JSON Lines.
+
+    Args:
+        user_id: The ID of the user.
+
+    Returns:
+        A streamed response with the movies, gzip-compressed if the client accepts it.
+    """
+    return GET.movie.export(user_id)
+
+
+@route(
+    rule='/users/<int:user_id>/movies/<int:movie_id>/delete', methods=['POST']
+)
+def movie_delete(user_id: int, movie_id: int) -> (
+        Response
+):
+    """
+    Deletes a specific movie for a specific user.
+
+    Args:
+        user_id: The ID of the user.
+        movie_id: The ID of the movie to delete.
+
+    Returns:
+        A response object.
+    """
+    return POST.movie.delete(user_id, movie_id)
+
+
+@route(
+    rule='/users/<int:user_id>/movies/<int:movie_id>/update',
+    methods=['GET', 'POST']
+)
+def movie_update(user_id: int, movie_id: int) -> (
+        tuple[RenderedPage, ResponseCode] | Response
+):
+    """
+    Handles updating a movie for a specific user.
+
+    GET: Renders the form to update a movie.
+    POST: Updates the movie's information in the database.
+
+    Args:
+        user_id: The ID of the user.
+        movie_id: The ID of the movie to update.
+
+    Returns:
+        A tuple containing the rendered template or a response object, and the HTTP status code.
+    """
+    if request.method == 'POST':
+        return POST.movie.update(user_id, movie_id)
+
+    return GET.movie.update(user_id, movie_id), 200
+
+
+@route(
+    rule='/posters/<string(length=64):digest>/<size>', methods=['GET']
+)
+def poster(digest: str, size: str) -> (
+        Response
+):
+    """
+    Serves a stored poster in one of the thumbnail sizes or as the original.
+
+    Args:
+        digest: The SHA-256 of the original poster.
+        size: The size of the image.
+
+    Returns:
+        A response object with the image, cacheable forever.
+    """
+    return GET.poster.serve(digest, size)
+
+
+@route(
+    rule='/posters/catalog/<int:catalog_id>/<size>', methods=['GET']
+)
+def poster_lookup(catalog_id: int, size: str) -> (
+        Response
+):
+    """
+    Redirects to the stored poster of a catalog entry, storing it in the background if needed.
+
+    Args:
+        catalog_id: The ID of the catalog entry.
+        size: The size of the image.
+
+    Returns:
+        A response object redirecting to the image.
+    """
+    return GET.poster.lookup(catalog_id, size)
+
+
+@route(
+    rule='/api/v1/users', methods=['GET']
+)
+def api_users() -> Response:
+    """
+    Lists a page of users as JSON.
+
+    Returns:
+        A response object, 304 Not Modified if the client's copy is current.
+    """
+    return GET.api.users()
+
+
+@route(
+    rule='/api/v1/users/<int:user_id>/movies', methods=['GET']
+)
+def api_movies(user_id: int) -> (
+        Response
+):
+    """
+    Lists a page of the movies of a specific user as JSON.
+
+    Args:
+        user_id: The ID of the user.
+
+    Returns:
+        A response object, 304 Not Modified if the client's copy is current.
+    """
+    return GET.api.movies(user_id)
+
+
+@route(
+    rule='/api/v1/movies/<int:movie_id>', methods=['GET']
+)
+def api_movie(movie_id: int) -> (
+        Response
+):
+    """
+    Returns a specific movie as JSON.
+
+    Args:
+        movie_id: The ID of the movie.
+
+    Returns:
+        A response object.
+    """
+    return GET.api.movie(movie_id)
+
+
+@route(
+    rule='/metrics', methods=['GET']
+)
+def metrics_page() -> Response:
+    """
+    Exposes the operational metrics in the Prometheus text format.
+
+    Returns:
+        Response: The metrics page.
+    """
+    return current_app.extensions['metrics'].expose()
+
+
+@errorhandler(404)
+def page_not_found(e) -> (
+        tuple[RenderedPage, ResponseCode]
+):
+    """
+    Renders the 404 error page.
+
+    Args:
+        e: The error object.
+
+    Returns:
+        A tuple containing the rendered error template and the 404 status code.
+    """
+    temp = render_template(
+        template_name_or_list='error.html',
+        error_description=e.description
+    )
+    return temp, 404
+
+
+@errorhandler(400)
+def bad_request(e) -> (
+        tuple[RenderedPage, ResponseCode]
+):
+    """
+    Renders the 400 error page.
+
+    Args:
+        e: The error object.
+
+    Returns:
+        A tuple containing the rendered error template and the 400 status code.
+    """
+    temp = render_template(
+        template_name_or_list='error.html',
+        error_description=e.description
+    )
+    return temp, 400
+
+
+@errorhandler(500)
+def internal_server_error(e) -> (
+        tuple[RenderedPage, ResponseCode]
+):
+    """
+    Renders the 500 error page.
+
+    Args:
+        e: The error object.
+
+    Returns:
+        A tuple containing the rendered error template and the 500 status code.
+    """
+    temp = render_template(
+        template_name_or_list='error.html',
+        error_description=e.description
+    )
+    return temp, 500
+
+
+@errorhandler(UserNotFoundError)
+@errorhandler(MovieNotFoundError)
+def not_found(e) -> (
+        tuple[RenderedPage, ResponseCode]
+):
+    """
+    Renders the 404 error page for a user or movie that doesn't exist, or a
+    movie that belongs to another user.
+
+    Args:
+        e: The error object.
+
+    Returns:
+        A tuple containing the rendered error template and the 404 status code.
+    """
+    temp = render_template(
+        template_name_or_list='error.html',
+        error_description=e.args[0]
+    )
+    return temp, 404
+
+
+@errorhandler(InvalidImportFile)
+@errorhandler(InvalidPageRequest)
+@errorhandler(InvalidFields)
+@errorhandler(InvalidExportFormat)
+def invalid_request_data(e) -> (
+        tuple[RenderedPage, ResponseCode]
+):
+    """
+    Renders the 400 error page for an import file, page request or export
+    that is not valid.
+
+    Args:
+        e: The error object.
+
+    Returns:
+        A tuple containing the rendered error template and the 400 status code.
+    """
+    temp = render_template(
+        template_name_or_list='error.html',
+        error_description=e.args[0]
+    )
+    return temp, 400
+
+
+@errorhandler(EnrichmentQueueFull)
+def enrichment_queue_full(e) -> (
+        tuple[RenderedPage, ResponseCode, dict]
+):
+    """
+    Renders the 503 error page when too many movies are being added at once.
+
+    Args:
+        e: The error object.
+
+    Returns:
+        A tuple containing the rendered error template, the 503 status code
+        and a Retry-After header.
+    """
+    temp = render_template(
+        template_name_or_list='error.html',
+        error_description=e.args[0]
+    )
+    return temp, 503, {'Retry-After': '5'}
+
+
+@errorhandler(Exception)
+def unhandled_exception(e) -> (
+        tuple[RenderedPage, ResponseCode]
+):
+    temp = render_template(
+        template_name_or_list='error.html',
+        error_description=e.args[0]
+    )
+    return temp, 500
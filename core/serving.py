@@ -0,0 +1,154 @@
+"""
+This module serves the web application in production.
+
+`serve` runs the application under gunicorn with a pre-forked pool of worker
+processes, each of which creates its own application after the fork, so that
+no database connection or background thread is shared between processes.
+The number of processes and of threads per process follows from the number
+of CPUs and from what the workload waits on, see `worker_model`. Workers are
+recycled after a number of requests and shut down gracefully: on SIGTERM they
+finish the requests in flight and the movies waiting for their OMDB details.
+The database schema is upgraded once before the workers start, which then
+skip the upgrade, so that they don't contend for the database while booting
+together, and with several workers the page cache is kept in SQLite, shared
+by all of them, unless configured otherwise.
+
+Without gunicorn, e.g. on Windows, the application is served by a single
+threaded Werkzeug server.
+"""
+import functools
+import os
+from typing import Callable
+
+import click
+from flask import Flask
+
+AppFactory = Callable[[], Flask]
+Upgrade = Callable[[dict], None]
+
+WORKLOADS = ('io', 'cpu', 'mixed')
+
+
+def worker_model(workload: str, cpus: int | None = None, db_connections: int = 20) -> tuple[int, int]:
+    """
+    Picks the number of worker processes and of threads per process.
+
+    Rendering pages holds the GIL, so CPU-bound work only scales with
+    processes, one per CPU plus one to cover the time a process waits for
+    SQLite. OMDB lookups mostly wait for the network, so I/O-bound work scales
+    with threads, which are cheaper than processes; one thread per database
+    connection at most, as a request keeps its connection while it waits.
+
+    Args:
+        workload: 'cpu' for rendering, 'io' for OMDB lookups or 'mixed'.
+        cpus: The number of CPUs, those of this machine by default.
+        db_connections: The database connections a process may open.
+
+    Returns:
+        The number of processes and the number of threads per process.
+    """
+    cpus = cpus or os.cpu_count() or 1
+
+    if workload == 'cpu':
+        return cpus + 1, 1
+
+    if workload == 'io':
+        return max(2, cpus), min(16, db_connections)
+
+    return cpus + 1, min(4, db_connections)
+
+
+def _gunicorn(factory: AppFactory, options: dict):
+    """Builds a gunicorn application that creates the app in every worker."""
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self) -> None:
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Flask:
+            return factory()
+
+    return Server()
+
+
+def _drain(server, worker) -> None:
+    """Lets a stopping worker finish the movies waiting for their details."""
+    app = worker.wsgi
+
+    if isinstance(app, Flask) and 'enrichment' in app.extensions:
+        app.extensions['enrichment'].drain(timeout=worker.cfg.graceful_timeout)
+
+
+@click.command()
+@click.option('--host', default='0.0.0.0', show_default=True)
+@click.option('--port', type=int, default=5000, show_default=True)
+@click.option('--workload', type=click.Choice(WORKLOADS), default='mixed', show_default=True,
+              help='What requests mostly wait on: OMDB lookups (io), rendering (cpu) or both.')
+@click.option('--workers', type=int, help='Worker processes, picked from the CPU count and workload by default.')
+@click.option('--threads', type=int, help='Threads per worker, picked from the workload by default.')
+@click.option('--max-requests', type=int, default=1000, show_default=True,
+              help='Requests after which a worker is replaced, 0 to never replace it.')
+@click.option('--max-requests-jitter', type=int, default=100, show_default=True,
+              help='Random extra requests, so that workers are not all replaced at once.')
+@click.option('--timeout', type=int, default=60, show_default=True,
+              help='Seconds a silent worker may take before it is killed and replaced.')
+@click.option('--graceful-timeout', type=int, default=30, show_default=True,
+              help='Seconds a stopping worker may take to finish its requests.')
+@click.pass_obj
+def serve(
+        obj: dict,
+        host: str,
+        port: int,
+        workload: str,
+        workers: int | None,
+        threads: int | None,
+        max_requests: int,
+        max_requests_jitter: int,
+        timeout: int,
+        graceful_timeout: int
+) -> None:
+    """
+    Serves the application with a pool of worker processes.
+    """
+    config: dict = obj['config']
+    upgrade: Upgrade = obj['upgrade_database']
+    default_workers, default_threads = worker_model(
+        workload, db_connections=config['DB_POOL_SIZE'] + config['DB_MAX_OVERFLOW']
+    )
+    workers = workers or default_workers
+    threads = threads or default_threads
+    overrides = {}
+
+    if workers > 1 and 'PAGE_CACHE_BACKEND' not in os.environ:
+        overrides['PAGE_CACHE_BACKEND'] = 'sqlite'
+    elif workers > 1 and config['PAGE_CACHE_BACKEND'] == 'memory':
+        click.echo(
+            "Every worker keeps its own page cache, set PAGE_CACHE_BACKEND=sqlite to share it.", err=True
+        )
+
+    # The master upgrades the schema before the workers are forked.
+    factory: AppFactory = functools.partial(obj['create_app'], {**overrides, 'UPGRADE_DATABASE': False})
+
+    try:
+        server = _gunicorn(factory, {
+            'bind': f"{host}:{port}",
+            'workers': workers,
+            'threads': threads,
+            'worker_class': 'gthread' if threads > 1 else 'sync',
+            'max_requests': max_requests,
+            'max_requests_jitter': max_requests_jitter,
+            'timeout': timeout,
+            'graceful_timeout': graceful_timeout,
+            'worker_exit': _drain,
+        })
+    except ImportError:
+        from werkzeug.serving import run_simple
+
+        click.echo("gunicorn is not installed, serving with a single threaded process.", err=True)
+        run_simple(host, port, obj['create_app'](overrides), threaded=True)
+        return
+
+    upgrade(overrides)
+    server.run()
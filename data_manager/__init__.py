@@ -1,2 +1,8 @@
 from .data_manager import DataManager, UserNotFoundError, MovieNotFoundError, InvalidUserName, InvalidMovieTitle
-from .omdb import MovieApiError
\ No newline at end of file
+from .omdb import OmdbClient, MovieApiError, omdb_request
+from .cache import OmdbCache
+from .enrichment import EnrichmentPool, EnrichmentQueueFull
+from .bulk import BulkImporter, InvalidImportFile, parse_items
+from .pagination import Page, InvalidPageRequest
+from .fields import InvalidFields
+from .posters import PosterStore, PosterUnavailable
@@ -0,0 +1,86 @@
+"""
+This module implements a thread-safe circuit breaker.
+
+The breaker opens after a number of consecutive failures and rejects calls
+until a cool-down has passed. It then lets a single trial call through
+(half-open) and closes again if that call succeeds. A trial that ends without
+an answer from the upstream is released, so that the next call is the trial.
+"""
+import threading
+import time
+
+
+class CircuitBreaker:
+    """Tracks consecutive failures of an upstream and decides whether to call it."""
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initializes a closed circuit breaker.
+
+        Args:
+            failure_threshold: Consecutive failures after which the breaker opens.
+            reset_timeout: Seconds the breaker stays open before a trial call.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """The current state: closed, open or half-open."""
+        with self.__lock:
+            if self.__state == self.OPEN and self.__cooled_down():
+                return self.HALF_OPEN
+            return self.__state
+
+    def allow(self) -> bool:
+        """
+        Decides whether a call may go to the upstream.
+
+        Returns:
+            True if the call may proceed, False if it should fail fast.
+        """
+        with self.__lock:
+            if self.__state == self.CLOSED:
+                return True
+
+            if self.__state == self.OPEN and self.__cooled_down():
+                self.__state = self.HALF_OPEN
+                return True
+
+            return False
+
+    def record_success(self) -> None:
+        """Closes the breaker and resets the failure count."""
+        with self.__lock:
+            self.__state = self.CLOSED
+            self.__failures = 0
+
+    def record_failure(self) -> None:
+        """Counts a failure and opens the breaker once the threshold is reached."""
+        with self.__lock:
+            self.__failures += 1
+
+            if self.__state == self.HALF_OPEN or self.__failures >= self.failure_threshold:
+                self.__state = self.OPEN
+                self.__opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """
+        Ends a call that got no answer from the upstream, e.g. because the
+        rate limiter held it back. If it was the trial call, the breaker goes
+        back to open and lets the next call through as the trial.
+        """
+        with self.__lock:
+            if self.__state == self.HALF_OPEN:
+                self.__state = self.OPEN
+
+    def __cooled_down(self) -> bool:
+        """Checks whether the open breaker may let a trial call through."""
+        return time.monotonic() - self.__opened_at >= self.reset_timeout
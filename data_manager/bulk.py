@@ -0,0 +1,330 @@
+"""
+This module implements bulk imports of movies into a user's library.
+
+A list of titles or IMDb IDs is parsed from CSV or JSON, deduplicated against
+itself and the user's existing movies, resolved against the shared catalog
+and, for movies it doesn't have yet, the OMDB API (through the response cache)
+and inserted in batched transactions. Progress is reported row by row as the
+import runs. The lookups run on the event loop of the OMDB client, so the
+thread of the import keeps a bounded number of them in flight without a thread
+for each.
+"""
+import csv
+import io
+import itertools
+import json
+import re
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Iterator
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Movie, CatalogMovie
+from .cache import OmdbCache
+from .data_manager import UserManager, CatalogManager
+from .omdb import Omdb, MovieApiError, current_omdb
+
+Item = dict
+Event = dict
+
+IMDB_ID = re.compile(r'^tt\d+$', re.IGNORECASE)
+
+
+class InvalidImportFile(Exception):
+    """Raised when an import file can't be parsed."""
+    pass
+
+
+def _item(value: str) -> Item:
+    """Turns a single value into an item, recognising IMDb IDs."""
+    value = value.strip()
+
+    if IMDB_ID.match(value):
+        return {'imdb_id': value.lower()}
+
+    return {'title': value}
+
+
+def parse_items(data: str | bytes, fmt: str) -> list[Item]:
+    """
+    Parses an import file into a list of items.
+
+    CSV files may have a header with `title` and/or `imdb_id` columns,
+    otherwise the first column is used. JSON files hold a list of strings or
+    of objects with a `title` and/or `imdb_id` key. Values that look like IMDb
+    IDs are looked up by ID.
+
+    Args:
+        data: The contents of the file.
+        fmt: Either 'csv' or 'json'.
+
+    Returns:
+        A list of items, each with a 'title' or an 'imdb_id' key.
+
+    Raises:
+        InvalidImportFile: If the file can't be parsed.
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+
+    if fmt == 'json':
+        try:
+            rows = json.loads(data)
+        except ValueError as e:
+            raise InvalidImportFile(f"Invalid JSON: {e}")
+
+        if not isinstance(rows, list):
+            raise InvalidImportFile("Expected a JSON list of titles")
+
+        items = []
+        for row in rows:
+            if isinstance(row, str):
+                items.append(_item(row))
+            elif isinstance(row, dict) and (row.get('imdb_id') or row.get('imdbID')):
+                items.append({'imdb_id': str(row.get('imdb_id') or row.get('imdbID')).strip().lower()})
+            elif isinstance(row, dict) and row.get('title'):
+                items.append({'title': str(row['title']).strip()})
+            else:
+                raise InvalidImportFile(f"Invalid entry: {row!r}")
+
+        return [item for item in items if any(item.values())]
+
+    if fmt == 'csv':
+        rows = list(csv.reader(io.StringIO(data)))
+
+        if not rows:
+            return []
+
+        header = [column.strip().lower() for column in rows[0]]
+
+        if 'title' in header or 'imdb_id' in header or 'imdbid' in header:
+            title = header.index('title') if 'title' in header else None
+            imdb_id = next(
+                (header.index(name) for name in ('imdb_id', 'imdbid') if name in header), None
+            )
+            items = []
+            for row in rows[1:]:
+                if imdb_id is not None and imdb_id < len(row) and row[imdb_id].strip():
+                    items.append({'imdb_id': row[imdb_id].strip().lower()})
+                elif title is not None and title < len(row) and row[title].strip():
+                    items.append({'title': row[title].strip()})
+            return items
+
+        return [_item(row[0]) for row in rows if row and row[0].strip()]
+
+    raise InvalidImportFile(f"Unsupported import format {fmt!r}")
+
+
+class BulkImporter:
+    """Imports many movies for a user with concurrent OMDB lookups."""
+
+    def __init__(self, workers: int = 8, batch_size: int = 100):
+        """
+        Initializes the importer.
+
+        Args:
+            workers: The maximum number of concurrent OMDB lookups.
+            batch_size: The number of movies inserted per transaction.
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+
+    def run(self, user_id: int, items: list[Item]) -> Iterator[Event]:
+        """
+        Imports movies for a user and reports progress as it goes.
+
+        Must be iterated inside an application context. Every input row yields
+        one event with its row number and a status of 'added', 'duplicate' or
+        'error'; a final event sums up the import. Movies already in the
+        catalog are not looked up again. Rows whose lookup or insert fails
+        are reported as errors without ending the import.
+
+        Args:
+            user_id: The ID of the user to import the movies for.
+            items: The items to import, see `parse_items`.
+
+        Yields:
+            Progress events as dictionaries.
+
+        Raises:
+            UserNotFoundError: If no user is found with the given ID.
+        """
+        UserManager.get(user_id)
+        totals = {'added': 0, 'duplicate': 0, 'error': 0}
+
+        def event(row: int, item: Item, status: str, **extra) -> Event:
+            totals[status] += 1
+            return {'row': row, **item, 'status': status, **extra}
+
+        existing = db.session.execute(
+            db.select(CatalogMovie.imdb_id, Movie.title)
+            .select_from(Movie)
+            .outerjoin(Movie.catalog)
+            .filter(Movie.user_id == user_id)
+        ).all()
+        imdb_ids = {imdb_id.lower() for imdb_id, _ in existing if imdb_id}
+        keys = {OmdbCache.key(title=title) for _, title in existing if title}
+        keys |= {OmdbCache.key(imdb_id=imdb_id) for imdb_id in imdb_ids}
+
+        lookups = {}
+        for row, item in enumerate(items, start=1):
+            key = OmdbCache.key(title=item.get('title'), imdb_id=item.get('imdb_id'))
+
+            if key in keys:
+                yield event(row, item, 'duplicate')
+                continue
+
+            keys.add(key)
+            lookups[row] = item
+
+        batch: list[tuple[int, Item, CatalogMovie]] = []
+
+        def resolved(row: int, entry: CatalogMovie) -> Iterator[Event]:
+            nonlocal batch
+            item = lookups[row]
+
+            if entry.imdb_id.lower() in imdb_ids:
+                yield event(row, item, 'duplicate', imdb_id=entry.imdb_id)
+                return
+
+            imdb_ids.add(entry.imdb_id.lower())
+            batch.append((row, item, entry))
+
+            if len(batch) >= self.batch_size:
+                yield from self.__insert(user_id, batch, event)
+                batch = []
+
+        cataloged = self.__from_catalog(lookups)
+
+        for row, entry in cataloged.items():
+            yield from resolved(row, entry)
+
+        client = current_omdb()
+        queued = ((row, item) for row, item in lookups.items() if row not in cataloged)
+        futures = {}
+
+        while True:
+            for row, item in itertools.islice(queued, self.workers - len(futures)):
+                futures[client.run(Omdb.lookup(client=client, **item))] = row
+
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                row = futures.pop(future)
+
+                try:
+                    entry = future.result().movie()
+                except MovieApiError as e:
+                    yield event(row, lookups[row], 'error', error=str(e))
+                    continue
+                except Exception:
+                    current_app.logger.exception("Looking up import row %s failed", row)
+                    yield event(row, lookups[row], 'error', error="The movie could not be looked up")
+                    continue
+
+                yield from resolved(row, entry)
+
+        yield from self.__insert(user_id, batch, event)
+        yield {'done': True, 'total': len(items), **totals}
+
+    @staticmethod
+    def __from_catalog(lookups: dict[int, Item]) -> dict[int, CatalogMovie]:
+        """Finds the items that are already in the catalog."""
+        by_imdb_id = {
+            item['imdb_id'].lower(): row for row, item in lookups.items() if item.get('imdb_id')
+        }
+        by_title = {
+            OmdbCache.normalize(item['title']): row for row, item in lookups.items() if item.get('title')
+        }
+        found = {}
+
+        for chunk in _chunks(list(by_imdb_id), 500):
+            entries = db.session.execute(
+                db.select(CatalogMovie).filter(CatalogMovie.imdb_id.in_(chunk))
+            ).scalars()
+            for entry in entries:
+                found[by_imdb_id[entry.imdb_id.lower()]] = entry
+
+        for chunk in _chunks(list(by_title), 500):
+            entries = db.session.execute(
+                db.select(CatalogMovie).filter(CatalogMovie.title.collate('NOCASE').in_(chunk))
+            ).scalars()
+            for entry in entries:
+                row = by_title.get(OmdbCache.normalize(entry.title or ''))
+                if row is not None:
+                    found.setdefault(row, entry)
+
+        return found
+
+    @staticmethod
+    def __insert(user_id: int, batch: list[tuple[int, Item, CatalogMovie]], event) -> Iterator[Event]:
+        """
+        Inserts a batch of movies in one transaction and reports them.
+
+        If the batch fails, its movies are inserted one at a time instead and
+        those that still fail are reported as errors.
+        """
+        if not batch:
+            return
+
+        try:
+            added = BulkImporter.__add(user_id, batch)
+        except SQLAlchemyError:
+            db.session.rollback()
+        else:
+            for row, item, movie_id, title in added:
+                yield event(row, item, 'added', movie_id=movie_id, title=title)
+            return
+
+        for row, item, entry in batch:
+            try:
+                (_, _, movie_id, title), = BulkImporter.__add(user_id, [(row, item, entry)])
+            except SQLAlchemyError:
+                db.session.rollback()
+                current_app.logger.exception("Inserting import row %s failed", row)
+                yield event(row, item, 'error', error="The movie could not be saved")
+            else:
+                yield event(row, item, 'added', movie_id=movie_id, title=title)
+
+    @staticmethod
+    def __add(user_id: int, batch: list[tuple[int, Item, CatalogMovie]]) -> list[tuple[int, Item, int, str]]:
+        """
+        Adds movies in one transaction, storing their new catalog entries
+        through `CatalogManager.store`, which reuses an entry that a
+        concurrent request added in the meantime.
+
+        Returns:
+            The row, item, movie ID and title of every added movie.
+        """
+        new = [entry.imdb_id for _, _, entry in batch if inspect(entry).transient]
+        known = {
+            entry.imdb_id: entry for entry in db.session.execute(
+                db.select(CatalogMovie).filter(CatalogMovie.imdb_id.in_(new))
+            ).scalars()
+        } if new else {}
+        catalog = CatalogManager()
+
+        movies = []
+        for row, item, entry in batch:
+            if inspect(entry).transient:
+                if entry.imdb_id not in known:
+                    known[entry.imdb_id] = catalog.store(entry)
+                entry = known[entry.imdb_id]
+            movies.append((row, item, Movie(title=entry.title, user_id=user_id, catalog=entry)))
+
+        db.session.add_all([movie for _, _, movie in movies])
+        db.session.flush()
+        added = [(row, item, movie.id, movie.title) for row, item, movie in movies]
+        db.session.commit()
+
+        return added
+
+
+def _chunks(values: list, size: int) -> Iterator[list]:
+    """Splits a list into chunks of at most `size` values."""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
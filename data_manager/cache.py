@@ -0,0 +1,287 @@
+"""
+This module provides a two-tier cache for OMDB API responses.
+
+Responses are kept in a small in-process LRU tier in front of a persistent
+SQLite tier, so repeated lookups of popular titles are answered locally,
+survive restarts and are shared between worker processes. Both tiers expire entries
+after a TTL and evict the least recently used entries once they are full.
+
+Reads of the persistent tier don't write: the access times of its hits are
+queued and stored in batches, and its size is estimated from the entries this
+process added, so that it is only counted once the estimate exceeds the limit.
+Entries other processes added are seen by that count.
+"""
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+Payload = dict
+
+# OMDB reports these as ``Response: False`` but they say nothing about the
+# movie itself, so they must never be cached as a negative result.
+TRANSIENT_ERRORS = (
+    'Request limit reached!',
+    'Invalid API key!',
+    'No API key provided.',
+)
+
+# Disk hits whose access time is stored in one write.
+ACCESS_BATCH = 64
+
+
+class CacheStats:
+    """Hit, miss and eviction counters for an OmdbCache."""
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def hits(self) -> int:
+        """The total number of hits across both tiers."""
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> dict:
+        """
+        Returns the counters as a plain dictionary.
+
+        Returns:
+            A dictionary of counter names to values.
+        """
+        return {
+            'hits': self.hits,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': round(self.hit_rate, 4),
+        }
+
+
+class OmdbCache:
+    """A TTL-bounded LRU cache for raw OMDB responses with a SQLite backing store."""
+
+    def __init__(
+            self,
+            path: str,
+            memory_size: int = 1024,
+            disk_size: int = 50_000,
+            ttl: float = 7 * 24 * 3600,
+            negative_ttl: float = 3600
+    ):
+        """
+        Initializes the cache and creates the persistent store if needed.
+
+        Args:
+            path: The path of the SQLite file for the persistent tier.
+            memory_size: The maximum number of entries in the in-process tier.
+            disk_size: The maximum number of entries in the persistent tier.
+            ttl: Seconds a found movie stays cached.
+            negative_ttl: Seconds a "movie not found" response stays cached.
+        """
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stats = CacheStats()
+
+        self.__memory: OrderedDict[str, tuple[float, Payload]] = OrderedDict()
+        self.__accessed: dict[str, float] = {}
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.__conn.execute("PRAGMA journal_mode = WAL")
+        self.__conn.execute("PRAGMA synchronous = NORMAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS omdb_cache ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.__conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_omdb_cache_accessed_at "
+            "ON omdb_cache (accessed_at)"
+        )
+        self.__conn.commit()
+        self.__rows = self.__count()
+
+    @staticmethod
+    def normalize(title: str) -> str:
+        """
+        Normalizes a title so that trivially different spellings share an entry.
+
+        Args:
+            title: The title as entered by the user.
+
+        Returns:
+            The case-folded title with collapsed whitespace.
+        """
+        return ' '.join(title.split()).casefold()
+
+    @classmethod
+    def key(cls, title: str | None = None, imdb_id: str | None = None) -> str:
+        """
+        Builds the cache key for a lookup by IMDb ID or by title.
+
+        Args:
+            title: The movie title.
+            imdb_id: The IMDb ID, preferred over the title when given.
+
+        Returns:
+            The cache key.
+        """
+        if imdb_id:
+            return f"i:{imdb_id.strip().lower()}"
+
+        return f"t:{cls.normalize(title or '')}"
+
+    def get(self, key: str) -> Payload | None:
+        """
+        Looks up a cached OMDB response.
+
+        Args:
+            key: The cache key, see `key`.
+
+        Returns:
+            The cached response, or None on a miss.
+        """
+        now = time.time()
+
+        with self.__lock:
+            entry = self.__memory.get(key)
+
+            if entry and entry[0] > now:
+                self.__memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return entry[1]
+
+            if entry:
+                del self.__memory[key]
+                self.stats.expirations += 1
+
+            row = self.__conn.execute(
+                "SELECT payload, expires_at FROM omdb_cache WHERE key = ?",
+                (key,)
+            ).fetchone()
+
+            if row and row[1] > now:
+                self.__accessed[key] = now
+
+                if len(self.__accessed) >= ACCESS_BATCH:
+                    self.__store_access_times()
+                    self.__conn.commit()
+
+                payload = json.loads(row[0])
+                self.__remember(key, row[1], payload)
+                self.stats.disk_hits += 1
+                return payload
+
+            if row:
+                self.__conn.execute("DELETE FROM omdb_cache WHERE key = ?", (key,))
+                self.__conn.commit()
+                self.__rows -= 1
+                self.stats.expirations += 1
+
+            self.stats.misses += 1
+            return None
+
+    def set(self, payload: Payload, *keys: str) -> None:
+        """
+        Stores an OMDB response under one or more keys.
+
+        Found movies are kept for `ttl` seconds and "not found" responses for
+        `negative_ttl` seconds. Errors that don't describe the movie, such as
+        an exhausted quota, are not cached at all.
+
+        Args:
+            payload: The decoded OMDB response.
+            *keys: The cache keys to store the response under.
+        """
+        if payload.get('Response') == 'False':
+            if payload.get('Error') in TRANSIENT_ERRORS:
+                return
+            ttl = self.negative_ttl
+        else:
+            ttl = self.ttl
+
+        now = time.time()
+        expires_at = now + ttl
+        data = json.dumps(payload)
+
+        with self.__lock:
+            for key in keys:
+                self.__remember(key, expires_at, payload)
+
+            self.__conn.executemany(
+                "INSERT OR REPLACE INTO omdb_cache (key, payload, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, data, expires_at, now) for key in keys]
+            )
+            self.__store_access_times()
+            # Replacing an entry doesn't add a row, so this may overestimate.
+            self.__rows += len(keys)
+
+            if self.__rows > self.disk_size:
+                self.__evict_disk(now)
+
+            self.__conn.commit()
+
+    def clear(self) -> None:
+        """Removes every entry from both tiers."""
+        with self.__lock:
+            self.__memory.clear()
+            self.__accessed.clear()
+            self.__conn.execute("DELETE FROM omdb_cache")
+            self.__conn.commit()
+            self.__rows = 0
+
+    def __remember(self, key: str, expires_at: float, payload: Payload) -> None:
+        """Puts an entry into the in-process tier, evicting the oldest if full."""
+        self.__memory[key] = (expires_at, payload)
+        self.__memory.move_to_end(key)
+
+        while len(self.__memory) > self.memory_size:
+            self.__memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def __evict_disk(self, now: float) -> None:
+        """Drops expired entries and trims the persistent tier to its size."""
+        expired = self.__conn.execute(
+            "DELETE FROM omdb_cache WHERE expires_at <= ?", (now,)
+        ).rowcount
+        self.stats.expirations += max(expired, 0)
+
+        self.__rows = self.__count()
+        overflow = self.__rows - self.disk_size
+
+        if overflow > 0:
+            self.__conn.execute(
+                "DELETE FROM omdb_cache WHERE key IN ("
+                "SELECT key FROM omdb_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+            self.__rows = self.disk_size
+            self.stats.evictions += overflow
+
+    def __store_access_times(self) -> None:
+        """Writes the queued access times of disk hits, without committing."""
+        if self.__accessed:
+            self.__conn.executemany(
+                "UPDATE omdb_cache SET accessed_at = max(accessed_at, ?) WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self.__accessed.items()]
+            )
+            self.__accessed.clear()
+
+    def __count(self) -> int:
+        """Counts the entries of the persistent tier."""
+        return self.__conn.execute("SELECT COUNT(*) FROM omdb_cache").fetchone()[0]
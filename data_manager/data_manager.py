@@ -4,9 +4,45 @@ This module provides data management classes for interacting with the database.
 It includes managers for User and Movie entities, handling all CRUD (Create, Read,
 Update, Delete) operations. It also defines custom exceptions for data-related errors.
 """
-from sqlalchemy import Sequence
-from models import db, Movie, User
-from .omdb import Omdb
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, TypeVar
+from flask import g, has_app_context
+from sqlalchemy import Sequence, func, literal_column, table, column, case, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
+from models import db, Movie, User, CatalogMovie
+from models.search import match_expression
+from .omdb import Omdb, MovieApiError
+from .pagination import Page, InvalidPageRequest, paginate
+from .fields import Row, select_fields
+
+
+T = TypeVar('T')
+
+
+def _now() -> datetime:
+    """The current UTC time as the naive datetime the database stores."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _keep(entity: T) -> T:
+    """
+    Keeps an entity alive until the end of the application context.
+
+    The session's identity map only holds weak references, so an entity that
+    nothing refers to any more would be queried again by the next `get`.
+
+    Args:
+        entity: The loaded entity, or None.
+
+    Returns:
+        The entity.
+    """
+    if entity is not None and has_app_context():
+        g.setdefault('loaded_entities', set()).add(entity)
+
+    return entity
 
 
 class UserNotFoundError(Exception):
@@ -31,12 +67,20 @@ class InvalidMovieTitle(Exception):
 
 class UserManager:
     """Manages data operations for User entities."""
+    FIELDS = {
+        'id': User.id,
+        'name': User.name,
+        'updated_at': User.updated_at,
+    }
 
     @staticmethod
     def get(user_id: int) -> User:
         """
         Retrieves a user by their ID.
 
+        A user loaded earlier in the same request, also as part of another
+        query, is returned without querying the database again.
+
         Args:
             user_id: The ID of the user to retrieve.
 
@@ -46,15 +90,80 @@ class UserManager:
         Raises:
             UserNotFoundError: If no user is found with the given ID.
         """
-        user = db.session.execute(
-            db.select(User).filter_by(id=user_id)
-        ).scalar()
+        user = _keep(db.session.get(User, user_id))
 
         if not user:
             raise UserNotFoundError(f"User with id {user_id} not found")
 
         return user
 
+    def version(self, user_id: int) -> tuple[int, datetime | None]:
+        """
+        Retrieves the library version of a user.
+
+        The user is loaded with `get`, so a page that needs the user after
+        checking its version doesn't query it twice.
+
+        Args:
+            user_id: The ID of the user.
+
+        Returns:
+            The version counter and the time of the last change.
+
+        Raises:
+            UserNotFoundError: If no user is found with the given ID.
+        """
+        user = self.get(user_id)
+
+        return user.version, user.updated_at
+
+    @staticmethod
+    def get_with_count(user_id: int) -> tuple[User, int]:
+        """
+        Retrieves a user together with the number of their movies in one query.
+
+        Args:
+            user_id: The ID of the user.
+
+        Returns:
+            The User object and their movie count.
+
+        Raises:
+            UserNotFoundError: If no user is found with the given ID.
+        """
+        count = (
+            db.select(func.count(Movie.id))
+            .filter(Movie.user_id == User.id)
+            .correlate(User)
+            .scalar_subquery()
+        )
+        row = db.session.execute(
+            db.select(User, count).filter(User.id == user_id)
+        ).one_or_none()
+
+        if not row:
+            raise UserNotFoundError(f"User with id {user_id} not found")
+
+        return _keep(row[0]), row[1]
+
+    @staticmethod
+    def versions() -> tuple[int, int, datetime | None]:
+        """
+        Summarizes the library versions of all users in one aggregate query.
+
+        The result changes whenever a user is added, changed or deleted, or a
+        movie is added to, changed in or removed from any library.
+
+        Returns:
+            The number of users, the sum of their versions and the time of
+            the last change.
+        """
+        row = db.session.execute(
+            db.select(func.count(User.id), func.total(User.version), func.max(User.updated_at))
+        ).one()
+
+        return row[0], int(row[1]), row[2]
+
     @staticmethod
     def get_all() -> Sequence[User]:
         """
@@ -69,6 +178,77 @@ class UserManager:
 
         return users
 
+    @staticmethod
+    def page(
+            size: int,
+            after: str | None = None,
+            before: str | None = None
+    ) -> Page:
+        """
+        Retrieves one page of users ordered by ID.
+
+        Args:
+            size: The maximum number of users on the page.
+            after: The cursor of the page to continue after.
+            before: The cursor of the page to continue before.
+
+        Returns:
+            A Page of User objects.
+
+        Raises:
+            InvalidPageRequest: If a cursor is malformed.
+        """
+        return paginate(
+            query=db.select(User),
+            sort_key=[User.id],
+            key_of=lambda user: (user.id,),
+            size=size,
+            after=after,
+            before=before
+        )
+
+    def rows(
+            self,
+            fields: str | None,
+            size: int,
+            after: str | None = None,
+            before: str | None = None
+    ) -> Page:
+        """
+        Retrieves selected fields of one page of users ordered by ID.
+
+        Only the selected columns are queried, no User objects are loaded.
+
+        Args:
+            fields: A comma-separated list of `FIELDS`, all of them if None.
+            size: The maximum number of users on the page.
+            after: The cursor of the page to continue after.
+            before: The cursor of the page to continue before.
+
+        Returns:
+            A Page of dictionaries.
+
+        Raises:
+            InvalidFields: If a field is not one of `FIELDS`.
+            InvalidPageRequest: If a cursor is malformed.
+        """
+        columns = select_fields(self.FIELDS, fields)
+        page = paginate(
+            query=db.select(*[column.label(name) for name, column in columns.items()]),
+            sort_key=[User.id],
+            key_of=lambda row: (row.id,),
+            size=size,
+            after=after,
+            before=before,
+            scalars=False
+        )
+
+        return Page(
+            items=[row._asdict() for row in page],
+            next_cursor=page.next_cursor,
+            prev_cursor=page.prev_cursor
+        )
+
     @staticmethod
     def add(name: str) -> User:
         """
@@ -119,8 +299,122 @@ class UserManager:
         db.session.commit()
 
 
+class CatalogManager:
+    """Manages the shared catalog of OMDB movie details."""
+
+    @staticmethod
+    def get(catalog_id: int) -> CatalogMovie | None:
+        """
+        Retrieves a catalog entry by its ID.
+
+        Args:
+            catalog_id: The ID of the catalog entry.
+
+        Returns:
+            The CatalogMovie object, or None if there is no such entry.
+        """
+        return db.session.get(CatalogMovie, catalog_id)
+
+    @staticmethod
+    def find(title: str | None = None, imdb_id: str | None = None) -> CatalogMovie | None:
+        """
+        Looks up a catalog entry by IMDb ID or, case-insensitively, by title.
+
+        Args:
+            title: The title of the movie.
+            imdb_id: The IMDb ID of the movie, preferred over the title.
+
+        Returns:
+            The CatalogMovie object, or None if the catalog doesn't have it.
+        """
+        if imdb_id:
+            query = db.select(CatalogMovie).filter_by(imdb_id=imdb_id.strip())
+        else:
+            query = db.select(CatalogMovie).filter(
+                CatalogMovie.title.collate('NOCASE') == ' '.join(title.split())
+            )
+
+        return db.session.execute(query.limit(1)).scalar()
+
+    def store(self, entry: CatalogMovie) -> CatalogMovie:
+        """
+        Adds a catalog entry unless one with the same IMDb ID exists.
+
+        The caller is responsible for committing the session.
+
+        Args:
+            entry: A new, unsaved CatalogMovie object.
+
+        Returns:
+            The existing or newly added CatalogMovie object.
+        """
+        existing = self.find(imdb_id=entry.imdb_id)
+
+        if existing:
+            return existing
+
+        try:
+            with db.session.begin_nested():
+                db.session.add(entry)
+        except IntegrityError:
+            # Another request added the same movie in the meantime.
+            return self.find(imdb_id=entry.imdb_id)
+
+        return entry
+
+    def resolve(self, title: str | None = None, imdb_id: str | None = None) -> CatalogMovie:
+        """
+        Returns the catalog entry for a movie, fetching it from the OMDB API
+        only if the catalog doesn't have it yet.
+
+        The caller is responsible for committing the session.
+
+        Args:
+            title: The title of the movie.
+            imdb_id: The IMDb ID of the movie, preferred over the title.
+
+        Returns:
+            The CatalogMovie object.
+
+        Raises:
+            MovieApiError: If the movie cannot be found or there's an API issue.
+        """
+        entry = self.find(title=title, imdb_id=imdb_id)
+
+        if entry:
+            return entry
+
+        return self.store(Omdb(title=title, imdb_id=imdb_id).movie())
+
+
 class MovieManager:
     """Manages data operations for Movie entities."""
+    SORT_COLUMNS = {
+        'added': None,
+        'title': Movie.title,
+        'year': CatalogMovie.release_year,
+        'rating': CatalogMovie.rating,
+        'runtime': CatalogMovie.runtime,
+    }
+    FIELDS = {
+        'id': Movie.id,
+        'user_id': Movie.user_id,
+        'title': Movie.title,
+        'user_rating': Movie.user_rating,
+        'added_at': Movie.added_at,
+        'status': Movie.status,
+        'imdb_id': CatalogMovie.imdb_id,
+        'year': CatalogMovie.release_year,
+        'rated': CatalogMovie.rated,
+        'rating': CatalogMovie.rating,
+        'runtime': CatalogMovie.runtime,
+        'genre': CatalogMovie.genre,
+        'director': CatalogMovie.director,
+        'actors': CatalogMovie.actors,
+        'plot': CatalogMovie.plot,
+        'poster': CatalogMovie.poster,
+    }
+    catalog = CatalogManager()
 
     @staticmethod
     def get(movie_id: int) -> Movie:
@@ -136,9 +430,7 @@ class MovieManager:
         Raises:
             MovieNotFoundError: If no movie is found with the given ID.
         """
-        movie = db.session.execute(
-            db.select(Movie).filter_by(id=movie_id)
-        ).scalar()
+        movie = _keep(db.session.get(Movie, movie_id))
 
         if not movie:
             raise MovieNotFoundError(f"Movie with id {movie_id} not found")
@@ -146,23 +438,370 @@ class MovieManager:
         return movie
 
     @staticmethod
-    def get_all(user_id: int) -> Sequence[Movie]:
+    def get_owned(user_id: int, movie_id: int) -> Movie:
+        """
+        Retrieves a movie of a specific user together with the user and its
+        catalog entry in one query.
+
+        Args:
+            user_id: The ID of the user who must own the movie.
+            movie_id: The ID of the movie to retrieve.
+
+        Returns:
+            The Movie object, with `user` and `catalog` loaded.
+
+        Raises:
+            MovieNotFoundError: If the user has no movie with the given ID.
+        """
+        movie = _keep(db.session.execute(
+            db.select(Movie)
+            .join(Movie.user)
+            .options(contains_eager(Movie.user))
+            .filter(Movie.id == movie_id, Movie.user_id == user_id)
+        ).scalar())
+
+        if not movie:
+            raise MovieNotFoundError(f"User {user_id} has no movie with id {movie_id}")
+
+        return movie
+
+    @staticmethod
+    def get_all(user_id: int, batch_size: int = 1000) -> Iterator[Movie]:
         """
         Retrieves all movies belonging to a specific user.
 
+        The movies are fetched `batch_size` at a time while they are being
+        iterated, so memory use doesn't grow with the size of the library.
+
         Args:
             user_id: The ID of the user.
+            batch_size: The number of movies fetched at a time.
 
         Returns:
-            A sequence of Movie objects.
+            An iterator of Movie objects ordered by ID.
         """
         movies = db.session.execute(
-            db.select(Movie).filter_by(user_id=user_id)
+            db.select(Movie)
+            .filter_by(user_id=user_id)
+            .order_by(Movie.id)
+            .execution_options(yield_per=batch_size)
         ).scalars()
 
         return movies
 
-    def count(self, user_id: int) -> int:
+    def export(self, user_id: int, fields: str | None = None, batch_size: int = 1000) -> Iterator[Row]:
+        """
+        Iterates over selected fields of all movies of a user.
+
+        Like `get_all`, the rows are fetched `batch_size` at a time while
+        they are being iterated, but only the selected columns are queried.
+        The read runs in its own transaction, which never takes SQLite's
+        write lock.
+
+        Args:
+            user_id: The ID of the user.
+            fields: A comma-separated list of `FIELDS`, all of them if None.
+            batch_size: The number of rows fetched at a time.
+
+        Returns:
+            An iterator of dictionaries ordered by movie ID.
+
+        Raises:
+            InvalidFields: If a field is not one of `FIELDS`.
+        """
+        columns = select_fields(self.FIELDS, fields)
+        query = db.select(
+            *[column.label(name) for name, column in columns.items()]
+        ).select_from(Movie).filter(Movie.user_id == user_id).order_by(Movie.id)
+
+        if any(column.table is CatalogMovie.__table__ for column in columns.values()):
+            query = query.outerjoin(Movie.catalog)
+
+        def rows() -> Iterator[Row]:
+            with db.engine.connect() as conn:
+                for row in conn.execution_options(yield_per=batch_size).execute(query):
+                    yield row._asdict()
+
+        return rows()
+
+    def page(
+            self,
+            user_id: int,
+            size: int,
+            sort: str = 'added',
+            descending: bool = False,
+            after: str | None = None,
+            before: str | None = None,
+            year_from: int | None = None,
+            year_to: int | None = None,
+            min_rating: float | None = None,
+            max_runtime: int | None = None
+    ) -> Page:
+        """
+        Retrieves one page of the movies belonging to a specific user.
+
+        Movies without a release year, rating or runtime sort before all
+        others and are left out by the filters on that value.
+
+        Args:
+            user_id: The ID of the user.
+            size: The maximum number of movies on the page.
+            sort: The sort order, one of `SORT_COLUMNS`.
+            descending: Whether to sort in descending order.
+            after: The cursor of the page to continue after.
+            before: The cursor of the page to continue before.
+            year_from: Only include movies released in or after this year.
+            year_to: Only include movies released in or before this year.
+            min_rating: Only include movies with at least this IMDb rating.
+            max_runtime: Only include movies of at most this many minutes.
+
+        Returns:
+            A Page of Movie objects.
+
+        Raises:
+            InvalidPageRequest: If the sort order or a cursor is not valid.
+        """
+        sort_value = self.__sort_value(sort)
+
+        if sort_value is None:
+            sort_key = [Movie.id]
+            key_of = lambda movie: (movie.id,)
+        else:
+            sort_key = [sort_value, Movie.id]
+            key_of = lambda movie: (getattr(movie, sort_value.key), movie.id)
+
+        query = (
+            db.select(Movie)
+            .outerjoin(Movie.catalog)
+            .options(contains_eager(Movie.catalog))
+            .filter(Movie.user_id == user_id)
+            .filter(*self.__filters(year_from, year_to, min_rating, max_runtime))
+        )
+
+        return paginate(
+            query=query,
+            sort_key=sort_key,
+            key_of=key_of,
+            size=size,
+            descending=descending,
+            after=after,
+            before=before
+        )
+
+    def rows(
+            self,
+            user_id: int,
+            fields: str | None,
+            size: int,
+            sort: str = 'added',
+            descending: bool = False,
+            after: str | None = None,
+            before: str | None = None,
+            year_from: int | None = None,
+            year_to: int | None = None,
+            min_rating: float | None = None,
+            max_runtime: int | None = None
+    ) -> Page:
+        """
+        Retrieves selected fields of one page of the movies of a user.
+
+        Works like `page`, but only the selected columns are queried and the
+        catalog is only joined if a selected field, the sort order or a
+        filter needs it. No Movie objects are loaded.
+
+        Args:
+            user_id: The ID of the user.
+            fields: A comma-separated list of `FIELDS`, all of them if None.
+            size: The maximum number of movies on the page.
+            sort: The sort order, one of `SORT_COLUMNS`.
+            descending: Whether to sort in descending order.
+            after: The cursor of the page to continue after.
+            before: The cursor of the page to continue before.
+            year_from: Only include movies released in or after this year.
+            year_to: Only include movies released in or before this year.
+            min_rating: Only include movies with at least this IMDb rating.
+            max_runtime: Only include movies of at most this many minutes.
+
+        Returns:
+            A Page of dictionaries.
+
+        Raises:
+            InvalidFields: If a field is not one of `FIELDS`.
+            InvalidPageRequest: If the sort order or a cursor is not valid.
+        """
+        columns = select_fields(self.FIELDS, fields)
+        sort_value = self.__sort_value(sort)
+        filters = self.__filters(year_from, year_to, min_rating, max_runtime)
+        selected = [column.label(name) for name, column in columns.items()]
+
+        if sort_value is None:
+            sort_key = [Movie.id]
+            key_of = lambda row: (row.id,)
+        else:
+            sort_key = [sort_value, Movie.id]
+            key_of = lambda row: (row.sort_value, row.id)
+            selected.append(sort_value.label('sort_value'))
+
+        query = db.select(*selected).select_from(Movie).filter(Movie.user_id == user_id)
+
+        if filters or sort_value is not None or any(
+                column.table is CatalogMovie.__table__ for column in columns.values()
+        ):
+            query = query.outerjoin(Movie.catalog)
+
+        page = paginate(
+            query=query.filter(*filters),
+            sort_key=sort_key,
+            key_of=key_of,
+            size=size,
+            descending=descending,
+            after=after,
+            before=before,
+            scalars=False
+        )
+
+        return Page(
+            items=[{name: row._mapping[name] for name in columns} for row in page],
+            next_cursor=page.next_cursor,
+            prev_cursor=page.prev_cursor
+        )
+
+    def row(self, movie_id: int, fields: str | None) -> Row:
+        """
+        Retrieves selected fields of a movie without loading it.
+
+        Args:
+            movie_id: The ID of the movie.
+            fields: A comma-separated list of `FIELDS`, all of them if None.
+
+        Returns:
+            A dictionary of the selected fields.
+
+        Raises:
+            InvalidFields: If a field is not one of `FIELDS`.
+            MovieNotFoundError: If no movie is found with the given ID.
+        """
+        columns = select_fields(self.FIELDS, fields)
+        query = db.select(
+            *[column.label(name) for name, column in columns.items()]
+        ).select_from(Movie).filter(Movie.id == movie_id)
+
+        if any(column.table is CatalogMovie.__table__ for column in columns.values()):
+            query = query.outerjoin(Movie.catalog)
+
+        row = db.session.execute(query).one_or_none()
+
+        if not row:
+            raise MovieNotFoundError(f"Movie with id {movie_id} not found")
+
+        return row._asdict()
+
+    def __sort_value(self, sort: str):
+        """
+        Returns the column movies are sorted by before their ID.
+
+        The column is sorted by as is, so that the `ix_movies_user_id_title` and
+        catalog indexes can return the movies in order; SQLite sorts missing
+        values first like `page` promises.
+
+        Args:
+            sort: The sort order, one of `SORT_COLUMNS`.
+
+        Returns:
+            The column, None when sorting by ID alone.
+
+        Raises:
+            InvalidPageRequest: If the sort order is not valid.
+        """
+        if sort not in self.SORT_COLUMNS:
+            raise InvalidPageRequest(f"Cannot sort movies by {sort!r}")
+
+        return self.SORT_COLUMNS[sort]
+
+    @staticmethod
+    def __filters(
+            year_from: int | None,
+            year_to: int | None,
+            min_rating: float | None,
+            max_runtime: int | None
+    ) -> list:
+        """Builds the WHERE clauses of the movie filters that are set."""
+        filters = []
+
+        if year_from is not None:
+            filters.append(CatalogMovie.release_year >= year_from)
+        if year_to is not None:
+            filters.append(CatalogMovie.release_year <= year_to)
+        if min_rating is not None:
+            filters.append(CatalogMovie.rating >= min_rating)
+        if max_runtime is not None:
+            filters.append(CatalogMovie.runtime <= max_runtime)
+
+        return filters
+
+    @staticmethod
+    def search(
+            user_id: int,
+            query: str,
+            size: int,
+            after: str | None = None,
+            before: str | None = None
+    ) -> Page:
+        """
+        Searches the movies of a user by title, plot, actors, director and genre.
+
+        Every word of the query must occur in one of these fields, the last
+        one may also be the beginning of a word. Movies matching in their
+        title come first.
+
+        Args:
+            user_id: The ID of the user.
+            query: The search terms.
+            size: The maximum number of movies on the page.
+            after: The cursor of the page to continue after.
+            before: The cursor of the page to continue before.
+
+        Returns:
+            A Page of Movie objects, empty if the query has no words.
+
+        Raises:
+            InvalidPageRequest: If a cursor is not valid.
+        """
+        expression = match_expression(user_id, query)
+
+        if expression is None:
+            return Page(items=[], next_cursor=None, prev_cursor=None)
+
+        search = table('movie_search', column('rowid'))
+        matches = lambda expression: literal_column('movie_search').op('MATCH')(expression)
+        # Matched once and materialized, rather than in every clause the rank appears in.
+        in_title = (
+            db.select(search.c.rowid)
+            .where(matches(match_expression(user_id, query, ('title',))))
+            .cte('in_title')
+            .prefix_with('MATERIALIZED')
+        )
+        rank = case((Movie.id.in_(db.select(in_title.c.rowid)), 0), else_=1)
+
+        page = paginate(
+            query=db.select(Movie, rank.label('rank'))
+            .join(search, search.c.rowid == Movie.id)
+            .outerjoin(Movie.catalog)
+            .options(contains_eager(Movie.catalog))
+            .where(matches(expression)),
+            sort_key=[rank, Movie.id],
+            key_of=lambda row: (row.rank, row.Movie.id),
+            size=size,
+            after=after,
+            before=before,
+            scalars=False
+        )
+        page.items = [row.Movie for row in page.items]
+
+        return page
+
+    @staticmethod
+    def count(user_id: int) -> int:
         """
         Counts the number of movies belonging to a specific user.
 
@@ -172,17 +811,42 @@ class MovieManager:
         Returns:
             The total number of movies for the user.
         """
-        movies = self.get_all(user_id)
-
-        if not movies:
-            return 0
+        count = db.session.execute(
+            db.select(func.count(Movie.id)).filter_by(user_id=user_id)
+        ).scalar()
 
-        return len(list(movies))
+        return count
 
     @staticmethod
-    def add(title: str, user_id: int) -> Movie:
+    def count_many(user_ids: Iterable[int]) -> dict[int, int]:
         """
-        Adds a new movie for a user, fetching details from the OMDB API.
+        Counts the movies of several users in a single query.
+
+        Args:
+            user_ids: The IDs of the users.
+
+        Returns:
+            A dictionary mapping each user ID to their number of movies.
+        """
+        user_ids = list(user_ids)
+        counts = dict.fromkeys(user_ids, 0)
+
+        if not user_ids:
+            return counts
+
+        rows = db.session.execute(
+            db.select(Movie.user_id, func.count(Movie.id))
+            .filter(Movie.user_id.in_(user_ids))
+            .group_by(Movie.user_id)
+        ).all()
+        counts.update(rows)
+
+        return counts
+
+    def add(self, title: str, user_id: int) -> Movie:
+        """
+        Adds a new movie for a user. The details come from the catalog, or
+        from the OMDB API if the catalog doesn't have the movie yet.
 
         Args:
             title: The title of the movie to add.
@@ -198,47 +862,192 @@ class MovieManager:
         if not title:
             raise InvalidMovieTitle("Movie title cannot be empty")
 
-        movie = Omdb(
+        entry = self.catalog.resolve(
             title=title
-        ).movie()
+        )
+
+        movie = Movie(title=entry.title, user_id=user_id, catalog=entry)
+
+        db.session.add(movie)
+        db.session.commit()
+
+        return movie
+
+    @staticmethod
+    def add_pending(title: str, user_id: int) -> Movie:
+        """
+        Adds a placeholder movie for a user whose details are fetched later.
+
+        Args:
+            title: The title of the movie to add.
+            user_id: The ID of the user who will own the movie.
 
-        movie.user_id = user_id
+        Returns:
+            The newly created, pending Movie object.
+
+        Raises:
+            InvalidMovieTitle: If the provided title is empty.
+        """
+        if not title:
+            raise InvalidMovieTitle("Movie title cannot be empty")
+
+        movie = Movie(title=title, user_id=user_id, status=Movie.PENDING, claimed_at=_now())
 
         db.session.add(movie)
         db.session.commit()
 
         return movie
 
-    def delete(self, movie_id: int) -> None:
+    @staticmethod
+    def claim_pending(limit: int, lease: float) -> list[int]:
+        """
+        Claims pending movies that no process is fetching the details of,
+        because the one that added or claimed them stopped.
+
+        The movies are claimed in a single statement, so two processes never
+        claim the same movie at once.
+
+        Args:
+            limit: The maximum number of movies to claim.
+            lease: Seconds after which a claim is considered abandoned.
+
+        Returns:
+            The IDs of the claimed movies.
+        """
+        if limit <= 0:
+            return []
+
+        now = _now()
+        claimable = db.select(Movie.id).filter(
+            Movie.status == Movie.PENDING,
+            or_(Movie.claimed_at.is_(None), Movie.claimed_at < now - timedelta(seconds=lease))
+        ).order_by(Movie.id).limit(limit)
+
+        movie_ids = db.session.execute(
+            db.update(Movie)
+            .where(Movie.id.in_(claimable.scalar_subquery()))
+            .values(claimed_at=now)
+            .returning(Movie.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.session.commit()
+
+        return list(movie_ids)
+
+    @staticmethod
+    def fail(movie_id: int, reason: str) -> None:
+        """
+        Marks a pending movie as failed, e.g. after an unexpected error while
+        fetching its details, so that it doesn't stay pending forever.
+
+        Args:
+            movie_id: The ID of the pending movie.
+            reason: Why fetching the details failed.
+        """
+        db.session.rollback()
+        movie = db.session.get(Movie, movie_id)
+
+        if movie is None or movie.status != Movie.PENDING:
+            return
+
+        movie.status = Movie.FAILED
+        movie.error = reason[:256]
+        db.session.commit()
+
+    def enrich(self, movie_id: int, lookup: Future[Omdb] | None = None) -> Movie:
+        """
+        Links a pending movie to its catalog entry, fetching the details
+        from the OMDB API if the catalog doesn't have the movie yet.
+
+        The movie is marked as ready on success and as failed, together with
+        the reason, if the OMDB lookup fails. Movies that are not pending are
+        left untouched.
+
+        Args:
+            movie_id: The ID of the pending movie.
+            lookup: The OMDB lookup of the movie if it was already started,
+                see `OmdbClient.run`; unused if the catalog has the movie.
+
+        Returns:
+            The updated Movie object.
+        """
+        movie = self.get(movie_id)
+
+        if movie.status != Movie.PENDING:
+            return movie
+
+        try:
+            entry = self.catalog.find(title=movie.title) or self.catalog.store(
+                (lookup.result() if lookup else Omdb(title=movie.title)).movie()
+            )
+        except MovieApiError as e:
+            movie.status = Movie.FAILED
+            movie.error = str(e)[:256]
+        else:
+            movie.catalog = entry
+            movie.title = entry.title
+            movie.status = Movie.READY
+            movie.error = None
+
+        db.session.commit()
+
+        return movie
+
+    def delete(self, movie_id: int, user_id: int | None = None) -> None:
         """
         Deletes a movie from the database.
 
         Args:
             movie_id: The ID of the movie to delete.
+            user_id: The ID of the user who must own the movie, if given.
+
+        Raises:
+            MovieNotFoundError: If the movie doesn't exist or isn't the user's.
         """
-        movie = self.get(movie_id)
+        movie = self.get(movie_id) if user_id is None else self.get_owned(user_id, movie_id)
 
         db.session.delete(movie)
         db.session.commit()
 
-    def update(self, movie_id: int, new_title: str) -> None:
+    def update(
+            self,
+            movie_id: int,
+            new_title: str,
+            new_rating: float | None = None,
+            user_id: int | None = None
+    ) -> None:
         """
-        Updates the title of an existing movie.
+        Updates the title and the user's own rating of an existing movie.
 
-        Note: This only updates the title in the local database, not the other
+        Note: This only updates the user's library entry, not the catalog
         details fetched from OMDB.
 
         Args:
             movie_id: The ID of the movie to update.
             new_title: The new title for the movie.
+            new_rating: The user's rating of the movie, None to clear it.
+            user_id: The ID of the user who must own the movie, if given.
+
+        Raises:
+            MovieNotFoundError: If the movie doesn't exist or isn't the user's.
         """
-        movie = self.get(movie_id)
+        movie = self.get(movie_id) if user_id is None else self.get_owned(user_id, movie_id)
 
         movie.title = new_title
+        movie.user_rating = new_rating
         db.session.commit()
 
 
 class DataManager:
-    """A facade class that provides access to all data managers."""
+    """
+    A facade class that provides access to all data managers.
+
+    The managers share the request's database session, whose identity map
+    serves as a request-scoped cache: a user or movie loaded once, directly
+    or through a join, is not queried again by `get` in the same request.
+    The loaded entities are kept alive on `g` for this, as the identity map
+    only holds weak references.
+    """
     user = UserManager()
     movie = MovieManager()
+    catalog = CatalogManager()
@@ -0,0 +1,218 @@
+"""
+This module provides a background worker pool that fetches OMDB details for
+movies that were added as placeholders.
+
+Adding a movie then only inserts a pending row and enqueues its ID; a
+dispatcher thread starts the OMDB lookup on the event loop of the OMDB client
+and a second thread fills in the row once the lookup finished. Up to `workers`
+lookups are in flight at once without a thread for each. The queue is bounded
+so that a burst of additions is rejected instead of piling up without limit.
+
+Every pending movie is claimed by one process at a time: the one that added it,
+or one that took it over after the claim lapsed because that process stopped.
+Pools claim such leftovers when the application starts and whenever they are
+idle, so a worker that restarts doesn't fetch what another one is fetching.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from flask import Flask
+
+from models import db, Movie
+from .data_manager import MovieManager, CatalogManager
+from .omdb import Omdb
+
+
+class EnrichmentQueueFull(Exception):
+    """Raised when the enrichment queue has no room for another movie."""
+    pass
+
+
+class EnrichmentPool:
+    """A bounded queue of movie IDs whose OMDB lookups run concurrently."""
+
+    def __init__(
+            self,
+            app: Flask | None = None,
+            workers: int = 4,
+            maxsize: int = 100,
+            put_timeout: float = 0.5,
+            lease: float = 300
+    ):
+        """
+        Initializes the pool. Its threads start on the first submission, or
+        when movies left pending are claimed.
+
+        Args:
+            app: The Flask application the threads run in.
+            workers: The maximum number of movies looked up at once.
+            maxsize: The maximum number of queued movies.
+            put_timeout: Seconds a submission waits for room in a full queue.
+            lease: Seconds after which another process may take over a
+                pending movie, see `MovieManager.claim_pending`.
+        """
+        self.workers = workers
+        self.put_timeout = put_timeout
+        self.lease = lease
+        self.__queue: queue.Queue[int] = queue.Queue(maxsize=maxsize)
+        self.__finished: queue.SimpleQueue[tuple[int, Future[Omdb] | None]] = queue.SimpleQueue()
+        self.__slots = threading.Semaphore(workers)
+        self.__threads: list[threading.Thread] = []
+        self.__lock = threading.Lock()
+        self.__app = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Registers the pool as the `enrichment` extension of an application
+        and claims the movies left pending by processes that stopped.
+
+        Args:
+            app: The Flask application, its database already upgraded.
+        """
+        self.__app = app
+        app.extensions['enrichment'] = self
+        self.__recover()
+
+    @property
+    def pending(self) -> int:
+        """The approximate number of movies waiting in the queue."""
+        return self.__queue.qsize()
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Waits for the queued movies to be enriched, e.g. before the process
+        exits. Movies still pending afterwards are claimed by another pool
+        once their lease ran out.
+
+        Args:
+            timeout: The maximum number of seconds to wait.
+
+        Returns:
+            True if the queue was drained, False if the time ran out.
+        """
+        deadline = time.monotonic() + timeout
+
+        while self.__threads and self.__queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+        return True
+
+    def submit(self, movie_id: int) -> None:
+        """
+        Enqueues a pending movie for enrichment.
+
+        Args:
+            movie_id: The ID of the pending movie.
+
+        Raises:
+            EnrichmentQueueFull: If the queue stays full for `put_timeout` seconds.
+        """
+        self.__start()
+
+        try:
+            self.__queue.put(movie_id, timeout=self.put_timeout)
+        except queue.Full:
+            raise EnrichmentQueueFull(
+                "Too many movies are being added right now, please try again shortly"
+            )
+
+    def __recover(self) -> None:
+        """Claims movies left pending by other processes and enqueues them."""
+        with self.__app.app_context():
+            movie_ids = MovieManager.claim_pending(
+                limit=self.__queue.maxsize - self.__queue.qsize(), lease=self.lease
+            )
+
+        if movie_ids:
+            self.__start()
+
+        for movie_id in movie_ids:
+            try:
+                self.__queue.put_nowait(movie_id)
+            except queue.Full:
+                # The claim lapses and the movie is claimed again later.
+                break
+
+    def __start(self) -> None:
+        """Starts the threads."""
+        if self.__threads:
+            return
+
+        with self.__lock:
+            if self.__threads:
+                return
+
+            for name, target in (('dispatch', self.__dispatch), ('store', self.__store)):
+                thread = threading.Thread(target=target, name=f"enrichment-{name}", daemon=True)
+                thread.start()
+                self.__threads.append(thread)
+
+    def __dispatch(self) -> None:
+        """
+        Starts the OMDB lookups of queued movies until the process exits, and
+        claims leftovers whenever the queue stays empty for half a lease.
+        """
+        client = self.__app.extensions['omdb']
+
+        while True:
+            try:
+                movie_id = self.__queue.get(timeout=self.lease / 2)
+            except queue.Empty:
+                try:
+                    self.__recover()
+                except Exception:
+                    self.__app.logger.exception("Claiming pending movies failed")
+                continue
+
+            self.__slots.acquire()
+            lookup = None
+
+            try:
+                with self.__app.app_context():
+                    movie = db.session.get(Movie, movie_id)
+
+                    if movie and movie.status == Movie.PENDING and not CatalogManager.find(title=movie.title):
+                        lookup = client.run(Omdb.lookup(title=movie.title, client=client))
+            except Exception as e:
+                # Handed on as a failed lookup, so that the movie is marked as failed.
+                lookup = Future()
+                lookup.set_exception(e)
+
+            if lookup is None:
+                self.__finished.put((movie_id, None))
+            else:
+                lookup.add_done_callback(
+                    lambda future, movie_id=movie_id: self.__finished.put((movie_id, future))
+                )
+
+    def __store(self) -> None:
+        """
+        Fills in the movies whose lookups finished until the process exits.
+        Movies whose enrichment raised an unexpected error are marked as failed.
+        """
+        while True:
+            movie_id, lookup = self.__finished.get()
+
+            try:
+                with self.__app.app_context():
+                    MovieManager().enrich(movie_id, lookup=lookup)
+            except Exception as e:
+                self.__app.logger.exception("Enriching movie %s failed", movie_id)
+                self.__fail(movie_id, e)
+            finally:
+                self.__slots.release()
+                self.__queue.task_done()
+
+    def __fail(self, movie_id: int, error: Exception) -> None:
+        """Marks a movie as failed after an unexpected error while enriching it."""
+        try:
+            with self.__app.app_context():
+                MovieManager.fail(movie_id, f"Fetching the movie details failed unexpectedly ({type(error).__name__})")
+        except Exception:
+            self.__app.logger.exception("Could not mark movie %s as failed", movie_id)
@@ -0,0 +1,47 @@
+"""
+This module implements field selection for queries that return plain rows.
+
+Callers name the fields they need, e.g. `?fields=title,year`, and only those
+columns are selected, so no ORM objects are loaded and nothing is fetched
+that isn't sent.
+"""
+from typing import Any
+
+from sqlalchemy import ColumnElement
+
+Row = dict[str, Any]
+
+
+class InvalidFields(Exception):
+    """Raised when a field selection names an unknown field."""
+    pass
+
+
+def select_fields(available: dict[str, ColumnElement], fields: str | None) -> dict[str, ColumnElement]:
+    """
+    Picks the columns of a comma-separated field selection.
+
+    The `id` field is always included, first.
+
+    Args:
+        available: The selectable fields and their columns.
+        fields: The comma-separated field names, all fields if None or empty.
+
+    Returns:
+        The selected fields and their columns, in the requested order.
+
+    Raises:
+        InvalidFields: If a field is not available.
+    """
+    names = [name.strip() for name in (fields or '').split(',') if name.strip()]
+
+    if not names:
+        return dict(available)
+
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise InvalidFields(
+            f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}"
+        )
+
+    return {name: available[name] for name in ['id', *names]}
@@ -1,14 +1,42 @@
 """
 This module provides a client for the OMDB (Open Movie Database) API.
 
-It allows fetching movie details by title and converting the data into a
-local Movie model instance.
+It allows fetching movie details by title or IMDb ID and converting the data
+into a catalog entry. Responses are cached, see `cache.OmdbCache`.
+
+All requests of an application go through its `OmdbClient`. They share one
+keep-alive connection pool, are bounded by connect and read timeouts and are
+retried with jittered exponential backoff on connection errors and 5xx
+responses. A circuit breaker fails fast while OMDB is down. Requests are
+throttled by a rate limiter that all processes share and that also counts the
+daily quota of the API key, and concurrent lookups of the same movie share one
+request, see `quota`.
+Every lookup that goes to the API sends the `omdb_request` signal, with the
+application as sender, and its duration and outcome.
+
+Besides the blocking `Omdb` lookup, which holds its thread for the whole round
+trip, the client looks movies up with asyncio: `Omdb.lookup` can be awaited
+and `OmdbClient.run` schedules a lookup from any thread. These lookups run on
+one event loop per process, share one aiohttp connection pool and are limited
+to `OMDB_MAX_CONCURRENCY` at a time, so that a single thread can have many
+lookups in flight, e.g. during a bulk import.
 """
-import requests
-import dotenv
-import os
+import asyncio
+import atexit
+import contextvars
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Coroutine, TypeVar
+from blinker import Namespace
+from flask import Flask, current_app
 
-from models import Movie
+from models import CatalogMovie
+from .cache import OmdbCache
+from .breaker import CircuitBreaker
+from .quota import RateLimiter, SingleFlight
 
 
 class MovieApiError(Exception):
@@ -16,39 +44,496 @@ class MovieApiError(Exception):
     pass
 
 
-dotenv.load_dotenv()
+Params = dict
+T = TypeVar('T')
+
+signals = Namespace()
+omdb_request = signals.signal('omdb-request')
+
+URL = 'http://www.omdbapi.com/'
+
+# OMDB answers this, with a 401 status, once the daily quota is used up.
+QUOTA_EXHAUSTED = 'Request limit reached!'
+RATE_LIMITED = "The lookup limit of the movie database is reached, please try again later"
+
+
+def parse_year(data: dict) -> int | None:
+    """
+    Reads the release year of an OMDB response.
+
+    Args:
+        data: The OMDB response.
+
+    Returns:
+        The first year in `Year` or else `Released`, None if neither has one.
+    """
+    for value in (data.get('Year'), data.get('Released')):
+        match = re.search(r'\d{4}', value or '')
+        if match:
+            return int(match.group())
+
+    return None
+
+
+def parse_rating(value: str | None) -> float | None:
+    """
+    Parses an OMDB rating such as "8.8".
+
+    Args:
+        value: The rating as sent by OMDB.
+
+    Returns:
+        The rating, None if it is missing or "N/A".
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_runtime(value: str | None) -> int | None:
+    """
+    Parses an OMDB runtime such as "148 min".
+
+    Args:
+        value: The runtime as sent by OMDB.
+
+    Returns:
+        The runtime in minutes, None if it is missing or "N/A".
+    """
+    match = re.match(r'\s*(\d+)', value or '')
+    return int(match.group(1)) if match else None
+
+
+class OmdbClient:
+    """
+    The connection pool, response cache and circuit breaker that all OMDB
+    lookups of an application share.
+
+    The HTTP session and the cache are only created by the first lookup, so
+    creating an application doesn't import `requests` or open the cache file.
+    Likewise, the event loop of the asynchronous lookups is only started, in
+    a daemon thread, by the first of them.
+    """
+
+    def __init__(self, app: Flask | None = None):
+        """
+        Initializes the client.
+
+        Args:
+            app: The Flask application to register with.
+        """
+        self.__session = None
+        self.__cache: OmdbCache | None = None
+        self.__limiter: RateLimiter | None = None
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__http = None
+        self.__slots: asyncio.Semaphore | None = None
+        self.__lock = threading.Lock()
+        self.__app: Flask | None = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Reads the `OMDB_*` settings of an application, see `app.SETTINGS`, and
+        registers the client as its `omdb` extension.
+
+        Args:
+            app: The Flask application.
+        """
+        self.__app = app
+        self.config = app.config
+        self.url = self.config['OMDB_URL']
+        self.timeout = (self.config['OMDB_CONNECT_TIMEOUT'], self.config['OMDB_READ_TIMEOUT'])
+        self.retries = self.config['OMDB_RETRIES']
+        self.backoff = self.config['OMDB_BACKOFF']
+        self.backoff_max = self.config['OMDB_BACKOFF_MAX']
+        self.breaker = CircuitBreaker(
+            failure_threshold=self.config['OMDB_BREAKER_THRESHOLD'],
+            reset_timeout=self.config['OMDB_BREAKER_RESET']
+        )
+        self.rate_limit_wait = self.config['OMDB_RATE_LIMIT_WAIT']
+        self.flights = SingleFlight()
+        app.extensions['omdb'] = self
+
+    @property
+    def session(self):
+        """The keep-alive HTTP session, created on first use."""
+        with self.__lock:
+            if self.__session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                for prefix in ('http://', 'https://'):
+                    session.mount(prefix, HTTPAdapter(
+                        pool_connections=1, pool_maxsize=self.config['OMDB_POOL_SIZE']
+                    ))
+                self.__session = session
+
+            return self.__session
+
+    @property
+    def cache(self) -> OmdbCache:
+        """The response cache, opened on first use."""
+        with self.__lock:
+            if self.__cache is None:
+                self.__cache = OmdbCache(
+                    path=self.config['OMDB_CACHE_PATH'],
+                    memory_size=self.config['OMDB_CACHE_MEMORY_SIZE'],
+                    disk_size=self.config['OMDB_CACHE_DISK_SIZE'],
+                    ttl=self.config['OMDB_CACHE_TTL'],
+                    negative_ttl=self.config['OMDB_CACHE_NEGATIVE_TTL']
+                )
+
+            return self.__cache
+
+    @property
+    def limiter(self) -> RateLimiter:
+        """The rate limiter, kept in the file of the response cache and opened on first use."""
+        with self.__lock:
+            if self.__limiter is None:
+                self.__limiter = RateLimiter(
+                    path=self.config['OMDB_CACHE_PATH'],
+                    rate=self.config['OMDB_RATE_LIMIT'],
+                    burst=self.config['OMDB_RATE_BURST'],
+                    daily_quota=self.config['OMDB_DAILY_QUOTA']
+                )
+
+            return self.__limiter
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The event loop of the asynchronous lookups, started on first use."""
+        with self.__lock:
+            if self.__loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='omdb-io', daemon=True).start()
+                atexit.register(self.close)
+                self.__loop = loop
+
+            return self.__loop
+
+    def run(self, coro: Coroutine[object, object, T]) -> Future[T]:
+        """
+        Schedules a coroutine on the event loop of the client.
+
+        The coroutine runs in a copy of the caller's context, so that the
+        lookups it sends are reported to the request that scheduled it.
+
+        Args:
+            coro: The coroutine, e.g. `Omdb.lookup(title, client=client)`.
+
+        Returns:
+            A future that can be waited on from any thread.
+        """
+        future = Future()
+        context = contextvars.copy_context()
+
+        def done(task: asyncio.Task) -> None:
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def start() -> None:
+            if future.set_running_or_notify_cancel():
+                self.loop.create_task(coro, context=context).add_done_callback(done)
+            else:
+                coro.close()
+
+        self.loop.call_soon_threadsafe(start)
+        return future
+
+    def close(self) -> None:
+        """Closes the connections of the asynchronous lookups and stops their loop."""
+        with self.__lock:
+            loop, self.__loop = self.__loop, None
+
+        if loop is None or not loop.is_running():
+            return
+
+        async def shutdown() -> None:
+            if self.__http is not None:
+                await self.__http.close()
+                self.__http = None
+            loop.stop()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), loop)
+
+    def lookup(self, title: str | None = None, imdb_id: str | None = None) -> dict:
+        """
+        Looks a movie up in the cache or else the OMDB API, blocking the
+        calling thread until the answer arrives. Concurrent lookups of the
+        same movie wait for the first one instead of sending their own.
+
+        Args:
+            title: The title of the movie.
+            imdb_id: The IMDb ID of the movie, preferred over the title.
+
+        Returns:
+            The OMDB response.
+
+        Raises:
+            MovieApiError: If the circuit breaker is open or all attempts failed.
+        """
+        key = OmdbCache.key(title=title, imdb_id=imdb_id)
+        data = self.cache.get(key)
+
+        if data is None:
+            data = self.flights.do(key, lambda: self.__remember(
+                key, self.fetch({'i': imdb_id} if imdb_id else {'t': title})
+            ))
+
+        return data
+
+    async def lookup_async(self, title: str | None = None, imdb_id: str | None = None) -> dict:
+        """
+        Looks a movie up in the cache or else the OMDB API without blocking
+        the event loop, see `lookup`. The cache is read and written in worker
+        threads, since it is kept in SQLite.
+        """
+        key = OmdbCache.key(title=title, imdb_id=imdb_id)
+        data = await asyncio.to_thread(lambda: self.cache.get(key))
+
+        if data is None:
+            async def fetch() -> dict:
+                data = await self.fetch_async({'i': imdb_id} if imdb_id else {'t': title})
+                return await asyncio.to_thread(self.__remember, key, data)
+
+            data = await self.flights.do_async(key, fetch)
+
+        return data
+
+    def __remember(self, key: str, data: dict) -> dict:
+        """Caches a response under its lookup key and its IMDb ID and returns it."""
+        keys = [key]
+        if data.get('imdbID'):
+            keys.append(OmdbCache.key(imdb_id=data['imdbID']))
+        self.cache.set(data, *keys)
+        return data
+
+    def fetch(self, params: Params) -> dict:
+        """
+        Sends a request to the OMDB API and reports it through `omdb_request`.
+
+        Args:
+            params: The query parameters of the lookup.
+
+        Returns:
+            The decoded JSON response.
+
+        Raises:
+            MovieApiError: If the circuit breaker is open or all attempts failed.
+        """
+        start = time.perf_counter()
+        outcome = 'error'
+
+        try:
+            data = self.__request(params)
+            outcome = 'ok'
+            return data
+        finally:
+            omdb_request.send(self.__app, duration=time.perf_counter() - start, outcome=outcome)
+
+    def __request(self, params: Params) -> dict:
+        """
+        Sends a request to the OMDB API, retrying transient failures.
+
+        Args:
+            params: The query parameters of the lookup.
+
+        Returns:
+            The decoded JSON response.
+
+        Raises:
+            MovieApiError: If the circuit breaker is open, no request may be
+                sent within `OMDB_RATE_LIMIT_WAIT` seconds or all attempts failed.
+        """
+        from requests import RequestException
+
+        if not self.breaker.allow():
+            raise MovieApiError("The movie database is unavailable, please try again later")
+
+        params = {'apikey': self.config['OMDB_API_KEY'], **params}
+
+        try:
+            for attempt in range(self.retries + 1):
+                if not self.limiter.acquire(self.rate_limit_wait):
+                    raise MovieApiError(RATE_LIMITED)
+
+                try:
+                    resp = self.session.get(url=self.url, params=params, timeout=self.timeout)
+                except RequestException as e:
+                    error = type(e).__name__
+                else:
+                    if resp.status_code < 500:
+                        # Parsed outside the try block above: requests' JSONDecodeError
+                        # is a RequestException too, but a malformed body isn't transient.
+                        try:
+                            data = resp.json()
+                        except ValueError:
+                            self.breaker.record_failure()
+                            raise MovieApiError("The movie database returned an invalid response")
+
+                        return self.__received(data)
+
+                    error = f"status {resp.status_code}"
+
+                if attempt < self.retries:
+                    time.sleep(random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt)))
+
+            self.breaker.record_failure()
+            raise MovieApiError(f"The movie database is unavailable ({error})")
+        except BaseException:
+            # A trial call held back by the rate limiter, or interrupted,
+            # must not keep the breaker half-open.
+            self.breaker.release()
+            raise
+
+    def __received(self, data: dict) -> dict:
+        """Records an answer of OMDB with the circuit breaker and the rate limiter."""
+        self.breaker.record_success()
+
+        if data.get('Error') == QUOTA_EXHAUSTED:
+            self.limiter.exhaust()
+
+        return data
+
+    async def fetch_async(self, params: Params) -> dict:
+        """
+        Sends a request to the OMDB API without blocking, see `fetch`.
+
+        It can be awaited on any event loop; the request itself is sent from
+        the loop of the client, which owns the connection pool.
+        """
+        if asyncio.get_running_loop() is self.__loop:
+            return await self.__fetch_async(params)
+
+        return await asyncio.wrap_future(self.run(self.__fetch_async(params)))
+
+    async def __fetch_async(self, params: Params) -> dict:
+        """Sends a request on the loop of the client and reports it."""
+        start = time.perf_counter()
+        outcome = 'error'
+
+        try:
+            http = self.__session_async()
+
+            async with self.__slots:
+                data = await self.__request_async(http, params)
+            outcome = 'ok'
+            return data
+        finally:
+            omdb_request.send(self.__app, duration=time.perf_counter() - start, outcome=outcome)
+
+    async def __request_async(self, http, params: Params) -> dict:
+        """Sends a request with aiohttp, retrying transient failures like `__request`."""
+        import aiohttp
+
+        if not self.breaker.allow():
+            raise MovieApiError("The movie database is unavailable, please try again later")
+
+        params = {'apikey': self.config['OMDB_API_KEY'] or '', **params}
+
+        try:
+            for attempt in range(self.retries + 1):
+                if not await self.limiter.acquire_async(self.rate_limit_wait):
+                    raise MovieApiError(RATE_LIMITED)
+
+                try:
+                    async with http.get(self.url, params=params) as resp:
+                        if resp.status < 500:
+                            return self.__received(await resp.json(content_type=None))
+
+                        error = f"status {resp.status}"
+
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = type(e).__name__
+
+                except ValueError:
+                    self.breaker.record_failure()
+                    raise MovieApiError("The movie database returned an invalid response")
+
+                if attempt < self.retries:
+                    await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt)))
+
+            self.breaker.record_failure()
+            raise MovieApiError(f"The movie database is unavailable ({error})")
+        except BaseException:
+            self.breaker.release()
+            raise
+
+    def __session_async(self):
+        """The aiohttp session of the loop, created on first use."""
+        if self.__http is None:
+            import aiohttp
+
+            limit = self.config['OMDB_MAX_CONCURRENCY']
+            self.__slots = asyncio.Semaphore(limit)
+            self.__http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=limit, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+            )
+
+        return self.__http
+
+
+def current_omdb() -> OmdbClient:
+    """
+    Returns the OMDB client of the current application.
+
+    Returns:
+        The OmdbClient registered with the application.
+    """
+    return current_app.extensions['omdb']
 
 
 class Omdb:
-    """A client to fetch movie data from the OMDB API."""
-    __URL = f"http://www.omdbapi.com/?apikey={os.getenv('OMDB_API_KEY')}&"
+    """A lookup of one movie in the OMDB API."""
 
-    def __init__(self, title: str):
+    def __init__(
+            self,
+            title: str | None = None,
+            imdb_id: str | None = None,
+            client: OmdbClient | None = None,
+            data: dict | None = None
+    ):
         """
         Initializes the Omdb client and fetches movie data.
 
+        The response is served from the cache when possible. Lookups by IMDb ID
+        take precedence over lookups by title.
+
         Args:
             title: The title of the movie to search for.
+            imdb_id: The IMDb ID of the movie to search for.
+            client: The client to send the lookup with, the one of the current
+                application by default.
+            data: The OMDB response if it was already fetched, see `lookup`.
 
         Raises:
             MovieApiError: If the movie is not found or the API returns an error.
         """
-        self._movie_data = requests.get(
-            url=self.__URL,
-            params={'t': title}
-        ).json()
+        if data is None:
+            data = (client or current_omdb()).lookup(title=title, imdb_id=imdb_id)
 
+        self._movie_data = data
         self.__response = self._movie_data.get('Response')
 
         if self._movie_data.get('Response') == 'False':
-            raise MovieApiError(f"No movie found with title {title}")
+            raise MovieApiError(f"No movie found with title {title or imdb_id}")
 
-        self.__movie = Movie(
+        self.__movie = CatalogMovie(
             title=self._movie_data.get('Title'),
-            release_year=self._movie_data.get('Released')[-4:],
+            release_year=parse_year(self._movie_data),
             rated=self._movie_data.get('Rated'),
-            rating=self._movie_data.get('imdbRating'),
-            runtime=self._movie_data.get('Runtime'),
+            rating=parse_rating(self._movie_data.get('imdbRating')),
+            runtime=parse_runtime(self._movie_data.get('Runtime')),
             genre=self._movie_data.get('Genre'),
             director=self._movie_data.get('Director'),
             actors=self._movie_data.get('Actors'),
@@ -57,11 +542,37 @@ class Omdb:
             poster=self._movie_data.get('Poster')
         )
 
-    def movie(self) -> Movie:
+    @classmethod
+    async def lookup(
+            cls,
+            title: str | None = None,
+            imdb_id: str | None = None,
+            client: OmdbClient | None = None
+    ) -> 'Omdb':
+        """
+        Looks a movie up without blocking the event loop.
+
+        Args:
+            title: The title of the movie to search for.
+            imdb_id: The IMDb ID of the movie to search for.
+            client: The client to send the lookup with, the one of the current
+                application by default.
+
+        Returns:
+            The Omdb lookup.
+
+        Raises:
+            MovieApiError: If the movie is not found or the API returns an error.
+        """
+        client = client or current_omdb()
+        data = await client.lookup_async(title=title, imdb_id=imdb_id)
+        return cls(title, imdb_id, client, data=data)
+
+    def movie(self) -> CatalogMovie:
         """
-        Returns the fetched movie data as a Movie model instance.
+        Returns the fetched movie data as an unsaved catalog entry.
 
         Returns:
-            A Movie object populated with data from the OMDB API.
+            A CatalogMovie object populated with data from the OMDB API.
         """
         return self.__movie
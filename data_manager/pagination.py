@@ -0,0 +1,206 @@
+"""
+This module implements keyset (cursor-based) pagination for SQLAlchemy queries.
+
+Instead of an OFFSET, each page is fetched with a WHERE clause on the sort key
+of the last (or first) row of the previous page, so every page costs the same
+no matter how deep into a large library it is. The sort key always ends with
+the primary key to make it unique.
+
+The first column of a longer sort key may hold NULLs, which SQLite sorts
+before all other values in ascending and after them in descending order. It is
+sorted by as is, rather than by a stand-in for NULL, so that an index on the
+column can still return the rows in order.
+"""
+import base64
+import json
+from typing import Any, Callable, Iterator
+
+from sqlalchemy import Select, ColumnElement, and_, or_, tuple_
+from models import db
+
+SortKey = list[ColumnElement]
+Cursor = str
+
+
+class InvalidPageRequest(Exception):
+    """Raised when a cursor, page size or sort order is not valid."""
+    pass
+
+
+def encode_cursor(values: tuple | list) -> Cursor:
+    """
+    Encodes the sort key values of a row as an opaque, URL-safe cursor.
+
+    Args:
+        values: The sort key values.
+
+    Returns:
+        The cursor string.
+    """
+    data = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Cursor, sort_key: SortKey) -> list:
+    """
+    Decodes a cursor created by `encode_cursor`.
+
+    Args:
+        cursor: The cursor string.
+        sort_key: The columns the cursor holds the values of.
+
+    Returns:
+        The sort key values.
+
+    Raises:
+        InvalidPageRequest: If the cursor is malformed or a value doesn't
+            match the type of its column.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidPageRequest("Invalid page cursor")
+
+    if not isinstance(values, list) or len(values) != len(sort_key):
+        raise InvalidPageRequest("Invalid page cursor")
+
+    # Only the first of several columns may be NULL, see `paginate`.
+    nullable = [index == 0 and len(sort_key) > 1 for index in range(len(sort_key))]
+
+    if not all(map(_matches, values, sort_key, nullable)):
+        raise InvalidPageRequest("Invalid page cursor")
+
+    return values
+
+
+def _matches(value, column: ColumnElement, nullable: bool) -> bool:
+    """Checks whether a cursor value can be compared with a column."""
+    if value is None:
+        return nullable
+
+    try:
+        expected = column.type.python_type
+    except NotImplementedError:
+        expected = object
+
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return False
+
+    if expected is float:
+        return isinstance(value, (int, float))
+
+    return isinstance(value, expected)
+
+
+def _beyond(sort_key: SortKey, values: list, greater: bool) -> ColumnElement:
+    """
+    Builds the condition of the rows that sort after the cursor values, or
+    before them if `greater` is False.
+
+    A row-value comparison matches nothing when a value is NULL, so the
+    first column of a longer sort key, which may be NULL, is compared on its
+    own, treating NULL as smaller than everything else like SQLite's ORDER BY.
+
+    Args:
+        sort_key: The columns to sort by.
+        values: The sort key values of the cursor.
+        greater: Whether to match the rows after the cursor values.
+
+    Returns:
+        The WHERE clause.
+    """
+    if len(sort_key) == 1:
+        key, cursor = tuple_(*sort_key), tuple_(*values)
+        return key > cursor if greater else key < cursor
+
+    first, rest, rest_values = sort_key[0], tuple_(*sort_key[1:]), tuple_(*values[1:])
+    beyond_rest = rest > rest_values if greater else rest < rest_values
+
+    if values[0] is None:
+        tied = and_(first.is_(None), beyond_rest)
+        return or_(tied, first.is_not(None)) if greater else tied
+
+    key, cursor = tuple_(*sort_key), tuple_(*values)
+    return key > cursor if greater else or_(key < cursor, first.is_(None))
+
+
+class Page:
+    """A page of query results with cursors to the neighbouring pages."""
+
+    def __init__(self, items: list, next_cursor: Cursor | None, prev_cursor: Cursor | None):
+        """
+        Initializes a page.
+
+        Args:
+            items: The rows on this page.
+            next_cursor: The cursor of the next page, None on the last page.
+            prev_cursor: The cursor of the previous page, None on the first page.
+        """
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self) -> Iterator:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+def paginate(
+        query: Select,
+        sort_key: SortKey,
+        key_of: Callable[[Any], tuple],
+        size: int,
+        descending: bool = False,
+        after: Cursor | None = None,
+        before: Cursor | None = None,
+        scalars: bool = True
+) -> Page:
+    """
+    Fetches one page of a query using keyset pagination.
+
+    Args:
+        query: The query to paginate, without an ORDER BY or LIMIT.
+        sort_key: The columns to sort by, ending with a unique column; only
+            the first of several may be NULL.
+        key_of: Extracts the sort key values from a result row.
+        size: The maximum number of rows on the page.
+        descending: Whether to sort in descending order.
+        after: The cursor of the page to continue after.
+        before: The cursor of the page to continue before.
+        scalars: Whether the page holds the first column of every row, as
+            opposed to whole rows.
+
+    Returns:
+        The requested page.
+
+    Raises:
+        InvalidPageRequest: If a cursor is malformed.
+    """
+    backwards = before is not None
+    cursor = before if backwards else after
+
+    if cursor is not None:
+        values = decode_cursor(cursor, sort_key)
+        query = query.where(_beyond(sort_key, values, greater=descending == backwards))
+
+    reverse = descending != backwards
+    query = query.order_by(*[column.desc() if reverse else column.asc() for column in sort_key])
+
+    result = db.session.execute(query.limit(size + 1))
+    items = list(result.scalars() if scalars else result)
+    more = len(items) > size
+    items = items[:size]
+
+    if backwards:
+        items.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = cursor is not None, more
+
+    return Page(
+        items=items,
+        next_cursor=encode_cursor(key_of(items[-1])) if has_next and items else None,
+        prev_cursor=encode_cursor(key_of(items[0])) if has_prev and items else None
+    )
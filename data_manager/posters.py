@@ -0,0 +1,392 @@
+"""
+This module keeps local copies of movie posters and resized thumbnails.
+
+Posters are downloaded once by background threads, either right after a new
+catalog entry is committed or when the poster is first requested, and stored
+in a content-addressed directory: every file is named after the SHA-256 of the
+original image, so a stored poster never changes and can be served with
+long-lived, immutable cache headers. Next to the original, a thumbnail is
+stored for every size in `SIZES`.
+
+Resizing needs Pillow. Without it, only the originals are stored and served
+for every size. Pillow and `requests` are imported by the first poster that
+is stored, not when the application starts.
+"""
+import functools
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from flask import Flask, current_app, has_app_context, url_for
+from sqlalchemy import event
+
+from models import db, CatalogMovie
+
+# The width in pixels of every thumbnail size.
+SIZES = {
+    'grid': 200,
+    'detail': 400,
+}
+ORIGINAL = 'original'
+MAX_POSTER_BYTES = 5 * 1024 * 1024
+DIGEST = re.compile(r'[0-9a-f]{64}')
+
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+    (b'RIFF', 'image/webp'),
+)
+
+
+class PosterUnavailable(Exception):
+    """Raised when a poster cannot be downloaded or is not an image."""
+    pass
+
+
+@functools.cache
+def _pillow():
+    """Imports Pillow's Image module, returns None if Pillow is not installed."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    return Image
+
+
+def image_type(data: bytes) -> str | None:
+    """
+    Recognizes the format of an image from its first bytes.
+
+    Args:
+        data: The image, or at least its first 12 bytes.
+
+    Returns:
+        The MIME type, or None if the data is not a supported image.
+    """
+    for signature, mimetype in _SIGNATURES:
+        if data.startswith(signature) and (mimetype != 'image/webp' or data[8:12] == b'WEBP'):
+            return mimetype
+
+    return None
+
+
+class PosterStore:
+    """A content-addressed disk cache of posters and their thumbnails."""
+
+    def __init__(
+            self,
+            app: Flask | None = None,
+            path: str | os.PathLike = 'posters',
+            workers: int = 2,
+            prefetch: bool = True,
+            timeout: tuple[float, float] = (3.05, 10)
+    ):
+        """
+        Initializes the store and creates its directory if needed.
+
+        Args:
+            app: The Flask application to register with.
+            path: The directory to store the posters in.
+            workers: The number of background download threads.
+            prefetch: Whether to download the posters of new catalog entries
+                in the background as soon as they are committed.
+            timeout: The connect and read timeouts of a download in seconds.
+        """
+        self.path = Path(path)
+        self.workers = workers
+        self.prefetch = prefetch
+        self.timeout = timeout
+        self.__session = None
+        self.__executor: ThreadPoolExecutor | None = None
+        self.__in_flight: set[int] = set()
+        self.__lock = threading.Lock()
+        self.__app = None
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """
+        Registers the store as the `posters` extension of an application and
+        the `poster_url` template helper.
+
+        Args:
+            app: The Flask application.
+        """
+        self.__app = app
+        app.extensions['posters'] = self
+        app.add_template_global(poster_url)
+
+        if self.prefetch:
+            event.listen(db.session, 'after_flush', self.__collect)
+            event.listen(db.session, 'after_commit', self.__dispatch)
+            event.listen(db.session, 'after_rollback', self.__discard)
+
+    @property
+    def session(self):
+        """The HTTP session posters are downloaded with, created on first use."""
+        with self.__lock:
+            if self.__session is None:
+                import requests
+                self.__session = requests.Session()
+
+            return self.__session
+
+    def file(self, digest: str, size: str) -> Path:
+        """
+        Returns the path a stored poster or thumbnail is kept at.
+
+        Args:
+            digest: The SHA-256 of the original poster.
+            size: `ORIGINAL` or one of `SIZES`.
+
+        Returns:
+            The path, which may not exist.
+        """
+        suffix = 'orig' if size == ORIGINAL else f"{size}.jpg"
+        return self.path / digest[:2] / f"{digest}.{suffix}"
+
+    def open(self, digest: str, size: str) -> tuple[Path, str] | None:
+        """
+        Finds a stored poster in the requested size.
+
+        A missing thumbnail is made from the original, the original itself
+        stands in if it cannot be resized.
+
+        Args:
+            digest: The SHA-256 of the original poster.
+            size: `ORIGINAL` or one of `SIZES`.
+
+        Returns:
+            The path and MIME type of the file, or None if the poster is
+            not stored.
+        """
+        if not DIGEST.fullmatch(digest) or (size != ORIGINAL and size not in SIZES):
+            return None
+
+        original = self.file(digest, ORIGINAL)
+
+        if not original.exists():
+            return None
+
+        if size != ORIGINAL and _pillow() is not None:
+            path = self.file(digest, size)
+
+            if path.exists() or self.__thumbnail(original.read_bytes(), digest, size):
+                return path, 'image/jpeg'
+
+        with original.open('rb') as f:
+            return original, image_type(f.read(12)) or 'application/octet-stream'
+
+    def store(self, data: bytes) -> str:
+        """
+        Stores a poster and its thumbnails.
+
+        Args:
+            data: The poster image.
+
+        Returns:
+            The SHA-256 the poster is stored under.
+
+        Raises:
+            PosterUnavailable: If the data is not a supported image.
+        """
+        if image_type(data) is None:
+            raise PosterUnavailable("The poster is not a supported image")
+
+        digest = hashlib.sha256(data).hexdigest()
+
+        if not self.file(digest, ORIGINAL).exists():
+            self.__write(self.file(digest, ORIGINAL), data)
+
+        for size in SIZES:
+            if _pillow() is not None and not self.file(digest, size).exists():
+                self.__thumbnail(data, digest, size)
+
+        return digest
+
+    def download(self, url: str) -> str:
+        """
+        Downloads and stores a poster.
+
+        Args:
+            url: The URL of the poster.
+
+        Returns:
+            The SHA-256 the poster is stored under.
+
+        Raises:
+            PosterUnavailable: If the poster cannot be downloaded or is not
+                a supported image.
+        """
+        from requests import RequestException
+
+        if not url or not url.startswith(('http://', 'https://')):
+            raise PosterUnavailable(f"No poster at {url!r}")
+
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                data = response.raw.read(MAX_POSTER_BYTES + 1, decode_content=True)
+        except RequestException as e:
+            raise PosterUnavailable(f"Downloading the poster failed: {e}")
+
+        if len(data) > MAX_POSTER_BYTES:
+            raise PosterUnavailable("The poster is too large")
+
+        return self.store(data)
+
+    def lookup(self, entry: CatalogMovie) -> str | None:
+        """
+        Finds the stored poster of a catalog entry, or starts downloading it
+        in the background if it isn't stored yet.
+
+        Args:
+            entry: The catalog entry.
+
+        Returns:
+            The SHA-256 the poster is stored under, or None while it is
+            being downloaded.
+        """
+        if entry.poster_sha256 and self.file(entry.poster_sha256, ORIGINAL).exists():
+            return entry.poster_sha256
+
+        self.submit(entry.id, entry.poster)
+        return None
+
+    def submit(self, catalog_id: int, url: str) -> None:
+        """
+        Downloads the poster of a catalog entry in the background.
+
+        Args:
+            catalog_id: The ID of the catalog entry.
+            url: The URL of its poster.
+        """
+        with self.__lock:
+            if catalog_id in self.__in_flight:
+                return
+
+            self.__in_flight.add(catalog_id)
+
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix='posters'
+                )
+
+        self.__executor.submit(self.__prefetch, catalog_id, url)
+
+    def __prefetch(self, catalog_id: int, url: str) -> None:
+        """Downloads a poster and records it with its catalog entry."""
+        try:
+            digest = self.download(url)
+
+            with self.__app.app_context():
+                db.session.execute(
+                    db.update(CatalogMovie)
+                    .filter_by(id=catalog_id, poster=url)
+                    .values(poster_sha256=digest)
+                )
+                db.session.commit()
+        except PosterUnavailable as e:
+            self.__app.logger.info("Poster of catalog entry %s: %s", catalog_id, e)
+        except Exception:
+            self.__app.logger.exception("Storing the poster of catalog entry %s failed", catalog_id)
+        finally:
+            with self.__lock:
+                self.__in_flight.discard(catalog_id)
+
+    def __owns(self) -> bool:
+        """
+        Tells whether the session in use belongs to this store's application.
+
+        All applications share `db.session`, whose sessions are scoped to an
+        application context, so the events of every application's sessions
+        reach every store.
+        """
+        return has_app_context() and current_app._get_current_object() is self.__app
+
+    def __collect(self, session, flush_context) -> None:
+        """Remembers the catalog entries a flush inserted."""
+        if not self.__owns():
+            return
+
+        for entry in session.new:
+            if isinstance(entry, CatalogMovie) and entry.poster and not entry.poster_sha256:
+                session.info.setdefault('new_posters', []).append((entry.id, entry.poster))
+
+    def __dispatch(self, session) -> None:
+        """Downloads the posters of the catalog entries a commit added."""
+        if not self.__owns():
+            return
+
+        for catalog_id, url in session.info.pop('new_posters', []):
+            self.submit(catalog_id, url)
+
+    def __discard(self, session) -> None:
+        """Forgets the catalog entries of a rolled back transaction."""
+        if self.__owns():
+            session.info.pop('new_posters', None)
+
+    def __thumbnail(self, data: bytes, digest: str, size: str) -> bool:
+        """Stores a thumbnail of a poster, returns whether that worked."""
+        Image = _pillow()
+
+        try:
+            with Image.open(BytesIO(data)) as image:
+                image = image.convert('RGB')
+                width = SIZES[size]
+                image.thumbnail((width, width * 2), Image.Resampling.LANCZOS)
+                out = BytesIO()
+                image.save(out, 'JPEG', quality=82, optimize=True, progressive=True)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return False
+
+        self.__write(self.file(digest, size), out.getvalue())
+        return True
+
+    @staticmethod
+    def __write(path: Path, data: bytes) -> None:
+        """Writes a file atomically, so readers never see a partial one."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def poster_url(movie, size: str = 'grid') -> str | None:
+    """
+    Builds the URL of a movie's poster in one of the stored sizes.
+
+    Stored posters get their immutable URL, the others a URL that fetches
+    the poster on first request and redirects to it.
+
+    Args:
+        movie: A Movie or CatalogMovie object.
+        size: `ORIGINAL` or one of `SIZES`.
+
+    Returns:
+        The URL, or None if the movie has no poster.
+    """
+    if not movie.poster or not movie.poster.startswith(('http://', 'https://')):
+        return None
+
+    if movie.poster_sha256:
+        return url_for('poster', digest=movie.poster_sha256, size=size)
+
+    catalog_id = movie.catalog_id if hasattr(movie, 'catalog_id') else movie.id
+    return url_for('poster_lookup', catalog_id=catalog_id, size=size)
@@ -0,0 +1,235 @@
+"""
+This module protects the OMDB quota of the API key.
+
+`RateLimiter` is a token bucket that refills at a number of requests per
+second up to a burst and also counts the requests of the current UTC day
+against a daily quota. Its state is kept in SQLite, so all threads and worker
+processes that share the file draw from the same bucket. `SingleFlight` lets
+concurrent lookups of the same movie share one request.
+"""
+import asyncio
+import math
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar('T')
+
+
+def _today() -> str:
+    """The current UTC date, which the daily quota is counted for."""
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class RateLimiter:
+    """A token bucket and daily request counter shared through a SQLite file."""
+
+    def __init__(self, path: str, rate: float = 10, burst: int = 10, daily_quota: int = 0):
+        """
+        Initializes the limiter and creates its table if needed.
+
+        Args:
+            path: The path of the SQLite file that holds the bucket.
+            rate: Requests per second, 0 for no limit.
+            burst: Requests that may be sent at once after a quiet period.
+            daily_quota: Requests per UTC day, 0 for no limit.
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.daily_quota = daily_quota
+        self.rejected = 0
+
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self.__conn.execute("PRAGMA journal_mode = WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS omdb_quota ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), tokens REAL NOT NULL, "
+            "updated_at REAL NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL)"
+        )
+        self.__conn.execute(
+            "INSERT OR IGNORE INTO omdb_quota VALUES (1, ?, ?, ?, 0)",
+            (self.burst, time.time(), _today())
+        )
+
+    def try_acquire(self) -> float:
+        """
+        Takes a token from the bucket if one is left.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until the next
+            token, or infinity if the daily quota is used up.
+        """
+        now = time.time()
+        today = _today()
+
+        with self.__lock:
+            self.__conn.execute("BEGIN IMMEDIATE")
+
+            try:
+                tokens, updated_at, day, used = self.__conn.execute(
+                    "SELECT tokens, updated_at, day, used FROM omdb_quota WHERE id = 1"
+                ).fetchone()
+
+                if day != today:
+                    day, used = today, 0
+
+                if self.rate > 0:
+                    tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+                else:
+                    tokens = self.burst
+
+                if self.daily_quota and used >= self.daily_quota:
+                    wait = math.inf
+                elif tokens >= 1:
+                    tokens -= 1
+                    used += 1
+                    wait = 0.0
+                else:
+                    wait = (1 - tokens) / self.rate
+
+                self.__conn.execute(
+                    "UPDATE omdb_quota SET tokens = ?, updated_at = ?, day = ?, used = ? WHERE id = 1",
+                    (tokens, now, day, used)
+                )
+                self.__conn.execute("COMMIT")
+            except BaseException:
+                self.__conn.execute("ROLLBACK")
+                raise
+
+        return wait
+
+    def acquire(self, timeout: float) -> bool:
+        """
+        Takes a token, waiting for one for at most `timeout` seconds.
+
+        Args:
+            timeout: The maximum number of seconds to wait.
+
+        Returns:
+            True if a token was taken, False if none was left in time.
+        """
+        deadline = time.monotonic() + timeout
+
+        while (wait := self.try_acquire()) > 0:
+            if time.monotonic() + wait > deadline:
+                self.rejected += 1
+                return False
+            time.sleep(wait)
+
+        return True
+
+    async def acquire_async(self, timeout: float) -> bool:
+        """
+        Takes a token without blocking the event loop, see `acquire`. The
+        bucket is updated in a worker thread, since SQLite may wait for the
+        lock of another process.
+        """
+        deadline = time.monotonic() + timeout
+
+        while (wait := await asyncio.to_thread(self.try_acquire)) > 0:
+            if time.monotonic() + wait > deadline:
+                self.rejected += 1
+                return False
+            await asyncio.sleep(wait)
+
+        return True
+
+    def exhaust(self) -> None:
+        """Marks the daily quota as used up, e.g. when OMDB reports it is."""
+        if not self.daily_quota:
+            return
+
+        with self.__lock:
+            self.__conn.execute(
+                "UPDATE omdb_quota SET day = ?, used = max(used, ?) WHERE id = 1",
+                (_today(), self.daily_quota)
+            )
+
+    def used(self) -> int:
+        """
+        Returns the number of requests sent today by all processes.
+
+        Returns:
+            The number of tokens taken since midnight UTC.
+        """
+        with self.__lock:
+            day, used = self.__conn.execute("SELECT day, used FROM omdb_quota WHERE id = 1").fetchone()
+
+        return used if day == _today() else 0
+
+
+class SingleFlight:
+    """Lets concurrent calls with the same key share the result of the first."""
+
+    def __init__(self):
+        self.coalesced = 0
+        self.__flights: dict[str, Future] = {}
+        self.__lock = threading.Lock()
+
+    def do(self, key: str, function: Callable[[], T]) -> T:
+        """
+        Calls a function unless a call with the same key is in flight, in
+        which case it waits for that call and returns its result.
+
+        Args:
+            key: The key of the call.
+            function: The function to call.
+
+        Returns:
+            The result of the function.
+        """
+        future, leader = self.__join(key)
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = function()
+        except BaseException as e:
+            self.__land(key, future, error=e)
+            raise
+
+        self.__land(key, future, result=result)
+        return result
+
+    async def do_async(self, key: str, function: Callable[[], Awaitable[T]]) -> T:
+        """Awaits a coroutine function unless a call with the same key is in flight, see `do`."""
+        future, leader = self.__join(key)
+
+        if not leader:
+            return await asyncio.wrap_future(future)
+
+        try:
+            result = await function()
+        except BaseException as e:
+            self.__land(key, future, error=e)
+            raise
+
+        self.__land(key, future, result=result)
+        return result
+
+    def __join(self, key: str) -> tuple[Future, bool]:
+        """Returns the flight of a key and whether the caller starts it."""
+        with self.__lock:
+            future = self.__flights.get(key)
+
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+
+            future = self.__flights[key] = Future()
+            return future, True
+
+    def __land(self, key: str, future: Future, result=None, error: BaseException | None = None) -> None:
+        """Ends the flight of a key and hands its outcome to the waiting calls."""
+        with self.__lock:
+            del self.__flights[key]
+
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
@@ -1,3 +1,7 @@
 from .user import User
 from .movie import Movie
-from .db import db
+from .catalog import CatalogMovie
+from .db import db, init_sqlite, query_plan
+from .migrations import upgrade
+from .indexes import unindexed_queries
+from . import versioning
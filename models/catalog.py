@@ -0,0 +1,59 @@
+"""
+This module defines the SQLAlchemy data models for the application,
+including the CatalogMovie model.
+"""
+from .db import db
+
+
+class CatalogMovie(db.Model):
+    """
+    Represents a movie in the shared catalog of OMDB details.
+
+    Each movie is stored once, no matter how many users have it in their
+    library; see `Movie` for the per-user entries.
+
+    Attributes:
+        id (int): The primary key for the catalog entry.
+        imdb_id (str): The unique IMDb identifier.
+        title (str): The title of the movie according to OMDB.
+        release_year (int): The year the movie was released.
+        rated (str): The MPAA rating (e.g., PG, R).
+        rating (float): The IMDb rating score.
+        runtime (int): The duration of the movie in minutes.
+        genre (str): The genre(s) of the movie.
+        director (str): The director(s) of the movie.
+        actors (str): The main actors in the movie.
+        plot (str): A brief summary of the movie's plot.
+        poster (str): A URL to the movie's poster image.
+        poster_sha256 (str): The SHA-256 of the locally stored poster, if any.
+        fetched_at (datetime): When the details were fetched from OMDB.
+    """
+    __tablename__ = 'catalog'
+    __table_args__ = (
+        db.Index('ix_catalog_imdb_id', 'imdb_id', unique=True),
+        db.Index('ix_catalog_title', db.text('title COLLATE NOCASE')),
+        db.Index('ix_catalog_release_year', 'release_year'),
+        db.Index('ix_catalog_rating', 'rating'),
+        db.Index('ix_catalog_runtime', 'runtime'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    imdb_id = db.Column(db.String(16), nullable=False)
+    title = db.Column(db.String(128))
+    release_year = db.Column(db.Integer)
+    rated = db.Column(db.String(16))
+    rating = db.Column(db.Float)
+    runtime = db.Column(db.Integer)
+    genre = db.Column(db.String(128))
+    director = db.Column(db.String(128))
+    actors = db.Column(db.String(256))
+    plot = db.Column(db.Text)
+    poster = db.Column(db.String(256))
+    poster_sha256 = db.Column(db.String(64))
+    fetched_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
+    def __repr__(self):
+        """
+        Provides a developer-friendly string representation of the CatalogMovie object.
+        """
+        return f"CatalogMovie: {self.title} - IMDb ID: {self.imdb_id}"
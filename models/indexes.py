@@ -0,0 +1,65 @@
+"""
+This module lists the hot queries of the application and checks that SQLite
+answers them from an index rather than a full table scan.
+
+It backs the `flask check-indexes` command, which uses `EXPLAIN QUERY PLAN` to
+catch a dropped or unused index before it turns into a slow page.
+"""
+from sqlalchemy import Executable, func
+from .db import db, query_plan
+from .movie import Movie
+from .catalog import CatalogMovie
+
+
+def hot_queries() -> dict[str, Executable]:
+    """
+    Builds representative versions of the queries behind the busiest pages.
+
+    Returns:
+        A dictionary of query descriptions to statements.
+    """
+    queries = {
+        'movies of a user': db.select(Movie).filter_by(user_id=1).order_by(Movie.id).limit(49),
+        'movies of a user by title': (
+            db.select(Movie).filter_by(user_id=1).order_by(Movie.title, Movie.id).limit(49)
+        ),
+        'movie count of a user': db.select(func.count(Movie.id)).filter_by(user_id=1),
+        'movie counts of users': (
+            db.select(Movie.user_id, func.count(Movie.id))
+            .filter(Movie.user_id.in_([1, 2, 3]))
+            .group_by(Movie.user_id)
+        ),
+        'movies of a catalog entry': db.select(Movie).filter_by(catalog_id=1),
+        'movie by title': db.select(Movie).filter_by(title='Inception'),
+        'catalog entry by IMDb ID': db.select(CatalogMovie).filter_by(imdb_id='tt0111161'),
+        'catalog entry by title': db.select(CatalogMovie).filter(
+            CatalogMovie.title.collate('NOCASE') == 'Inception'
+        ),
+        'catalog entries by year': db.select(CatalogMovie).filter(
+            CatalogMovie.release_year.between(1990, 1999)
+        ),
+        'catalog entries by rating': db.select(CatalogMovie).filter(CatalogMovie.rating >= 8),
+        'catalog entries by runtime': db.select(CatalogMovie).filter(CatalogMovie.runtime <= 90),
+    }
+    return queries
+
+
+def unindexed_queries() -> dict[str, list[str]]:
+    """
+    Finds hot queries whose plan scans a table without an index.
+
+    Must be called inside an application context.
+
+    Returns:
+        A dictionary of query descriptions to their query plans, empty if
+        every hot query uses an index.
+    """
+    failures = {}
+
+    for name, statement in hot_queries().items():
+        plan = query_plan(statement)
+
+        if any(step.startswith('SCAN') and 'INDEX' not in step for step in plan):
+            failures[name] = plan
+
+    return failures
@@ -0,0 +1,211 @@
+"""
+This module implements a lightweight schema upgrade path for the SQLite database.
+
+Each migration is a function that takes a connection and brings the schema one
+step forward. The number of applied migrations is stored in SQLite's
+`user_version` pragma, so `upgrade` only runs the steps a database is missing.
+A fresh database is created from the models and marked as up to date.
+"""
+from sqlalchemy import Connection, inspect
+from .db import db
+from .search import create_search_index, drop_search_triggers
+
+
+def _movie_status(conn: Connection) -> None:
+    """Adds the enrichment status columns to the movies table."""
+    conn.exec_driver_sql(
+        "ALTER TABLE movies ADD COLUMN status VARCHAR(8) NOT NULL DEFAULT 'ready'"
+    )
+    conn.exec_driver_sql("ALTER TABLE movies ADD COLUMN error VARCHAR(256)")
+
+
+def _movie_indexes(conn: Connection) -> None:
+    """Indexes the movie columns used by per-user listings and lookups."""
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_movies_user_id_id ON movies (user_id, id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_movies_imdb_id ON movies (imdb_id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_movies_title ON movies (title)"
+    )
+    conn.exec_driver_sql("ANALYZE movies")
+
+
+def _movie_catalog(conn: Connection) -> None:
+    """
+    Moves the OMDB details of movies into a shared catalog.
+
+    Every IMDb ID gets one catalog entry, taken from its oldest movie row.
+    The movies table is then rebuilt with only the per-user columns and a
+    reference to its catalog entry.
+    """
+    conn.exec_driver_sql(
+        "CREATE TABLE catalog ("
+        "id INTEGER NOT NULL PRIMARY KEY, imdb_id VARCHAR(16) NOT NULL, "
+        "title VARCHAR(128), release_year VARCHAR(12), rated VARCHAR(16), "
+        "rating VARCHAR(12), runtime VARCHAR(16), genre VARCHAR(128), "
+        "director VARCHAR(128), actors VARCHAR(256), plot TEXT, "
+        "poster VARCHAR(256), fetched_at DATETIME DEFAULT (CURRENT_TIMESTAMP))"
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO catalog (imdb_id, title, release_year, rated, rating, runtime, "
+        "genre, director, actors, plot, poster) "
+        "SELECT imdb_id, title, release_year, rated, rating, runtime, "
+        "genre, director, actors, plot, poster FROM movies "
+        "WHERE id IN (SELECT MIN(id) FROM movies WHERE imdb_id IS NOT NULL GROUP BY imdb_id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX ix_catalog_imdb_id ON catalog (imdb_id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_catalog_title ON catalog (title COLLATE NOCASE)"
+    )
+
+    conn.exec_driver_sql(
+        "CREATE TABLE movies_new ("
+        "id INTEGER NOT NULL PRIMARY KEY, title VARCHAR(128), user_rating FLOAT, "
+        "added_at DATETIME DEFAULT (CURRENT_TIMESTAMP), "
+        "status VARCHAR(8) NOT NULL DEFAULT 'ready', error VARCHAR(256), "
+        "user_id INTEGER REFERENCES users (id), "
+        "catalog_id INTEGER REFERENCES catalog (id))"
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO movies_new (id, title, status, error, user_id, catalog_id) "
+        "SELECT movies.id, movies.title, movies.status, movies.error, movies.user_id, catalog.id "
+        "FROM movies LEFT JOIN catalog ON catalog.imdb_id = movies.imdb_id"
+    )
+    conn.exec_driver_sql("DROP TABLE movies")
+    conn.exec_driver_sql("ALTER TABLE movies_new RENAME TO movies")
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_movies_user_id_id ON movies (user_id, id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_movies_catalog_id ON movies (catalog_id)"
+    )
+    conn.exec_driver_sql("CREATE INDEX ix_movies_title ON movies (title)")
+    conn.exec_driver_sql("ANALYZE")
+
+
+def _user_version(conn: Connection) -> None:
+    """Adds the library version columns to the users table."""
+    conn.exec_driver_sql(
+        "ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+    )
+    conn.exec_driver_sql("ALTER TABLE users ADD COLUMN updated_at DATETIME")
+    conn.exec_driver_sql("UPDATE users SET updated_at = CURRENT_TIMESTAMP")
+
+
+def _movie_search(conn: Connection) -> None:
+    """Creates and fills the full-text search index over the movies."""
+    create_search_index(conn)
+
+
+def _catalog_numeric(conn: Connection) -> None:
+    """
+    Stores the release year, rating and runtime of catalog entries as numbers.
+
+    Values OMDB didn't know, such as "N/A", become NULL. The catalog table is
+    rebuilt with numeric columns and indexes on them.
+    """
+    drop_search_triggers(conn)
+    conn.exec_driver_sql(
+        "CREATE TABLE catalog_new ("
+        "id INTEGER NOT NULL PRIMARY KEY, imdb_id VARCHAR(16) NOT NULL, "
+        "title VARCHAR(128), release_year INTEGER, rated VARCHAR(16), "
+        "rating FLOAT, runtime INTEGER, genre VARCHAR(128), "
+        "director VARCHAR(128), actors VARCHAR(256), plot TEXT, "
+        "poster VARCHAR(256), fetched_at DATETIME DEFAULT (CURRENT_TIMESTAMP))"
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO catalog_new (id, imdb_id, title, release_year, rated, rating, runtime, "
+        "genre, director, actors, plot, poster, fetched_at) "
+        "SELECT id, imdb_id, title, "
+        "CASE WHEN release_year GLOB '[0-9][0-9][0-9][0-9]*' "
+        "THEN CAST(substr(release_year, 1, 4) AS INTEGER) END, "
+        "rated, "
+        "CASE WHEN rating GLOB '[0-9]*' THEN CAST(rating AS REAL) END, "
+        "CASE WHEN runtime GLOB '[0-9]*' THEN CAST(runtime AS INTEGER) END, "
+        "genre, director, actors, plot, poster, fetched_at FROM catalog"
+    )
+    conn.exec_driver_sql("DROP TABLE catalog")
+    conn.exec_driver_sql("ALTER TABLE catalog_new RENAME TO catalog")
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX ix_catalog_imdb_id ON catalog (imdb_id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_catalog_title ON catalog (title COLLATE NOCASE)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_catalog_release_year ON catalog (release_year)"
+    )
+    conn.exec_driver_sql("CREATE INDEX ix_catalog_rating ON catalog (rating)")
+    conn.exec_driver_sql("CREATE INDEX ix_catalog_runtime ON catalog (runtime)")
+    create_search_index(conn)
+    conn.exec_driver_sql("ANALYZE catalog")
+
+
+def _catalog_poster(conn: Connection) -> None:
+    """Adds the column recording the locally stored poster of catalog entries."""
+    conn.exec_driver_sql("ALTER TABLE catalog ADD COLUMN poster_sha256 VARCHAR(64)")
+
+
+def _movie_claim(conn: Connection) -> None:
+    """Adds the column with which processes claim pending movies, and indexes those."""
+    conn.exec_driver_sql("ALTER TABLE movies ADD COLUMN claimed_at DATETIME")
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_movies_pending ON movies (id) WHERE status = 'pending'"
+    )
+
+
+def _movie_title_index(conn: Connection) -> None:
+    """Indexes the titles of every user's movies, which libraries are sorted by."""
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_movies_user_id_title ON movies (user_id, title)"
+    )
+    conn.exec_driver_sql("ANALYZE movies")
+
+
+MIGRATIONS = [
+    _movie_status,
+    _movie_indexes,
+    _movie_catalog,
+    _user_version,
+    _movie_search,
+    _catalog_numeric,
+    _catalog_poster,
+    _movie_claim,
+    _movie_title_index,
+]
+
+
+def schema_version(conn: Connection) -> int:
+    """
+    Reads the number of migrations applied to the database.
+
+    Args:
+        conn: An open database connection.
+
+    Returns:
+        The schema version.
+    """
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def upgrade() -> None:
+    """
+    Brings the database schema up to date with the models.
+
+    Must be called inside an application context.
+    """
+    with db.engine.begin() as conn:
+        fresh = not inspect(conn).get_table_names()
+        version = len(MIGRATIONS) if fresh else schema_version(conn)
+
+        for migration in MIGRATIONS[version:]:
+            migration(conn)
+
+        conn.exec_driver_sql(f"PRAGMA user_version = {len(MIGRATIONS)}")
+
+    db.create_all()
@@ -2,45 +2,70 @@
 This module defines the SQLAlchemy data models for the application,
 including the Movie model.
 """
+from sqlalchemy.ext.associationproxy import association_proxy
 from .db import db
 
 
 class Movie(db.Model):
     """
-    Represents a movie in the database.
+    Represents a movie in a user's library.
+
+    The OMDB details live in the shared catalog and are available through
+    read-only proxies, so the row itself only carries the per-user fields.
 
     Attributes:
         id (int): The primary key for the movie.
-        title (str): The title of the movie.
-        release_year (int): The year the movie was released.
-        rated (str): The MPAA rating (e.g., PG, R).
-        rating (float): The IMDb rating score.
-        runtime (str): The duration of the movie.
-        genre (str): The genre(s) of the movie.
-        director (str): The director(s) of the movie.
-        actors (str): The main actors in the movie.
-        plot (str): A brief summary of the movie's plot.
-        imdb_id (str): The unique IMDb identifier.
-        poster (str): A URL to the movie's poster image.
+        title (str): The title of the movie, as set by the user.
+        user_rating (float): The user's own rating of the movie.
+        added_at (datetime): When the user added the movie.
+        status (str): Whether the OMDB details are pending, ready or failed.
+        error (str): Why fetching the OMDB details failed, if it did.
+        claimed_at (datetime): When a process last took the pending movie
+            over to fetch its details.
         user_id (int): The foreign key linking to the user who added the movie.
+        catalog_id (int): The foreign key linking to the catalog entry.
         user (User): The relationship to the User object.
+        catalog (CatalogMovie): The relationship to the catalog entry.
+        release_year, rated, rating, runtime, genre, director, actors, plot,
+        imdb_id, poster, poster_sha256: The catalog details, None while not
+        available.
     """
     __tablename__ = 'movies'
+    __table_args__ = (
+        db.Index('ix_movies_user_id_id', 'user_id', 'id'),
+        db.Index('ix_movies_user_id_title', 'user_id', 'title'),
+        db.Index('ix_movies_catalog_id', 'catalog_id'),
+        db.Index('ix_movies_title', 'title'),
+        db.Index('ix_movies_pending', 'id', sqlite_where=db.text("status = 'pending'")),
+    )
+
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(128))
-    release_year = db.Column(db.String(12))
-    rated = db.Column(db.String(16))
-    rating = db.Column(db.String(12))
-    runtime = db.Column(db.String(16))
-    genre = db.Column(db.String(128))
-    director = db.Column(db.String(128))
-    actors = db.Column(db.String(256))
-    plot = db.Column(db.Text)
-    imdb_id = db.Column(db.String(16))
-    poster = db.Column(db.String(256))
+    user_rating = db.Column(db.Float)
+    added_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    status = db.Column(db.String(8), nullable=False, default=READY, server_default=READY)
+    error = db.Column(db.String(256))
+    claimed_at = db.Column(db.DateTime)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    catalog_id = db.Column(db.Integer, db.ForeignKey('catalog.id'))
     user = db.relationship('User', backref=db.backref('movies', lazy=True))
+    catalog = db.relationship('CatalogMovie', lazy='joined')
+
+    release_year = association_proxy('catalog', 'release_year')
+    rated = association_proxy('catalog', 'rated')
+    rating = association_proxy('catalog', 'rating')
+    runtime = association_proxy('catalog', 'runtime')
+    genre = association_proxy('catalog', 'genre')
+    director = association_proxy('catalog', 'director')
+    actors = association_proxy('catalog', 'actors')
+    plot = association_proxy('catalog', 'plot')
+    imdb_id = association_proxy('catalog', 'imdb_id')
+    poster = association_proxy('catalog', 'poster')
+    poster_sha256 = association_proxy('catalog', 'poster_sha256')
 
     def __repr__(self):
         """
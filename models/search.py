@@ -0,0 +1,133 @@
+"""
+This module maintains the full-text search index over users' movies.
+
+`movie_search` is a contentless SQLite FTS5 table with one row per movie,
+keyed by the movie ID, that indexes the movie title together with the plot,
+actors, director and genre of its catalog entry, plus an `owner` token that
+scopes searches to one user's library. Triggers on `movies` and `catalog` keep
+it in sync with every write, including raw SQL and bulk inserts; since a
+contentless row can only be removed by passing its indexed values again, they
+delete rows with the values from before the change.
+"""
+import re
+
+from sqlalchemy import Connection, event
+
+from .db import db
+
+COLUMNS = ('owner', 'title', 'plot', 'actors', 'director', 'genre')
+
+TEXT_COLUMNS = COLUMNS[1:]
+
+# The indexed values of a movie row `{row}` and its catalog entry `c`.
+_VALUES = (
+    "'u' || {row}.user_id, {row}.title, c.plot, c.actors, c.director, c.genre"
+)
+
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS movie_search USING fts5("
+    f"{', '.join(COLUMNS)}, content='', prefix='2 3', "
+    "tokenize='unicode61 remove_diacritics 2')",
+
+    "CREATE TRIGGER IF NOT EXISTS movies_search_insert AFTER INSERT ON movies BEGIN "
+    f"INSERT INTO movie_search (rowid, {', '.join(COLUMNS)}) "
+    f"SELECT new.id, {_VALUES.format(row='new')} "
+    "FROM (SELECT 1) LEFT JOIN catalog c ON c.id = new.catalog_id; "
+    "END",
+
+    "CREATE TRIGGER IF NOT EXISTS movies_search_delete AFTER DELETE ON movies BEGIN "
+    f"INSERT INTO movie_search (movie_search, rowid, {', '.join(COLUMNS)}) "
+    f"SELECT 'delete', old.id, {_VALUES.format(row='old')} "
+    "FROM (SELECT 1) LEFT JOIN catalog c ON c.id = old.catalog_id; "
+    "END",
+
+    "CREATE TRIGGER IF NOT EXISTS movies_search_update "
+    "AFTER UPDATE OF title, user_id, catalog_id ON movies BEGIN "
+    f"INSERT INTO movie_search (movie_search, rowid, {', '.join(COLUMNS)}) "
+    f"SELECT 'delete', old.id, {_VALUES.format(row='old')} "
+    "FROM (SELECT 1) LEFT JOIN catalog c ON c.id = old.catalog_id; "
+    f"INSERT INTO movie_search (rowid, {', '.join(COLUMNS)}) "
+    f"SELECT new.id, {_VALUES.format(row='new')} "
+    "FROM (SELECT 1) LEFT JOIN catalog c ON c.id = new.catalog_id; "
+    "END",
+
+    "CREATE TRIGGER IF NOT EXISTS catalog_search_update "
+    "AFTER UPDATE OF plot, actors, director, genre ON catalog BEGIN "
+    f"INSERT INTO movie_search (movie_search, rowid, {', '.join(COLUMNS)}) "
+    "SELECT 'delete', m.id, 'u' || m.user_id, m.title, old.plot, old.actors, old.director, old.genre "
+    "FROM movies m WHERE m.catalog_id = old.id; "
+    f"INSERT INTO movie_search (rowid, {', '.join(COLUMNS)}) "
+    "SELECT m.id, 'u' || m.user_id, m.title, new.plot, new.actors, new.director, new.genre "
+    "FROM movies m WHERE m.catalog_id = new.id; "
+    "END",
+]
+
+
+def drop_search_triggers(conn: Connection) -> None:
+    """
+    Drops the triggers that keep the search index in sync.
+
+    Migrations that rebuild the movies or catalog table drop them first and
+    restore them with `create_search_index` afterwards.
+
+    Args:
+        conn: An open database connection.
+    """
+    for name in ('movies_search_insert', 'movies_search_delete', 'movies_search_update', 'catalog_search_update'):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_search_index(conn: Connection, backfill: bool = True) -> None:
+    """
+    Creates the search index and its triggers if they don't exist yet.
+
+    Args:
+        conn: An open database connection.
+        backfill: Whether to index the movies already in the database.
+    """
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'movie_search'"
+    ).scalar()
+
+    for statement in SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+
+    if backfill and not exists:
+        conn.exec_driver_sql(
+            f"INSERT INTO movie_search (rowid, {', '.join(COLUMNS)}) "
+            f"SELECT m.id, {_VALUES.format(row='m')} "
+            "FROM movies m LEFT JOIN catalog c ON c.id = m.catalog_id"
+        )
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection: Connection, tables=(), **kw) -> None:
+    """Creates the search index along with a fresh schema."""
+    if connection.dialect.name == 'sqlite' and any(table.name == 'movies' for table in tables):
+        create_search_index(connection, backfill=False)
+
+
+def match_expression(user_id: int, query: str, columns: tuple[str, ...] = TEXT_COLUMNS) -> str | None:
+    """
+    Turns a user's search terms into an FTS5 query on their library.
+
+    Every word of the query must occur in one of the text columns, the last
+    one only as a prefix, so that results show up while a word is still being
+    typed. FTS5 operators and quotes in the input are treated as plain words.
+
+    Args:
+        user_id: The ID of the user whose movies to search.
+        query: The search terms as entered.
+        columns: The columns the words may occur in.
+
+    Returns:
+        The MATCH expression, or None if the query has no words.
+    """
+    words = re.findall(r'\w+', query)
+
+    if not words:
+        return None
+
+    terms = ' '.join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+    fields = ' '.join(columns)
+    return f'owner : "u{user_id}" AND {{{fields}}} : ({terms})'
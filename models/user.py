@@ -12,11 +12,15 @@ class User(db.Model):
     Attributes:
         id (int): The primary key for the user.
         name (str): The name of the user.
+        version (int): Incremented whenever the user or their library changes.
+        updated_at (datetime): When the user or their library last changed.
     """
     __tablename__ = 'users'
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128))
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
 
     def __repr__(self):
         """
@@ -0,0 +1,38 @@
+"""
+This module keeps the per-user library version up to date.
+
+Before every flush, the users whose name or movies changed get their `version`
+incremented and their `updated_at` set, in the same transaction as the change.
+Pages can then be validated against the version without rendering them.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from .movie import Movie
+from .user import User
+
+
+@event.listens_for(Session, 'before_flush')
+def bump_library_versions(session: Session, flush_context, instances) -> None:
+    """Increments the version of every user affected by the pending flush."""
+    user_ids = set()
+
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Movie) and obj.user_id is not None:
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, User) and obj in session.dirty and session.is_modified(obj):
+            user_ids.add(obj.id)
+
+    if not user_ids:
+        return
+
+    session.connection().execute(
+        update(User.__table__)
+        .where(User.__table__.c.id.in_(user_ids))
+        .values(
+            version=User.__table__.c.version + 1,
+            updated_at=datetime.now(timezone.utc).replace(tzinfo=None)
+        )
+    )
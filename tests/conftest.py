@@ -0,0 +1,41 @@
+"""
+Fixtures shared by the tests: an application on temporary files whose OMDB
+lookups are answered by the fake OMDB of the benchmarks.
+"""
+import pytest
+from flask import Flask
+
+from app import create_app
+
+
+@pytest.fixture
+def config(tmp_path) -> dict:
+    """Config keys that keep an application on temporary files."""
+    return {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'movies.sqlite'}",
+        'OMDB_CACHE_PATH': str(tmp_path / 'omdb_cache.sqlite'),
+        'OMDB_API_KEY': 'test',
+        'OMDB_RETRIES': 0,
+        'OMDB_RATE_LIMIT': 0,
+        'OMDB_DAILY_QUOTA': 0,
+        'PAGE_CACHE_BACKEND': 'memory',
+        'PAGE_CACHE_PATH': str(tmp_path / 'page_cache.sqlite'),
+        'POSTER_PATH': str(tmp_path / 'posters'),
+        'POSTER_PREFETCH': False,
+        'REQUEST_LOG_LEVEL': 'ERROR',
+    }
+
+
+@pytest.fixture
+def app(config):
+    """An application on temporary files."""
+    app = create_app(config)
+    yield app
+    app.extensions['omdb'].close()
+
+
+@pytest.fixture
+def client(app: Flask):
+    """A test client of the application."""
+    return app.test_client()
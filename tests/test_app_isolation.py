@@ -0,0 +1,54 @@
+"""
+Tests that two applications in one process, as the tests and benchmarks
+create, keep their metrics and poster downloads apart.
+"""
+import pytest
+
+from app import create_app
+from data_manager import omdb_request
+from models import db, CatalogMovie
+
+
+@pytest.fixture
+def apps(config):
+    """Two applications on the same database that prefetch posters."""
+    created = [create_app({**config, 'POSTER_PREFETCH': True}) for _ in range(2)]
+    yield created
+
+    for app in created:
+        app.extensions['omdb'].close()
+
+
+def test_requests_are_counted_by_their_application(apps):
+    first, second = apps
+
+    first.test_client().get('/')
+
+    assert first.extensions['metrics'].requests.values() == {('home', 'GET', '200'): 1}
+    assert second.extensions['metrics'].requests.values() == {}
+
+
+def test_omdb_lookups_are_counted_by_their_application(apps):
+    first, second = apps
+
+    omdb_request.send(first, duration=0.1, outcome='error')
+
+    assert first.extensions['metrics'].omdb_errors.values() == {(): 1}
+    assert second.extensions['metrics'].omdb_errors.values() == {}
+
+
+def test_posters_are_downloaded_by_their_application(apps, monkeypatch):
+    submitted = {id(app): [] for app in apps}
+
+    for app in apps:
+        store = app.extensions['posters']
+        monkeypatch.setattr(store, 'submit', lambda catalog_id, url, app=app: submitted[id(app)].append(url))
+
+    first, second = apps
+    url = 'https://posters.example/inception.png'
+
+    with first.app_context():
+        db.session.add(CatalogMovie(imdb_id='tt1375666', title='Inception', poster=url))
+        db.session.commit()
+
+    assert submitted == {id(first): [url], id(second): []}
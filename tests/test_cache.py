@@ -0,0 +1,137 @@
+"""
+Tests the OMDB response cache: expiry, negative results, transient errors
+and the eviction of both tiers.
+"""
+import sqlite3
+
+import pytest
+
+from data_manager import cache as cache_module
+from data_manager.cache import OmdbCache
+
+FOUND = {'Response': 'True', 'Title': 'Inception', 'imdbID': 'tt1375666'}
+NOT_FOUND = {'Response': 'False', 'Error': 'Movie not found!'}
+
+
+class Clock:
+    """A stand-in for the `time` module whose time only moves when told."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'omdb_cache.sqlite')
+
+
+def test_found_movie_expires_after_ttl(path, clock):
+    cache = OmdbCache(path, ttl=100, negative_ttl=10)
+    cache.set(FOUND, 't:inception')
+
+    clock.now += 99
+    assert cache.get('t:inception') == FOUND
+
+    clock.now += 2
+    assert cache.get('t:inception') is None
+    assert OmdbCache(path).get('t:inception') is None
+    # Once in memory and once on disk.
+    assert cache.stats.expirations == 2
+
+
+def test_movie_not_found_expires_after_negative_ttl(path, clock):
+    cache = OmdbCache(path, ttl=100, negative_ttl=10)
+    cache.set(NOT_FOUND, 't:nothing')
+
+    clock.now += 9
+    assert cache.get('t:nothing') == NOT_FOUND
+
+    clock.now += 2
+    assert cache.get('t:nothing') is None
+
+
+@pytest.mark.parametrize('error', cache_module.TRANSIENT_ERRORS)
+def test_transient_errors_are_not_cached(path, clock, error):
+    cache = OmdbCache(path)
+    cache.set({'Response': 'False', 'Error': error}, 't:inception')
+
+    assert cache.get('t:inception') is None
+    assert OmdbCache(path).get('t:inception') is None
+
+
+def test_memory_tier_evicts_least_recently_used(path, clock):
+    cache = OmdbCache(path, memory_size=2)
+    cache.set({**FOUND, 'Title': 'A'}, 'a')
+    cache.set({**FOUND, 'Title': 'B'}, 'b')
+    cache.get('a')
+    cache.set({**FOUND, 'Title': 'C'}, 'c')
+
+    assert cache.get('a')['Title'] == 'A'
+    assert cache.get('c')['Title'] == 'C'
+    assert cache.stats.memory_hits == 3
+    assert cache.get('b')['Title'] == 'B'
+    assert cache.stats.disk_hits == 1
+    assert cache.stats.evictions >= 1
+
+
+def test_disk_tier_evicts_least_recently_used(path, clock):
+    cache = OmdbCache(path, memory_size=1, disk_size=2)
+    cache.set({**FOUND, 'Title': 'A'}, 'a')
+    clock.now += 1
+    cache.set({**FOUND, 'Title': 'B'}, 'b')
+    clock.now += 1
+    assert cache.get('a')['Title'] == 'A'
+    clock.now += 1
+    cache.set({**FOUND, 'Title': 'C'}, 'c')
+
+    fresh = OmdbCache(path, memory_size=1, disk_size=2)
+    assert fresh.get('b') is None
+    assert fresh.get('a')['Title'] == 'A'
+    assert fresh.get('c')['Title'] == 'C'
+    # B from disk, and A, B and A again from the one memory slot.
+    assert cache.stats.evictions == 4
+
+
+def test_disk_tier_trims_entries_of_other_processes(path, clock):
+    first = OmdbCache(path, disk_size=3)
+    second = OmdbCache(path, disk_size=3)
+
+    for number in range(3):
+        first.set(FOUND, f"first {number}")
+        clock.now += 1
+
+    for number in range(4):
+        second.set(FOUND, f"second {number}")
+        clock.now += 1
+
+    fresh = OmdbCache(path, disk_size=3)
+    assert [fresh.get(f"first {number}") for number in range(3)] == [None] * 3
+    assert [fresh.get(f"second {number}") for number in range(4)] == [None] + [FOUND] * 3
+
+
+def test_disk_hits_store_access_times_in_batches(path, clock):
+    cache = OmdbCache(path, memory_size=1)
+    keys = [f"movie {number}" for number in range(cache_module.ACCESS_BATCH + 1)]
+    for key in keys:
+        cache.set(FOUND, key)
+
+    clock.now += 10
+    accessed_at = lambda: sqlite3.connect(path).execute(
+        "SELECT accessed_at FROM omdb_cache WHERE key = ?", (keys[0],)
+    ).fetchone()[0]
+    cache.get(keys[0])
+    assert accessed_at() == clock.now - 10
+
+    for key in keys[1:cache_module.ACCESS_BATCH]:
+        cache.get(key)
+    assert accessed_at() == clock.now
@@ -0,0 +1,84 @@
+"""
+Tests that a database migrated from the original schema answers the hot
+queries from the indexes the migrations add.
+"""
+import sqlite3
+
+import pytest
+
+from app import create_app
+from models import Movie, CatalogMovie, db
+from models.db import query_plan
+from models.indexes import unindexed_queries
+
+ORIGINAL_SCHEMA = """
+CREATE TABLE users (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(128));
+CREATE TABLE movies (
+    id INTEGER NOT NULL PRIMARY KEY, title VARCHAR(128), release_year VARCHAR(12),
+    rated VARCHAR(16), rating VARCHAR(12), runtime VARCHAR(16), genre VARCHAR(128),
+    director VARCHAR(128), actors VARCHAR(256), plot TEXT, imdb_id VARCHAR(16),
+    poster VARCHAR(256), user_id INTEGER REFERENCES users (id)
+);
+"""
+MOVIES = 2000
+
+
+@pytest.fixture
+def migrated(config, tmp_path):
+    """
+    An application whose database was created with the original schema and
+    enough movies that ANALYZE gives the planner realistic statistics.
+    """
+    conn = sqlite3.connect(tmp_path / 'movies.sqlite')
+    conn.executescript(ORIGINAL_SCHEMA)
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [(f"user{n}",) for n in range(20)])
+    conn.executemany(
+        "INSERT INTO movies (title, release_year, rating, runtime, imdb_id, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (f"Movie {n}", str(1920 + n % 100), f"{n % 90 / 10 + 1:.1f}", f"{60 + n % 120} min", f"tt{n:07d}", n % 20 + 1)
+            for n in range(MOVIES)
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+    app = create_app(config)
+    with app.app_context():
+        yield app
+    app.extensions['omdb'].close()
+
+
+def test_migrated_database_keeps_its_movies(migrated):
+    movie = db.session.get(Movie, 1)
+
+    assert db.session.scalar(db.select(db.func.count(Movie.id))) == MOVIES
+    assert movie.catalog.imdb_id == 'tt0000000'
+    assert (movie.catalog.release_year, movie.catalog.rating, movie.catalog.runtime) == (1920, 1.0, 60)
+
+
+@pytest.mark.parametrize('statement, index', [
+    (db.select(Movie).filter_by(user_id=1).order_by(Movie.id).limit(49), 'ix_movies_user_id_id'),
+    (db.select(Movie).filter_by(user_id=1).order_by(Movie.title, Movie.id).limit(49), 'ix_movies_user_id_title'),
+    (db.select(Movie).filter_by(catalog_id=1), 'ix_movies_catalog_id'),
+    (db.select(Movie).filter_by(title='Inception'), 'ix_movies_title'),
+    (db.select(CatalogMovie).filter_by(imdb_id='tt0111161'), 'ix_catalog_imdb_id'),
+    (db.select(CatalogMovie).filter(CatalogMovie.title.collate('NOCASE') == 'Inception'), 'ix_catalog_title'),
+    (db.select(CatalogMovie).filter(CatalogMovie.release_year.between(1990, 1999)), 'ix_catalog_release_year'),
+    (db.select(CatalogMovie).filter(CatalogMovie.rating >= 8), 'ix_catalog_rating'),
+    (db.select(CatalogMovie).filter(CatalogMovie.runtime <= 90), 'ix_catalog_runtime'),
+])
+def test_hot_query_uses_index(migrated, statement, index):
+    plan = query_plan(statement)
+
+    assert any(f"INDEX {index}" in step for step in plan), plan
+
+
+def test_no_hot_query_scans_a_table(migrated):
+    assert unindexed_queries() == {}
+
+
+def test_check_indexes_command(migrated):
+    result = migrated.test_cli_runner().invoke(args=['check-indexes'])
+
+    assert result.exit_code == 0, result.output
+    assert "All hot queries use an index." in result.output
@@ -0,0 +1,41 @@
+"""
+Tests the circuit breaker of the OMDB client when the trial call after a
+cool-down is held back by the rate limiter.
+"""
+import pytest
+
+from data_manager import MovieApiError
+from data_manager.breaker import CircuitBreaker
+from data_manager.omdb import RATE_LIMITED
+
+
+@pytest.fixture
+def client(app):
+    """The OMDB client, with a breaker that is open and cooled down."""
+    client = app.extensions['omdb']
+    client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    client.breaker.record_failure()
+    return client
+
+
+def test_rate_limited_trial_releases_breaker(client, monkeypatch):
+    monkeypatch.setattr(client.limiter, 'acquire', lambda timeout: False)
+
+    with pytest.raises(MovieApiError, match=RATE_LIMITED):
+        client.fetch({'t': 'Inception'})
+
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.breaker.allow()
+
+
+def test_rate_limited_async_trial_releases_breaker(client, monkeypatch):
+    async def acquire_async(timeout: float) -> bool:
+        return False
+
+    monkeypatch.setattr(client.limiter, 'acquire_async', acquire_async)
+
+    with pytest.raises(MovieApiError, match=RATE_LIMITED):
+        client.run(client.fetch_async({'t': 'Inception'})).result(5)
+
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.breaker.allow()
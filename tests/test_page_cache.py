@@ -0,0 +1,55 @@
+"""
+Tests that pages cached by one worker process are not served after another
+process changed the data they show. Two applications on the same database,
+each with its own in-memory page cache, stand in for two processes.
+"""
+import pytest
+
+from app import create_app
+from models import db, CatalogMovie, Movie
+
+
+@pytest.fixture
+def other(config):
+    """A second application on the same database, like another worker process."""
+    app = create_app(config)
+    yield app
+    app.extensions['omdb'].close()
+
+
+@pytest.fixture
+def movie(app):
+    """The ID of a user and of a movie in their library."""
+    with app.app_context():
+        dm = app.extensions['data_manager']
+        user = dm.user.add('alice')
+        entry = CatalogMovie(imdb_id='tt1375666', title='Inception', release_year=2010)
+        db.session.add(entry)
+        db.session.commit()
+        movie = dm.movie.add_pending('Inception', user.id)
+        movie.catalog, movie.status = entry, Movie.READY
+        db.session.commit()
+        return user.id, movie.id
+
+
+def test_home_page_shows_user_added_elsewhere(app, other, movie):
+    assert b'bob' not in other.test_client().get('/').data
+
+    app.test_client().post('/users/add_user', data={'username': 'bob'})
+
+    assert b'bob' in other.test_client().get('/').data
+
+
+def test_movie_pages_show_change_made_elsewhere(app, other, movie):
+    user_id, movie_id = movie
+    pages = [f"/users/{user_id}/movies", f"/users/{user_id}/movies/{movie_id}"]
+
+    for page in pages:
+        assert b'Renamed' not in other.test_client().get(page).data
+
+    app.test_client().post(
+        f"/users/{user_id}/movies/{movie_id}/update", data={'new_title': 'Renamed', 'user_rating': '7'}
+    )
+
+    for page in pages:
+        assert b'Renamed' in other.test_client().get(page).data
@@ -0,0 +1,89 @@
+"""
+Tests that paging through a library sorted by a value some movies lack, like
+the rating of movies whose details are still pending, returns every movie
+exactly once and in order, forwards and backwards.
+"""
+import pytest
+
+from data_manager.pagination import encode_cursor
+from models import db, CatalogMovie, Movie
+
+
+@pytest.fixture
+def library(app):
+    """The ID of a user whose movies partly have no rating, year or runtime."""
+    with app.app_context():
+        dm = app.extensions['data_manager']
+        user = dm.user.add('alice')
+
+        for number in range(23):
+            movie = dm.movie.add_pending(f"Movie {number:02}", user.id)
+
+            if number % 3:
+                movie.catalog = CatalogMovie(
+                    imdb_id=f"tt{number:07}",
+                    title=movie.title,
+                    release_year=1990 + number % 5,
+                    rating=None if number % 7 == 0 else number % 4 + 5.5,
+                    runtime=90 + number % 6
+                )
+                movie.status = Movie.READY
+
+        db.session.commit()
+        return user.id
+
+
+def expected(user_id: int, sort: str, descending: bool) -> list[int]:
+    """The IDs of the user's movies in sort order, with missing values first."""
+    movies = db.session.scalars(db.select(Movie).filter_by(user_id=user_id)).all()
+    value = (lambda movie: 0) if sort == 'added' else (lambda movie: getattr(movie, sort.replace('year', 'release_year')))
+    keyed = sorted(movies, key=lambda movie: (value(movie) is not None, value(movie) or 0, movie.id))
+    ids = [movie.id for movie in keyed]
+    return ids[::-1] if descending else ids
+
+
+@pytest.mark.parametrize('descending', [False, True])
+@pytest.mark.parametrize('sort', ['added', 'title', 'year', 'rating', 'runtime'])
+def test_pages_cover_every_movie_once(app, library, sort, descending):
+    with app.app_context():
+        dm = app.extensions['data_manager']
+        pages = [dm.movie.page(library, 4, sort=sort, descending=descending)]
+
+        while pages[-1].next_cursor:
+            pages.append(dm.movie.page(library, 4, sort=sort, descending=descending, after=pages[-1].next_cursor))
+
+        assert [movie.id for page in pages for movie in page] == expected(library, sort, descending)
+
+        backwards = [pages[-1]]
+        while backwards[-1].prev_cursor:
+            backwards.append(
+                dm.movie.page(library, 4, sort=sort, descending=descending, before=backwards[-1].prev_cursor)
+            )
+
+        ids = [movie.id for page in reversed(backwards) for movie in page]
+        assert ids == expected(library, sort, descending)
+
+
+@pytest.mark.parametrize('sort, values', [
+    ('added', [{'a': 1}]),
+    ('added', ['1']),
+    ('added', [None]),
+    ('title', [3, 1]),
+    ('title', ['Movie 03', None]),
+    ('rating', ['8.5', 1]),
+    ('year', [1990.5, 1]),
+    ('runtime', [True, 1]),
+])
+def test_cursor_of_wrong_types_is_rejected(app, client, library, sort, values):
+    cursor = encode_cursor(values)
+
+    response = client.get(f"/users/{library}/movies?sort={sort}&after={cursor}")
+
+    assert response.status_code == 400
+
+
+def test_cursor_with_missing_value_is_accepted(app, library):
+    with app.app_context():
+        page = app.extensions['data_manager'].movie.page(library, 4, sort='rating', after=encode_cursor([None, 1]))
+
+    assert len(page) == 4
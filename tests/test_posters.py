@@ -0,0 +1,72 @@
+"""
+Tests the poster store: thumbnails of hostile images and posters that are
+requested before they are stored.
+"""
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from models import db, CatalogMovie
+
+
+def png(width: int, height: int) -> bytes:
+    """A plain PNG image of the given size."""
+    out = BytesIO()
+    Image.new('RGB', (width, height), 'navy').save(out, 'PNG')
+    return out.getvalue()
+
+
+def test_decompression_bomb_falls_back_to_original(app, monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    store = app.extensions['posters']
+
+    digest = store.store(png(300, 450))
+
+    assert store.open(digest, 'grid') == (store.file(digest, 'original'), 'image/png')
+    assert not store.file(digest, 'grid').exists()
+
+
+def test_thumbnail_of_poster(app):
+    store = app.extensions['posters']
+
+    digest = store.store(png(300, 450))
+
+    assert store.open(digest, 'grid') == (store.file(digest, 'grid'), 'image/jpeg')
+
+
+def test_lookup_downloads_in_background(app, client, monkeypatch):
+    store = app.extensions['posters']
+    release, downloads = threading.Event(), []
+
+    def download(url: str) -> str:
+        downloads.append(url)
+        release.wait(5)
+        return store.store(png(300, 450))
+
+    monkeypatch.setattr(store, 'download', download)
+    url = 'https://posters.example/inception.png'
+
+    with app.app_context():
+        entry = CatalogMovie(imdb_id='tt1375666', title='Inception', poster=url)
+        db.session.add(entry)
+        db.session.commit()
+        catalog_id = entry.id
+
+    resp = client.get(f"/posters/catalog/{catalog_id}/grid")
+
+    assert resp.status_code == 302
+    assert resp.location == url
+
+    release.set()
+
+    for _ in range(100):
+        with app.app_context():
+            digest = db.session.get(CatalogMovie, catalog_id).poster_sha256
+        if digest:
+            break
+        time.sleep(0.05)
+
+    assert downloads == [url]
+    assert client.get(f"/posters/catalog/{catalog_id}/grid").location == f"/posters/{digest}/grid"
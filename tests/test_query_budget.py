@@ -0,0 +1,93 @@
+"""
+Tests that the pages keep to their budget of SQL statements, see
+`core.query_budget`.
+"""
+import pytest
+from sqlalchemy import event
+
+from core.page_cache import page_cache
+from core.query_budget import over_budget
+from models import db, CatalogMovie, Movie
+
+
+@pytest.fixture
+def movie(app):
+    """The ID of a user and of a ready movie in their library."""
+    with app.app_context():
+        dm = app.extensions['data_manager']
+        user = dm.user.add('alice')
+        entry = CatalogMovie(imdb_id='tt1375666', title='Inception', release_year=2010, rating=8.8)
+        movie = Movie(title='Inception', user=user, catalog=entry, status=Movie.READY)
+        db.session.add(movie)
+        db.session.commit()
+        return user.id, movie.id
+
+
+@pytest.fixture
+def statements(app):
+    """The SQL statements the application issues during the test."""
+    with app.app_context():
+        engine = db.engine
+
+    issued = []
+    listener = lambda *args: issued.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    yield issued
+    event.remove(engine, 'before_cursor_execute', listener)
+
+
+def test_pages_keep_to_their_budget(app, movie):
+    assert over_budget(app, *movie) == {}
+
+
+def test_check_query_budgets_command(app, movie):
+    result = app.test_cli_runner().invoke(args=['check-query-budgets'])
+
+    assert result.exit_code == 0, result.output
+
+
+@pytest.mark.parametrize('url', [
+    '/users/{user_id}',
+    '/users/{user_id}/movies',
+    '/users/{user_id}/movies/{movie_id}',
+])
+def test_revalidated_page_costs_one_statement(client, movie, statements, url):
+    user_id, movie_id = movie
+    url = url.format(user_id=user_id, movie_id=movie_id)
+    etag = client.get(url).headers['ETag']
+
+    statements.clear()
+    resp = client.get(url, headers={'If-None-Match': etag})
+
+    assert resp.status_code == 304
+    assert len(statements) == 1, statements
+
+
+def test_cached_detail_page_costs_one_statement(client, movie, statements):
+    url = '/users/{}/movies/{}'.format(*movie)
+    client.get(url)
+
+    statements.clear()
+    resp = client.get(url)
+
+    assert resp.status_code == 200
+    assert b'Inception' in resp.data
+    assert len(statements) == 1, statements
+
+
+@pytest.mark.parametrize('url', [
+    '/users/{user_id}',
+    '/users/{user_id}/movies/{movie_id}',
+])
+def test_fresh_detail_page_costs_one_statement(app, client, movie, statements, url):
+    user_id, movie_id = movie
+
+    with app.app_context():
+        page_cache().invalidate('')
+
+    statements.clear()
+    resp = client.get(url.format(user_id=user_id, movie_id=movie_id))
+
+    assert resp.status_code == 200
+    assert b'Inception' in resp.data or b'alice' in resp.data
+    assert len(statements) == 1, statements
@@ -0,0 +1,142 @@
+"""
+Tests the protection of the OMDB quota: the token bucket that threads and
+processes share, the daily quota and the coalescing of concurrent lookups.
+"""
+import asyncio
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from data_manager import quota
+from data_manager.quota import RateLimiter, SingleFlight
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'omdb_cache.sqlite')
+
+
+def take_tokens(path: str, attempts: int, taken) -> None:
+    """Takes tokens from the bucket in another process and counts the successes."""
+    limiter = RateLimiter(path, rate=0.001, burst=10)
+    successes = sum(limiter.try_acquire() == 0 for _ in range(attempts))
+
+    with taken.get_lock():
+        taken.value += successes
+
+
+def test_threads_share_the_bucket(path):
+    limiter = RateLimiter(path, rate=0.001, burst=5)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        waits = list(executor.map(lambda _: limiter.try_acquire(), range(16)))
+
+    assert waits.count(0) == 5
+    assert all(wait > 0 for wait in waits if wait != 0)
+
+
+def test_processes_share_the_bucket(path):
+    RateLimiter(path, rate=0.001, burst=10)
+    context = multiprocessing.get_context('spawn')
+    taken = context.Value('i', 0)
+    processes = [context.Process(target=take_tokens, args=(path, 5, taken)) for _ in range(4)]
+
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+
+    assert [process.exitcode for process in processes] == [0] * 4
+    assert taken.value == 10
+    assert RateLimiter(path).used() == 10
+
+
+def test_daily_quota_rejects_until_the_next_day(path, monkeypatch):
+    limiter = RateLimiter(path, rate=0, daily_quota=3)
+
+    assert [limiter.try_acquire() for _ in range(3)] == [0, 0, 0]
+    assert limiter.try_acquire() == math.inf
+    assert limiter.acquire(timeout=60) is False
+    assert limiter.rejected == 1
+    assert limiter.used() == 3
+
+    monkeypatch.setattr(quota, '_today', lambda: '2999-01-01')
+
+    assert limiter.used() == 0
+    assert limiter.try_acquire() == 0
+
+
+def test_exhausted_quota_is_shared(path):
+    first = RateLimiter(path, rate=0, daily_quota=100)
+    second = RateLimiter(path, rate=0, daily_quota=100)
+
+    first.exhaust()
+
+    assert second.used() == 100
+    assert second.try_acquire() == math.inf
+
+
+def test_concurrent_calls_share_one_flight():
+    flights = SingleFlight()
+    release, calls = threading.Event(), []
+
+    def lookup() -> str:
+        calls.append(1)
+        release.wait(5)
+        return 'Inception'
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futures = [executor.submit(flights.do, 't:inception', lookup) for _ in range(5)]
+
+        while flights.coalesced < 4:
+            threading.Event().wait(0.01)
+        release.set()
+
+        assert [future.result(5) for future in futures] == ['Inception'] * 5
+
+    assert len(calls) == 1
+    assert flights.coalesced == 4
+    assert flights.do('t:inception', lambda: 'again') == 'again'
+
+
+def test_failed_flight_raises_in_every_call():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def lookup() -> str:
+        release.wait(5)
+        raise LookupError('not found')
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(flights.do, 't:nothing', lookup) for _ in range(3)]
+
+        while flights.coalesced < 2:
+            threading.Event().wait(0.01)
+        release.set()
+
+        for future in futures:
+            with pytest.raises(LookupError):
+                future.result(5)
+
+
+def test_async_calls_share_one_flight():
+    flights = SingleFlight()
+    calls = []
+
+    async def lookup() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'Inception'
+
+    async def main() -> list[str]:
+        return await asyncio.gather(
+            *(flights.do_async('t:inception', lookup) for _ in range(5)),
+            flights.do_async('t:memento', lookup)
+        )
+
+    assert asyncio.run(main()) == ['Inception'] * 6
+    assert len(calls) == 2
+    assert flights.coalesced == 4
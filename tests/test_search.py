@@ -0,0 +1,98 @@
+"""
+Tests the full-text search of a library: the triggers that keep the index in
+sync, prefix matching, scoping to one user and listing title matches first.
+"""
+import pytest
+
+from models import db, CatalogMovie, Movie
+
+
+@pytest.fixture
+def dm(app):
+    """The data manager, inside an application context."""
+    with app.app_context():
+        yield app.extensions['data_manager']
+
+
+@pytest.fixture
+def users(dm):
+    """The IDs of two users, each with a copy of the same catalog entry."""
+    entry = CatalogMovie(
+        imdb_id='tt1375666', title='Inception', plot='A thief steals secrets through dreams.',
+        actors='Leonardo DiCaprio', director='Christopher Nolan', genre='Sci-Fi'
+    )
+    ids = []
+
+    for name in ('alice', 'bob'):
+        user = dm.user.add(name)
+        db.session.add(Movie(title='Inception', user=user, catalog=entry, status=Movie.READY))
+        ids.append(user.id)
+
+    db.session.commit()
+    return ids
+
+
+def titles(dm, user_id: int, query: str) -> list[str]:
+    """The titles of the movies a search finds, in their order."""
+    return [movie.title for movie in dm.movie.search(user_id, query, 10)]
+
+
+def test_search_finds_inserted_movies(dm, users):
+    assert titles(dm, users[0], 'nolan dreams') == ['Inception']
+
+    db.session.execute(db.text(
+        "INSERT INTO movies (title, user_id, status) VALUES ('Memento', :user_id, 'pending')"
+    ), {'user_id': users[0]})
+    db.session.commit()
+
+    assert titles(dm, users[0], 'memento') == ['Memento']
+
+
+def test_search_follows_updates(dm, users):
+    movie = db.session.scalar(db.select(Movie).filter_by(user_id=users[0]))
+    movie.title = 'Origin'
+    movie.catalog.plot = 'A heist inside a mind.'
+    db.session.commit()
+
+    assert titles(dm, users[0], 'origin heist') == ['Origin']
+    assert titles(dm, users[0], 'inception') == []
+    assert titles(dm, users[0], 'dreams') == []
+    assert titles(dm, users[1], 'heist') == ['Inception']
+
+
+def test_search_forgets_deleted_movies(dm, users):
+    movie = db.session.scalar(db.select(Movie).filter_by(user_id=users[0]))
+    db.session.delete(movie)
+    db.session.commit()
+
+    assert titles(dm, users[0], 'inception') == []
+    assert titles(dm, users[1], 'inception') == ['Inception']
+
+
+@pytest.mark.parametrize('query, found', [
+    ('incep', True),
+    ('leo', True),
+    ('christopher nol', True),
+    ('nol christopher', False),
+    ('ception', False),
+])
+def test_last_word_matches_as_prefix(dm, users, query, found):
+    assert titles(dm, users[0], query) == (['Inception'] if found else [])
+
+
+def test_search_is_scoped_to_the_user(dm, users):
+    dm.movie.add_pending('Memento', users[1])
+
+    assert titles(dm, users[0], 'memento') == []
+    assert titles(dm, users[1], 'memento') == ['Memento']
+    assert [movie.user_id for movie in dm.movie.search(users[0], 'inception', 10)] == [users[0]]
+
+
+def test_title_matches_come_first(dm, users):
+    db.session.add(Movie(
+        title='Dreamscape', user_id=users[0], status=Movie.READY,
+        catalog=CatalogMovie(imdb_id='tt0087175', title='Dreamscape', plot='A psychic enters nightmares.')
+    ))
+    db.session.commit()
+
+    assert titles(dm, users[0], 'dream') == ['Dreamscape', 'Inception']
@@ -0,0 +1,72 @@
+"""
+Tests the production server setup: the process and thread counts, the
+schema upgrade in the master process and the graceful shutdown of workers.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import models
+from app import create_app, load_config
+from core import serving
+
+
+@pytest.mark.parametrize('workload, expected', [
+    ('cpu', (5, 1)),
+    ('io', (4, 16)),
+    ('mixed', (5, 4)),
+])
+def test_worker_model(workload, expected):
+    assert serving.worker_model(workload, cpus=4, db_connections=20) == expected
+
+
+def test_worker_model_keeps_threads_within_connections():
+    assert serving.worker_model('io', cpus=1, db_connections=3) == (2, 3)
+    assert serving.worker_model('mixed', cpus=2, db_connections=2) == (3, 2)
+
+
+def test_serve_upgrades_once_before_workers(app, config, monkeypatch):
+    # `app` migrated the database, as the master would have.
+    upgrades, apps, started = [], [], []
+
+    def gunicorn(factory, options):
+        def run():
+            started.append(options['workers'])
+            apps.extend(factory() for _ in range(options['workers']))
+
+        return SimpleNamespace(run=run)
+
+    monkeypatch.setattr(serving, '_gunicorn', gunicorn)
+    monkeypatch.setattr(models, 'upgrade', lambda: upgrades.append('worker'))
+    monkeypatch.setenv('PAGE_CACHE_BACKEND', 'memory')
+
+    result = serving.serve.main(
+        args=['--workers', '2', '--threads', '2'],
+        obj={
+            'create_app': lambda overrides: create_app({**config, **overrides}),
+            'upgrade_database': lambda overrides: upgrades.append('master'),
+            'config': {**load_config(), **config},
+        },
+        standalone_mode=False
+    )
+
+    assert result is None
+    assert started == [2]
+    assert upgrades == ['master']
+    assert [app.config['UPGRADE_DATABASE'] for app in apps] == [False, False]
+
+    for app in apps:
+        app.extensions['omdb'].close()
+
+
+def test_drain_waits_for_pending_movies(app, monkeypatch):
+    timeouts = []
+    monkeypatch.setattr(app.extensions['enrichment'], 'drain', lambda timeout: timeouts.append(timeout))
+
+    serving._drain(None, SimpleNamespace(wsgi=app, cfg=SimpleNamespace(graceful_timeout=7)))
+
+    assert timeouts == [7]
+
+
+def test_drain_ignores_other_applications():
+    serving._drain(None, SimpleNamespace(wsgi=object(), cfg=SimpleNamespace(graceful_timeout=7)))
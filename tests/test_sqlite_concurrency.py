@@ -0,0 +1,28 @@
+"""
+Tests that the tuned SQLite settings let concurrent writers and readers share
+the database without "database is locked" errors, using the stress test of
+`benchmarks.sqlite_concurrency` for a bounded time.
+"""
+import time
+
+from benchmarks.sqlite_concurrency import make_app, run
+from models import db
+
+SECONDS = 1
+
+
+def test_concurrent_writers_are_not_locked_out(tmp_path):
+    app = make_app(tmp_path / 'tuned.sqlite', None)
+    start = time.monotonic()
+
+    try:
+        result = run(app, SECONDS, readers=4, writers=4)
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+
+    assert time.monotonic() - start < SECONDS + 10
+    assert result['write_errors'] == 0
+    assert result['read_errors'] == 0
+    assert result['writes'] > 0
+    assert result['reads'] > 0